@@ -5,22 +5,160 @@ from flask_migrate import Migrate
 from flask_jwt_extended import JWTManager
 from dotenv import load_dotenv
 from flasgger import Swagger
+from .replicas import RoutingSession
 
 load_dotenv()
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 migrate = Migrate()
 jwt = JWTManager()
 
-def create_app():
+def create_app(test_config=None):
     app = Flask(__name__)
     app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL')
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY')
+    # Password hashing: any Werkzeug method string. Stored hashes made with
+    # other parameters are upgraded on the user's next login.
+    app.config['PASSWORD_HASH_METHOD'] = os.getenv('PASSWORD_HASH_METHOD', 'scrypt')
+    app.config['PASSWORD_HASH_WORKERS'] = int(os.getenv('PASSWORD_HASH_WORKERS', 2))
+    app.config['PASSWORD_HASH_QUEUE_TIMEOUT'] = float(os.getenv('PASSWORD_HASH_QUEUE_TIMEOUT', 5))
+    # Connection pool: 'queue' pools per process, 'null' defers to an
+    # external pooler such as PgBouncer.
+    app.config['DB_POOL_MODE'] = os.getenv('DB_POOL_MODE', 'queue')
+    app.config['DB_POOL_SIZE'] = int(os.getenv('DB_POOL_SIZE', 5))
+    app.config['DB_MAX_OVERFLOW'] = int(os.getenv('DB_MAX_OVERFLOW', 10))
+    app.config['DB_POOL_TIMEOUT'] = int(os.getenv('DB_POOL_TIMEOUT', 30))
+    app.config['DB_POOL_RECYCLE'] = int(os.getenv('DB_POOL_RECYCLE', 1800))
+    app.config['DB_POOL_PRE_PING'] = os.getenv('DB_POOL_PRE_PING', 'true').lower() in ('1', 'true', 'yes')
+    app.config['DB_STATEMENT_TIMEOUT_MS'] = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', 0))
+    app.config['DB_APPLICATION_NAME'] = os.getenv('DB_APPLICATION_NAME', 'joblisting-api')
+    # GET /monitoring/pool exposes pool internals, so it is off unless asked for.
+    app.config['MONITORING_ENABLED'] = os.getenv('MONITORING_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+    # Read replicas for GET endpoints, comma separated. Users who just wrote
+    # read from the primary for REPLICA_STICKY_SECONDS.
+    app.config['DATABASE_REPLICA_URLS'] = [url for url in os.getenv('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+    app.config['REPLICA_STICKY_SECONDS'] = int(os.getenv('REPLICA_STICKY_SECONDS', 5))
+    app.config['REPLICA_RETRY_SECONDS'] = int(os.getenv('REPLICA_RETRY_SECONDS', 30))
+    # Resume uploads: 'sync' uploads inside the request, 'async' hands the
+    # spooled file to a background worker pool.
+    app.config['RESUME_UPLOAD_MODE'] = os.getenv('RESUME_UPLOAD_MODE', 'sync')
+    app.config['RESUME_SPOOL_DIR'] = os.getenv('RESUME_SPOOL_DIR')
+    app.config['RESUME_UPLOAD_WORKERS'] = int(os.getenv('RESUME_UPLOAD_WORKERS', 4))
+    app.config['RESUME_UPLOAD_RETRIES'] = int(os.getenv('RESUME_UPLOAD_RETRIES', 3))
+    app.config['RESUME_UPLOAD_BACKOFF'] = float(os.getenv('RESUME_UPLOAD_BACKOFF', 0.5))
+    app.config['RESUME_MAX_BYTES'] = int(os.getenv('RESUME_MAX_BYTES', 5 * 1024 * 1024))
+    # Response cache: 'memory' is per worker, 'redis' is shared by all workers.
+    app.config['CACHE_BACKEND'] = os.getenv('CACHE_BACKEND', 'memory')
+    app.config['CACHE_REDIS_URL'] = os.getenv('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+    app.config['CACHE_KEY_PREFIX'] = os.getenv('CACHE_KEY_PREFIX', 'joblisting:')
+    app.config['CACHE_DEFAULT_TTL'] = int(os.getenv('CACHE_DEFAULT_TTL', 60))
+    app.config['CACHE_MAX_ENTRIES'] = int(os.getenv('CACHE_MAX_ENTRIES', 4096))
+    app.config['BROWSE_CACHE_TTL'] = int(os.getenv('BROWSE_CACHE_TTL', 30))
+    app.config['BULK_IMPORT_CHUNK_SIZE'] = int(os.getenv('BULK_IMPORT_CHUNK_SIZE', 500))
+    app.config['BULK_IMPORT_MAX_ITEMS'] = int(os.getenv('BULK_IMPORT_MAX_ITEMS', 10000))
+    app.config['BULK_STATUS_MAX_IDS'] = int(os.getenv('BULK_STATUS_MAX_IDS', 1000))
+    app.config['EXPORT_BATCH_SIZE'] = int(os.getenv('EXPORT_BATCH_SIZE', 1000))
+    app.config['JSON_BACKEND'] = os.getenv('JSON_BACKEND', 'stdlib')
+    # Per-request SQL timing: Server-Timing headers always, a JSON log line for
+    # slow requests and a sampled fraction of the rest.
+    app.config['SQL_TIMING_ENABLED'] = os.getenv('SQL_TIMING_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    app.config['SLOW_QUERY_MS'] = float(os.getenv('SLOW_QUERY_MS', 200))
+    app.config['SQL_LOG_SAMPLE_RATE'] = float(os.getenv('SQL_LOG_SAMPLE_RATE', 0.0))
+    app.config['METRICS_ENABLED'] = os.getenv('METRICS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    # /metrics answers only scrapers in these networks (loopback by default),
+    # and only with `Authorization: Bearer <METRICS_TOKEN>` when a token is set.
+    app.config['METRICS_ALLOWED_NETWORKS'] = os.getenv('METRICS_ALLOWED_NETWORKS', '127.0.0.1/32,::1/128')
+    app.config['METRICS_TOKEN'] = os.getenv('METRICS_TOKEN')
+    # Transactional outbox: `flask relay-outbox` publishes job and application
+    # events to OUTBOX_SINK ('log', 'file', 'queue' or a sink class path).
+    app.config['OUTBOX_SINK'] = os.getenv('OUTBOX_SINK', 'log')
+    app.config['OUTBOX_FILE_PATH'] = os.getenv('OUTBOX_FILE_PATH')
+    app.config['OUTBOX_BATCH_SIZE'] = int(os.getenv('OUTBOX_BATCH_SIZE', 100))
+    app.config['OUTBOX_POLL_INTERVAL'] = float(os.getenv('OUTBOX_POLL_INTERVAL', 1.0))
+    # Live status streams: 'poll' reads the outbox every SSE_POLL_INTERVAL,
+    # 'listen' waits on Postgres LISTEN/NOTIFY.
+    app.config['SSE_BACKEND'] = os.getenv('SSE_BACKEND', 'poll')
+    app.config['SSE_POLL_INTERVAL'] = float(os.getenv('SSE_POLL_INTERVAL', 1.0))
+    app.config['SSE_HEARTBEAT_SECONDS'] = float(os.getenv('SSE_HEARTBEAT_SECONDS', 15))
+    app.config['SSE_MAX_STREAM_SECONDS'] = float(os.getenv('SSE_MAX_STREAM_SECONDS', 300))
+    app.config['SSE_REPLAY_LIMIT'] = int(os.getenv('SSE_REPLAY_LIMIT', 500))
+    app.config['SSE_QUEUE_SIZE'] = int(os.getenv('SSE_QUEUE_SIZE', 100))
+    # Each open stream holds a gunicorn thread: by default a worker gives at
+    # most half of its threads to streams. EventSource connects with a ticket
+    # from POST /applications/stream/ticket, good once for SSE_TICKET_SECONDS.
+    app.config['SSE_MAX_STREAMS'] = int(os.getenv('SSE_MAX_STREAMS', max(1, int(os.getenv('GUNICORN_THREADS', 8)) // 2)))
+    app.config['SSE_MAX_STREAMS_PER_USER'] = int(os.getenv('SSE_MAX_STREAMS_PER_USER', 2))
+    app.config['SSE_TICKET_SECONDS'] = int(os.getenv('SSE_TICKET_SECONDS', 30))
+    # Job recommendations: `flask build-recommendations` precomputes feeds and
+    # `flask relay-outbox` merges new jobs into them ('relay'), or not ('off').
+    app.config['RECOMMENDATION_UPDATES'] = os.getenv('RECOMMENDATION_UPDATES', 'relay')
+    app.config['RECOMMENDATION_MODEL_PATH'] = os.getenv('RECOMMENDATION_MODEL_PATH')
+    app.config['RECOMMENDATION_FEED_SIZE'] = int(os.getenv('RECOMMENDATION_FEED_SIZE', 50))
+    app.config['RECOMMENDATION_MAX_FEATURES'] = int(os.getenv('RECOMMENDATION_MAX_FEATURES', 1024))
+    app.config['RECOMMENDATION_CANDIDATE_JOBS'] = int(os.getenv('RECOMMENDATION_CANDIDATE_JOBS', 20000))
+    app.config['RECOMMENDATION_HISTORY'] = int(os.getenv('RECOMMENDATION_HISTORY', 20))
+    # Rate limits: token buckets per endpoint, e.g. 'ip:5/minute,user:100/hour'.
+    # 'memory' is per worker, 'sqlite' is shared by the workers on one host and
+    # 'redis' by every host. ip limits stay off until RATELIMIT_PROXY_COUNT is
+    # set: 0 when clients connect directly, else the number of proxies in front.
+    app.config['RATELIMIT_ENABLED'] = os.getenv('RATELIMIT_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    app.config['RATELIMIT_BACKEND'] = os.getenv('RATELIMIT_BACKEND', 'memory')
+    app.config['RATELIMIT_SQLITE_PATH'] = os.getenv('RATELIMIT_SQLITE_PATH')
+    app.config['RATELIMIT_REDIS_URL'] = os.getenv('RATELIMIT_REDIS_URL', 'redis://localhost:6379/0')
+    app.config['RATELIMIT_MAX_KEYS'] = int(os.getenv('RATELIMIT_MAX_KEYS', 100000))
+    app.config['RATELIMIT_PROXY_COUNT'] = os.getenv('RATELIMIT_PROXY_COUNT')
+    app.config['RATELIMIT_RULES'] = {
+        'auth.signup': os.getenv('RATELIMIT_SIGNUP', 'ip:10/minute,ip:50/day'),
+        'auth.login': os.getenv('RATELIMIT_LOGIN', 'ip:30/minute'),
+        'applications.apply_job': os.getenv('RATELIMIT_APPLY', 'user:20/minute,ip:100/minute'),
+    }
+    if test_config:
+        app.config.update(test_config)
+
+    from .pool import engine_options
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config))
+
+    from .search import include_object
 
     db.init_app(app)
-    migrate.init_app(app, db)
+    migrate.init_app(app, db, include_object=include_object)
     jwt.init_app(app)
 
+    from .serializers import init_json
+    init_json(app)
+
+    from .cache import cache
+    cache.init_app(app)
+
+    from .replicas import replicas
+    replicas.init_app(app)
+
+    from .instrumentation import sql_instrumentation
+    sql_instrumentation.init_app(app)
+
+    from .metrics import metrics
+    metrics.init_app(app)
+
+    from .passwords import passwords
+    passwords.init_app(app)
+
+    # After metrics, so throttled requests are still counted.
+    from .ratelimit import rate_limiter
+    rate_limiter.init_app(app)
+
+    from .outbox import outbox
+    outbox.init_app(app)
+
+    from .streams import stream_broker
+    stream_broker.init_app(app)
+
+    from .recommendations import recommender
+    recommender.init_app(app)
+
+    from .uploads import resume_uploads, ResumeRequest
+    app.request_class = ResumeRequest
+    resume_uploads.init_app(app)
+
     # Swagger config with JWT Bearer support
     swagger_config = {
         "headers": [],
@@ -86,9 +224,21 @@ def create_app():
 
     Swagger(app, config=swagger_config, template=swagger_template)
 
-    from .routes import auth, jobs, applications
+    from .routes import auth, jobs, applications, monitoring
     app.register_blueprint(auth.bp)
     app.register_blueprint(jobs.bp)
     app.register_blueprint(applications.bp)
+    if app.config['MONITORING_ENABLED']:
+        app.register_blueprint(monitoring.bp)
+
+    from .commands import register_commands
+    register_commands(app)
+
+    from .pagination import PaginationError
+    from .utils import base_response
+
+    @app.errorhandler(PaginationError)
+    def handle_pagination_error(error):
+        return base_response(False, 'Invalid pagination parameters', None, [str(error)]), 400
 
     return app
\ No newline at end of file
@@ -0,0 +1,223 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app, request
+
+try:
+    import redis
+except ImportError:  # optional, only needed for CACHE_BACKEND=redis
+    redis = None
+
+class MemoryCache:
+    """Process-local LRU cache with per-entry TTL."""
+
+    def __init__(self, max_entries=1024, default_ttl=60):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._data = OrderedDict()
+        # Counters live outside the LRU so a generation can never be evicted
+        # and silently reset.
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.default_ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def add(self, key, value, ttl=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and (item[1] is None or item[1] > time.monotonic()):
+                return False
+        self.set(key, value, ttl)
+        return True
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def incr(self, key):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def get_counter(self, key):
+        with self._lock:
+            return self._counters.get(key, 0)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._counters.clear()
+
+class RedisCache:
+    """Cache on a Redis-compatible client, shared by every worker.
+
+    Only needs ``get``, ``set(key, value, ex=..., nx=...)``, ``delete`` and
+    ``incr`` from the client, so a small in-memory fake can stand in for it
+    in tests.
+    """
+
+    def __init__(self, client, prefix='joblisting:', default_ttl=60):
+        self.client = client
+        self.prefix = prefix
+        self.default_ttl = default_ttl
+
+    def get(self, key):
+        return self.client.get(self.prefix + key)
+
+    def set(self, key, value, ttl=None):
+        ttl = self.default_ttl if ttl is None else ttl
+        self.client.set(self.prefix + key, value, ex=ttl or None)
+
+    def add(self, key, value, ttl=None):
+        ttl = self.default_ttl if ttl is None else ttl
+        return bool(self.client.set(self.prefix + key, value, ex=ttl or None, nx=True))
+
+    def delete(self, *keys):
+        if keys:
+            self.client.delete(*(self.prefix + key for key in keys))
+
+    def incr(self, key):
+        return int(self.client.incr(self.prefix + key))
+
+    def get_counter(self, key):
+        return int(self.client.get(self.prefix + key) or 0)
+
+    def clear(self):
+        for key in self.client.scan_iter(match=self.prefix + '*'):
+            self.client.delete(key)
+
+class Cache:
+    """Flask extension exposing the configured cache backend.
+
+    ``CACHE_BACKEND`` is ``memory`` (default) or ``redis``. The Redis client
+    comes from ``CACHE_REDIS_CLIENT`` if set, else from ``CACHE_REDIS_URL``.
+    """
+
+    lock_timeout = 5.0
+    poll_interval = 0.05
+
+    def __init__(self, app=None):
+        self._inflight = {}
+        self._inflight_guard = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        ttl = app.config['CACHE_DEFAULT_TTL']
+        if app.config['CACHE_BACKEND'] == 'redis':
+            client = app.config.get('CACHE_REDIS_CLIENT')
+            if client is None:
+                if redis is None:
+                    raise RuntimeError('CACHE_BACKEND=redis requires the redis package')
+                client = redis.Redis.from_url(app.config['CACHE_REDIS_URL'])
+            backend = RedisCache(client, app.config['CACHE_KEY_PREFIX'], ttl)
+        else:
+            backend = MemoryCache(app.config['CACHE_MAX_ENTRIES'], ttl)
+        app.extensions['cache'] = backend
+
+    @property
+    def backend(self):
+        return current_app.extensions['cache']
+
+    def get(self, key):
+        return self.backend.get(key)
+
+    def set(self, key, value, ttl=None):
+        self.backend.set(key, value, ttl)
+
+    def delete(self, *keys):
+        self.backend.delete(*keys)
+
+    def clear(self):
+        self.backend.clear()
+
+    def generation(self, namespace):
+        return self.backend.get_counter(f'{namespace}:generation')
+
+    def bump_generation(self, namespace):
+        """Invalidate every key built under ``namespace`` at once."""
+        return self.backend.incr(f'{namespace}:generation')
+
+    def get_or_set(self, key, compute, ttl=None):
+        """Return the cached value for ``key``, computing it at most once on a miss.
+
+        Threads of this process missing on the same key queue behind one
+        lock; across processes a short-lived lock key elects a single worker
+        to compute while the others poll for its result. If that worker
+        doesn't deliver within ``lock_timeout`` the waiter computes itself.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+        with self._inflight_guard:
+            slot = self._inflight.setdefault(key, [threading.Lock(), 0])
+            slot[1] += 1
+        try:
+            with slot[0]:
+                value = self.get(key)
+                if value is not None:
+                    return value
+                lock_key = f'{key}:lock'
+                backend = self.backend
+                acquired = backend.add(lock_key, b'1', self.lock_timeout)
+                if not acquired:
+                    deadline = time.monotonic() + self.lock_timeout
+                    while time.monotonic() < deadline:
+                        time.sleep(self.poll_interval)
+                        value = self.get(key)
+                        if value is not None:
+                            return value
+                try:
+                    value = compute()
+                    self.set(key, value, ttl)
+                finally:
+                    if acquired:
+                        backend.delete(lock_key)
+                return value
+        finally:
+            with self._inflight_guard:
+                slot[1] -= 1
+                if not slot[1]:
+                    del self._inflight[key]
+
+cache = Cache()
+
+def pack_response(body):
+    """Turn a serialized JSON body into a cache entry carrying its strong ETag."""
+    etag = hashlib.sha256(body).hexdigest()[:32]
+    return etag.encode() + b' ' + body
+
+def cached_json_response(entry):
+    """Answer from a cache entry: 304 if the client has it, else the stored body."""
+    etag, body = entry.split(b' ', 1)
+    etag = etag.decode()
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = current_app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    # Responses are per-user behind a JWT, so only the client may keep them
+    # and it must revalidate each time.
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
@@ -0,0 +1,81 @@
+import click
+from flask.cli import with_appcontext
+import os
+from datetime import datetime, timedelta
+from app import db
+from app.counters import reconcile_application_counts
+from app.models import Application
+from app.outbox import outbox
+from app.recommendations import recommender
+from app.stats import rebuild_application_stats
+from app.uploads import resume_uploads
+from app.utils import parse_uuid
+
+@click.command('reconcile-application-counts')
+@click.option('--job-id', 'job_ids', multiple=True, help='Only reconcile these jobs (repeatable).')
+@with_appcontext
+def reconcile_application_counts_command(job_ids):
+    """Recount applications and repair drifted job counters."""
+    ids = None
+    if job_ids:
+        ids = [parse_uuid(job_id) for job_id in job_ids]
+        if None in ids:
+            raise click.BadParameter('job ids must be UUIDs', param_hint='--job-id')
+    repaired = reconcile_application_counts(ids)
+    click.echo(f'Repaired counters on {len(repaired)} job(s).')
+    for job_id in repaired:
+        click.echo(f'  {job_id}')
+
+@click.command('rebuild-application-stats')
+@with_appcontext
+def rebuild_application_stats_command():
+    """Recompute the per-day application rollup from the applications table."""
+    written = rebuild_application_stats()
+    click.echo(f'Wrote {written} rollup row(s).')
+
+@click.command('retry-resume-uploads')
+@with_appcontext
+def retry_resume_uploads_command():
+    """Upload spooled resumes left pending or failed (e.g. after a restart)."""
+    ids = [row.id for row in db.session.query(Application.id)
+           .filter(Application.resume_status.in_(['pending', 'failed'])).all()]
+    uploaded = missing = 0
+    for application_id in ids:
+        if not os.path.exists(resume_uploads.spool_path(application_id)):
+            missing += 1
+            continue
+        if resume_uploads.process(application_id) == 'uploaded':
+            uploaded += 1
+    click.echo(f'Uploaded {uploaded} of {len(ids)} resume(s); {missing} had no spooled file.')
+
+@click.command('relay-outbox')
+@click.option('--once', is_flag=True, help='Exit once the outbox is empty instead of polling.')
+@with_appcontext
+def relay_outbox_command(once):
+    """Publish outbox events to OUTBOX_SINK."""
+    published = outbox.run(once=once)
+    click.echo(f'Published {published} event(s).')
+
+@click.command('prune-outbox')
+@click.option('--hours', type=int, default=168, show_default=True, help='Keep events published within this many hours.')
+@with_appcontext
+def prune_outbox_command(hours):
+    """Delete outbox events that were published long ago."""
+    deleted = outbox.prune(datetime.utcnow() - timedelta(hours=hours))
+    click.echo(f'Deleted {deleted} published event(s).')
+
+@click.command('build-recommendations')
+@click.option('--batch-size', type=int, default=256, show_default=True, help='Applicants scored per batch.')
+@with_appcontext
+def build_recommendations_command(batch_size):
+    """Recompute every applicant's recommended jobs."""
+    model = recommender.build(batch_size, log=click.echo)
+    click.echo(f'Built feeds for {len(model.applicant_ids)} applicant(s) into {recommender.state.model_path}.')
+
+def register_commands(app):
+    app.cli.add_command(reconcile_application_counts_command)
+    app.cli.add_command(rebuild_application_stats_command)
+    app.cli.add_command(retry_resume_uploads_command)
+    app.cli.add_command(relay_outbox_command)
+    app.cli.add_command(prune_outbox_command)
+    app.cli.add_command(build_recommendations_command)
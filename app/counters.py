@@ -0,0 +1,165 @@
+from sqlalchemy import case, cast, func, insert, literal, null, select, true, update
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models import APPLICATION_STATUSES, Application, Job
+
+STATUS_COUNT_COLUMNS = {status: getattr(Job, f'{status.lower()}_count') for status in APPLICATION_STATUSES}
+
+# The counters are only ever changed with relative UPDATEs in the same
+# transaction as the application write, so concurrent requests can't lose
+# increments and a rollback takes the counter change with it.
+
+def begin_write():
+    """Start the session's transaction as a write transaction.
+
+    pysqlite only issues a deferred BEGIN before the first write, so reads
+    made before it see no fixed snapshot. BEGIN IMMEDIATE takes SQLite's
+    write lock up front; other databases need nothing here.
+    """
+    if db.engine.dialect.name == 'sqlite':
+        db.session.connection().exec_driver_sql('BEGIN IMMEDIATE')
+
+def record_application(job_id, status='Applied', count=1):
+    column = STATUS_COUNT_COLUMNS[status]
+    db.session.execute(
+        update(Job).where(Job.id == job_id).values({
+            Job.application_count: Job.application_count + count,
+            column: column + count,
+        })
+    )
+
+def record_status_change(job_id, old_status, new_status, count=1):
+    record_status_changes(job_id, {old_status: count}, new_status)
+
+def record_status_changes(job_id, moved, new_status):
+    """Move ``moved[old_status]`` applications of a job to ``new_status`` in one UPDATE."""
+    deltas = {}
+    for old_status, count in moved.items():
+        if old_status == new_status or not count:
+            continue
+        deltas[old_status] = deltas.get(old_status, 0) - count
+        deltas[new_status] = deltas.get(new_status, 0) + count
+    if not deltas:
+        return
+    db.session.execute(
+        update(Job).where(Job.id == job_id).values({
+            STATUS_COUNT_COLUMNS[status]: STATUS_COUNT_COLUMNS[status] + delta
+            for status, delta in deltas.items()
+        })
+    )
+
+def status_counts(row):
+    return {status: getattr(row, column.key) for status, column in STATUS_COUNT_COLUMNS.items()}
+
+def reconcile_application_counts(job_ids=None, batch_size=1000):
+    """Recount applications per job and repair any drifted counters.
+
+    Works through jobs in id order, ``batch_size`` at a time, committing each
+    batch. Returns the ids of the jobs that had to be fixed.
+    """
+    repaired = []
+    last_id = None
+    while True:
+        query = db.session.query(Job.id, Job.application_count, *STATUS_COUNT_COLUMNS.values())
+        if job_ids is not None:
+            query = query.filter(Job.id.in_(job_ids))
+        if last_id is not None:
+            query = query.filter(Job.id > last_id)
+        jobs = query.order_by(Job.id).limit(batch_size).all()
+        if not jobs:
+            return repaired
+        last_id = jobs[-1].id
+        actual = {job.id: dict.fromkeys(APPLICATION_STATUSES, 0) for job in jobs}
+        totals = dict.fromkeys(actual, 0)
+        rows = db.session.query(Application.job_id, Application.status, func.count(Application.id)) \
+            .filter(Application.job_id.in_(list(actual))) \
+            .group_by(Application.job_id, Application.status).all()
+        for job_id, status, count in rows:
+            totals[job_id] += count
+            if status in actual[job_id]:
+                actual[job_id][status] = count
+        for job in jobs:
+            counts = actual[job.id]
+            if job.application_count == totals[job.id] and status_counts(job) == counts:
+                continue
+            values = {STATUS_COUNT_COLUMNS[status]: count for status, count in counts.items()}
+            values[Job.application_count] = totals[job.id]
+            db.session.execute(update(Job).where(Job.id == job.id).values(values))
+            repaired.append(job.id)
+        db.session.commit()
+
+def _dialect_insert(table):
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+    return insert(table)
+
+def insert_application(application_id, applicant_id, job_id, cover_letter, applied_at, resume_sha256=None,
+                       resume_link=None):
+    """Insert an application and count it on its job in as few round trips as possible.
+
+    The row is built with INSERT ... SELECT FROM jobs, so a missing job inserts
+    nothing, and ON CONFLICT DO NOTHING lets the unique_application constraint
+    reject duplicates without a pre-check. A previous upload of the same resume
+    by the applicant is looked up in the same statement, unless the caller has
+    already uploaded it and passes ``resume_link``. On Postgres the counter
+    UPDATE rides along in a data-modifying CTE, making this a single statement.
+
+    Returns the inserted row (id, resume_link, resume_status), or None when the
+    job does not exist or the applicant already applied.
+    """
+    columns = Application.__table__.c
+    source = select(Job.id).where(Job.id == job_id)
+    if resume_link is not None:
+        previous_link = literal(resume_link, columns.resume_link.type)
+    elif resume_sha256:
+        previous = select(Application.resume_link).where(
+            Application.applicant_id == applicant_id,
+            Application.resume_sha256 == resume_sha256,
+            Application.resume_status == 'uploaded'
+        ).limit(1).subquery('previous')
+        source = source.outerjoin(previous, true())
+        previous_link = previous.c.resume_link
+    else:
+        previous_link = null()
+    source = source.with_only_columns(
+        literal(application_id, columns.id.type),
+        literal(applicant_id, columns.applicant_id.type),
+        Job.id,
+        previous_link,
+        cast(case((previous_link.isnot(None), 'uploaded'), else_='pending'), columns.resume_status.type),
+        literal(resume_sha256, columns.resume_sha256.type),
+        literal(cover_letter, columns.cover_letter.type),
+        cast(literal('Applied'), columns.status.type),
+        literal(applied_at, columns.applied_at.type),
+        maintain_column_froms=True
+    )
+    target = ['id', 'applicant_id', 'job_id', 'resume_link', 'resume_status', 'resume_sha256',
+              'cover_letter', 'status', 'applied_at']
+    returning = (columns.id, columns.job_id, columns.resume_link, columns.resume_status)
+    statement = _dialect_insert(Application.__table__)
+    if statement is None:
+        try:
+            with db.session.begin_nested():
+                row = db.session.execute(insert(Application.__table__).from_select(target, source).returning(*returning)).first()
+        except IntegrityError:
+            return None
+    else:
+        statement = statement.from_select(target, source) \
+            .on_conflict_do_nothing(index_elements=['applicant_id', 'job_id'])
+        if db.engine.dialect.name == 'postgresql':
+            inserted = statement.returning(*returning).cte('inserted')
+            counted = update(Job).where(Job.id == inserted.c.job_id).values({
+                Job.application_count: Job.application_count + 1,
+                Job.applied_count: Job.applied_count + 1,
+            }).returning(inserted.c.id, inserted.c.resume_link, inserted.c.resume_status)
+            return db.session.execute(counted).first()
+        row = db.session.execute(statement.returning(*returning)).first()
+    if row is None:
+        return None
+    record_application(row.job_id)
+    return row
@@ -0,0 +1,54 @@
+import csv
+import io
+import json
+import uuid
+from datetime import datetime
+from app import db
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+def _plain(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    return value
+
+# Spreadsheets run a cell that starts with one of these as a formula.
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+def _csv_cell(value):
+    value = _plain(value)
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+def stream_rows(statement, fields, fmt, batch_size=1000):
+    """Yield ``statement``'s rows encoded as NDJSON or CSV, one chunk per batch.
+
+    ``yield_per`` makes the driver fetch ``batch_size`` rows at a time (a
+    server-side cursor on Postgres), so memory stays flat however many rows
+    the statement returns.
+    """
+    result = db.session.execute(statement.execution_options(yield_per=batch_size))
+    if fmt == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(fields)
+        # Send the header straight away so the client sees the first byte
+        # before the first batch has been fetched.
+        yield buffer.getvalue()
+        for rows in result.partitions():
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows([_csv_cell(row._mapping[field]) for field in fields] for row in rows)
+            yield buffer.getvalue()
+    else:
+        for rows in result.partitions():
+            yield ''.join(
+                json.dumps({field: _plain(row._mapping[field]) for field in fields}) + '\n'
+                for row in rows
+            )
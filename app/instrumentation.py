@@ -0,0 +1,105 @@
+import json
+import logging
+import random
+import time
+from flask import current_app, g, has_app_context, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+STATEMENT_LOG_CHARS = 500
+
+class RequestQueries:
+    """Statement count, total time and slowest statement of one request."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.slowest_seconds = 0.0
+        self.slowest_statement = None
+
+    def add(self, statement, seconds):
+        self.count += 1
+        self.seconds += seconds
+        if seconds >= self.slowest_seconds:
+            self.slowest_seconds = seconds
+            self.slowest_statement = statement
+
+class _InstrumentationState:
+    def __init__(self, app):
+        self.enabled = app.config['SQL_TIMING_ENABLED']
+        self.slow_seconds = app.config['SLOW_QUERY_MS'] / 1000
+        self.sample_rate = float(app.config['SQL_LOG_SAMPLE_RATE'])
+
+def _log(level, **fields):
+    logger.log(level, json.dumps(fields, default=str, sort_keys=True))
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['query_started'].pop()
+    if not has_app_context():
+        return
+    state = current_app.extensions.get('sql_instrumentation')
+    if state is None or not state.enabled:
+        return
+    seconds = time.perf_counter() - started
+    queries = g.get('sql_queries') if has_request_context() else None
+    if queries is not None:
+        queries.add(statement, seconds)
+    if seconds >= state.slow_seconds:
+        _log(logging.WARNING, event='slow_query', ms=round(seconds * 1000, 3),
+             endpoint=request.endpoint if has_request_context() else None,
+             statement=statement[:STATEMENT_LOG_CHARS])
+
+def _handle_error(context):
+    # after_cursor_execute doesn't run for a failed statement.
+    if context.connection is not None and context.connection.info.get('query_started'):
+        context.connection.info['query_started'].pop()
+
+class QueryInstrumentation:
+    """Counts and times the SQL each request runs.
+
+    Adds a ``Server-Timing`` header (``db`` with the statement count and total
+    time, ``db-slowest`` with the slowest statement), logs a JSON line per
+    request for a ``SQL_LOG_SAMPLE_RATE`` fraction of requests and for any
+    request whose slowest statement crossed ``SLOW_QUERY_MS``, and logs every
+    such slow statement as it finishes.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['sql_instrumentation'] = _InstrumentationState(app)
+        # Listening on the Engine class covers the primary and any replicas.
+        if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+            event.listen(Engine, 'handle_error', _handle_error)
+        app.before_request(self._start)
+        app.after_request(self._report)
+
+    def _start(self):
+        g.sql_queries = RequestQueries()
+
+    def _report(self, response):
+        state = current_app.extensions['sql_instrumentation']
+        queries = g.pop('sql_queries', None)
+        if not state.enabled or queries is None:
+            return response
+        response.headers.add('Server-Timing', f'db;desc="{queries.count} queries";dur={queries.seconds * 1000:.3f}')
+        response.headers.add('Server-Timing', f'db-slowest;dur={queries.slowest_seconds * 1000:.3f}')
+        slow = queries.count and queries.slowest_seconds >= state.slow_seconds
+        if slow or random.random() < state.sample_rate:
+            _log(logging.WARNING if slow else logging.INFO, event='request_sql',
+                 method=request.method, path=request.path, endpoint=request.endpoint,
+                 status=response.status_code, queries=queries.count,
+                 db_ms=round(queries.seconds * 1000, 3), slowest_ms=round(queries.slowest_seconds * 1000, 3),
+                 slowest_statement=(queries.slowest_statement or '')[:STATEMENT_LOG_CHARS])
+        return response
+
+sql_instrumentation = QueryInstrumentation()
@@ -0,0 +1,130 @@
+import hmac
+import ipaddress
+import os
+import time
+from flask import current_app, g, request
+from sqlalchemy import event
+from sqlalchemy.pool import Pool
+from app import pool
+from app.utils import base_response
+
+try:
+    import prometheus_client
+    from prometheus_client import multiprocess
+except ImportError:  # optional, only needed for METRICS_ENABLED
+    prometheus_client = None
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+_metrics = None
+
+def _create_metrics():
+    # Metric objects are process-wide; build them once however many apps exist.
+    global _metrics
+    if _metrics is None:
+        Counter, Gauge, Histogram = prometheus_client.Counter, prometheus_client.Gauge, prometheus_client.Histogram
+        _metrics = {
+            'latency': Histogram('http_request_duration_seconds', 'Request latency by endpoint.',
+                                 ['method', 'endpoint'], buckets=LATENCY_BUCKETS),
+            'in_progress': Gauge('http_requests_in_progress', 'Requests being served.',
+                                 ['method', 'endpoint'], multiprocess_mode='livesum'),
+            'requests': Counter('http_requests_total', 'Responses by endpoint and status.',
+                                ['method', 'endpoint', 'status']),
+            'size': Histogram('http_response_size_bytes', 'Response body size by endpoint.',
+                              ['endpoint'], buckets=SIZE_BUCKETS),
+            'checked_out': Gauge('db_pool_connections_checked_out', 'Connections currently checked out.',
+                                 multiprocess_mode='livesum'),
+            'checkout_wait': Histogram('db_pool_checkout_wait_seconds', 'Time spent waiting for a pooled connection.',
+                                       buckets=LATENCY_BUCKETS),
+            'checkout_failures': Counter('db_pool_checkout_failures_total', 'Checkouts that raised, usually timeouts.'),
+        }
+    return _metrics
+
+def _observe_checkout(waited, failed):
+    if failed:
+        _metrics['checkout_failures'].inc()
+    else:
+        _metrics['checkout_wait'].observe(waited)
+
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    _metrics['checked_out'].inc()
+
+def _on_checkin(dbapi_connection, connection_record):
+    _metrics['checked_out'].dec()
+
+class Metrics:
+    """Prometheus metrics for requests and the connection pool, served on /metrics.
+
+    Under gunicorn set ``PROMETHEUS_MULTIPROC_DIR`` (see gunicorn.conf.py):
+    every worker then writes its samples to memory-mapped files in that
+    directory and /metrics aggregates them, whichever worker answers.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if not app.config['METRICS_ENABLED']:
+            return
+        app.extensions['metrics'] = {
+            'networks': [ipaddress.ip_network(network.strip(), strict=False)
+                         for network in app.config['METRICS_ALLOWED_NETWORKS'].split(',') if network.strip()],
+            'token': app.config['METRICS_TOKEN'],
+        }
+        if prometheus_client is None:
+            raise RuntimeError('METRICS_ENABLED requires the prometheus_client package')
+        _create_metrics()
+        if _observe_checkout not in pool.checkout_observers:
+            pool.checkout_observers.append(_observe_checkout)
+            event.listen(Pool, 'checkout', _on_checkout)
+            event.listen(Pool, 'checkin', _on_checkin)
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        app.add_url_rule('/metrics', 'metrics', self.render)
+
+    def _start(self):
+        if request.endpoint == 'metrics':
+            return
+        g.metrics_started = time.perf_counter()
+        g.metrics_in_progress = _metrics['in_progress'].labels(request.method, request.endpoint or 'unmatched')
+        g.metrics_in_progress.inc()
+
+    def _finish(self, response):
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return response
+        g.pop('metrics_in_progress').dec()
+        endpoint = request.endpoint or 'unmatched'
+        _metrics['latency'].labels(request.method, endpoint).observe(time.perf_counter() - started)
+        _metrics['requests'].labels(request.method, endpoint, str(response.status_code)).inc()
+        if response.content_length is not None:
+            _metrics['size'].labels(endpoint).observe(response.content_length)
+        return response
+
+    def allowed(self):
+        """Scrapes must come from ``METRICS_ALLOWED_NETWORKS`` and carry ``METRICS_TOKEN`` if one is set."""
+        access = current_app.extensions['metrics']
+        try:
+            address = ipaddress.ip_address(request.remote_addr)
+        except ValueError:
+            return False
+        if not any(address in network for network in access['networks']):
+            return False
+        if access['token']:
+            return hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {access['token']}")
+        return True
+
+    def render(self):
+        if not self.allowed():
+            return base_response(False, 'Forbidden', None, ['Forbidden']), 403
+        if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+            registry = prometheus_client.CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        else:
+            registry = prometheus_client.REGISTRY
+        return current_app.response_class(prometheus_client.generate_latest(registry),
+                                          content_type=prometheus_client.CONTENT_TYPE_LATEST)
+
+metrics = Metrics()
@@ -3,6 +3,8 @@ from datetime import datetime
 from sqlalchemy.dialects.postgresql import UUID
 from . import db
 
+APPLICATION_STATUSES = ('Applied', 'Reviewed', 'Interview', 'Rejected', 'Hired')
+
 class User(db.Model):
     __tablename__ = 'users'
     id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
@@ -12,6 +14,9 @@ class User(db.Model):
     role = db.Column(db.Enum('applicant', 'company', name='user_roles'), nullable=False)
     jobs = db.relationship('Job', backref='company', lazy=True)
     applications = db.relationship('Application', backref='applicant', lazy=True)
+    __table_args__ = (
+        db.Index('ix_users_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+    )
 
 class Job(db.Model):
     __tablename__ = 'jobs'
@@ -21,15 +26,79 @@ class Job(db.Model):
     location = db.Column(db.String(255))
     created_by = db.Column(UUID(as_uuid=True), db.ForeignKey('users.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Maintained by app.counters alongside every application write.
+    application_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    applied_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    reviewed_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    interview_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rejected_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    hired_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     applications = db.relationship('Application', backref='job', lazy=True)
+    __table_args__ = (
+        db.Index('ix_jobs_created_at_id', 'created_at', 'id'),
+        db.Index('ix_jobs_created_by_created_at_id', 'created_by', 'created_at', 'id'),
+        db.Index('ix_jobs_title_trgm', 'title', postgresql_using='gin', postgresql_ops={'title': 'gin_trgm_ops'}),
+        db.Index('ix_jobs_location_trgm', 'location', postgresql_using='gin', postgresql_ops={'location': 'gin_trgm_ops'}),
+    )
 
 class Application(db.Model):
     __tablename__ = 'applications'
     id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     applicant_id = db.Column(UUID(as_uuid=True), db.ForeignKey('users.id'), nullable=False)
     job_id = db.Column(UUID(as_uuid=True), db.ForeignKey('jobs.id'), nullable=False)
-    resume_link = db.Column(db.String(255), nullable=False)
+    resume_link = db.Column(db.String(255))
+    resume_status = db.Column(db.Enum('pending', 'uploaded', 'failed', name='resume_status'), nullable=False, default='uploaded', server_default='uploaded')
+    resume_sha256 = db.Column(db.String(64))
     cover_letter = db.Column(db.String(200))
-    status = db.Column(db.Enum('Applied', 'Reviewed', 'Interview', 'Rejected', 'Hired', name='application_status'), default='Applied')
+    status = db.Column(db.Enum(*APPLICATION_STATUSES, name='application_status'), default='Applied')
     applied_at = db.Column(db.DateTime, default=datetime.utcnow)
-    __table_args__ = (db.UniqueConstraint('applicant_id', 'job_id', name='unique_application'),) 
\ No newline at end of file
+    __table_args__ = (
+        db.UniqueConstraint('applicant_id', 'job_id', name='unique_application'),
+        db.Index('ix_applications_applicant_id_applied_at_id', 'applicant_id', 'applied_at', 'id'),
+        db.Index('ix_applications_job_id_applied_at_id', 'job_id', 'applied_at', 'id'),
+        db.Index('ix_applications_applicant_id_resume_sha256', 'applicant_id', 'resume_sha256'),
+        db.Index('ix_applications_job_id_status', 'job_id', 'status'),
+        db.Index('ix_applications_resume_unfinished', 'resume_status',
+                 postgresql_where=db.text("resume_status IN ('pending', 'failed')"),
+                 sqlite_where=db.text("resume_status IN ('pending', 'failed')")),
+    )
+ 
+class OutboxEvent(db.Model):
+    """A domain event written in the same transaction as the change it describes.
+
+    ``flask relay-outbox`` publishes unpublished rows in id order and stamps
+    ``published_at``; see app.outbox.
+    """
+    __tablename__ = 'outbox_events'
+    id = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True, autoincrement=True)
+    event_type = db.Column(db.String(64), nullable=False)
+    aggregate_type = db.Column(db.String(32), nullable=False)
+    aggregate_id = db.Column(UUID(as_uuid=True), nullable=False)
+    payload = db.Column(db.JSON, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    published_at = db.Column(db.DateTime)
+    __table_args__ = (
+        db.Index('ix_outbox_events_unpublished', 'id',
+                 postgresql_where=db.text('published_at IS NULL'),
+                 sqlite_where=db.text('published_at IS NULL')),
+    )
+
+class JobRecommendation(db.Model):
+    """One job in an applicant's precomputed feed; see app.recommendations."""
+    __tablename__ = 'job_recommendations'
+    applicant_id = db.Column(UUID(as_uuid=True), db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    job_id = db.Column(UUID(as_uuid=True), db.ForeignKey('jobs.id', ondelete='CASCADE'), primary_key=True)
+    score = db.Column(db.Float, nullable=False)
+    built_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    __table_args__ = (
+        db.Index('ix_job_recommendations_applicant_id_score', 'applicant_id', 'score', 'job_id'),
+        db.Index('ix_job_recommendations_job_id', 'job_id'),
+    )
+
+class ApplicationDailyStat(db.Model):
+    """Applications per job, day applied and current status; kept by triggers in app.stats."""
+    __tablename__ = 'application_daily_stats'
+    job_id = db.Column(UUID(as_uuid=True), db.ForeignKey('jobs.id', ondelete='CASCADE'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    status = db.Column(db.Enum(*APPLICATION_STATUSES, name='application_status'), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
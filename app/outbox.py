@@ -0,0 +1,200 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from datetime import date, datetime
+from flask import current_app
+from sqlalchemy import delete, func, insert, select, update
+from werkzeug.utils import import_string
+from app import db
+from app.models import OutboxEvent
+from app.recommendations import recommender
+
+logger = logging.getLogger(__name__)
+
+# pg_try_advisory_xact_lock key held by whichever relay is publishing.
+RELAY_LOCK_KEY = 0x6f7574626f78
+MAX_RETRY_DELAY = 60
+
+# Events are inserted after the row they describe has been written, so a
+# concurrent change to the same row waits on that row's lock and gets a higher
+# outbox id. Publishing in id order therefore keeps each aggregate's events
+# in commit order.
+
+def _jsonable(value):
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+def record_events(event_type, aggregate_type, events):
+    """Add ``(aggregate_id, payload)`` events to the current transaction with a single INSERT."""
+    now = datetime.utcnow()
+    rows = [{
+        'event_type': event_type,
+        'aggregate_type': aggregate_type,
+        'aggregate_id': aggregate_id,
+        'payload': {key: _jsonable(value) for key, value in payload.items()},
+        'created_at': now,
+    } for aggregate_id, payload in events]
+    if rows:
+        db.session.execute(insert(OutboxEvent), rows)
+        # Lets the SSE broker in this worker look for the events on commit.
+        db.session.info['outbox_pending'] = True
+
+def record_event(event_type, aggregate_type, aggregate_id, payload):
+    record_events(event_type, aggregate_type, [(aggregate_id, payload)])
+
+def event_message(row):
+    """The published form of an outbox row. Consumers deduplicate on ``id``."""
+    return {
+        'id': row.id,
+        'type': row.event_type,
+        'aggregate_type': row.aggregate_type,
+        'aggregate_id': str(row.aggregate_id),
+        'payload': row.payload,
+        'created_at': row.created_at.isoformat(),
+    }
+
+class LogSink:
+    """Logs each event as a JSON line."""
+
+    def publish(self, events):
+        for event in events:
+            logger.info(json.dumps(event, sort_keys=True))
+
+class FileSink:
+    """Appends each event to an NDJSON file, a stand-in for a broker."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def publish(self, events):
+        with open(self.path, 'a') as f:
+            f.writelines(json.dumps(event, sort_keys=True) + '\n' for event in events)
+            f.flush()
+            os.fsync(f.fileno())
+
+class QueueSink:
+    """Puts events on an in-process queue.Queue; for tests and local consumers."""
+
+    def __init__(self):
+        self.queue = queue.Queue()
+
+    def publish(self, events):
+        for event in events:
+            self.queue.put(event)
+
+def _make_sink(app):
+    sink = app.config['OUTBOX_SINK']
+    if not isinstance(sink, str):
+        return sink
+    if sink == 'log':
+        return LogSink()
+    if sink == 'file':
+        if not app.config['OUTBOX_FILE_PATH']:
+            raise RuntimeError('OUTBOX_SINK=file requires OUTBOX_FILE_PATH')
+        return FileSink(app.config['OUTBOX_FILE_PATH'])
+    if sink == 'queue':
+        return QueueSink()
+    # Anything else names a sink class, e.g. 'myapp.events:KafkaSink'.
+    return import_string(sink)()
+
+class _OutboxState:
+    def __init__(self, app):
+        self.sink = _make_sink(app)
+        self.batch_size = int(app.config['OUTBOX_BATCH_SIZE'])
+        self.poll_interval = float(app.config['OUTBOX_POLL_INTERVAL'])
+        self.lock = threading.Lock()
+
+class OutboxRelay:
+    """Publishes outbox events to the configured sink, at least once and in id order.
+
+    A sink is any object with ``publish(events)`` that raises if the events
+    were not delivered. ``OUTBOX_SINK`` is ``log``, ``file`` (NDJSON at
+    ``OUTBOX_FILE_PATH``), ``queue``, an import path of a sink class, or a sink
+    object. Events are only marked published after ``publish`` returns, so a
+    crash in between sends the batch again. Each batch also goes to the
+    recommender, whose feed updates commit with it.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['outbox'] = _OutboxState(app)
+
+    @property
+    def state(self):
+        return current_app.extensions['outbox']
+
+    @property
+    def sink(self):
+        return self.state.sink
+
+    def relay_once(self):
+        """Publish the oldest unpublished batch. Returns how many events went out."""
+        state = self.state
+        with state.lock:
+            try:
+                if db.engine.dialect.name == 'postgresql':
+                    # One relay at a time: two relays publishing different
+                    # batches could reorder an application's events.
+                    if not db.session.execute(select(func.pg_try_advisory_xact_lock(RELAY_LOCK_KEY))).scalar():
+                        db.session.rollback()
+                        return 0
+                rows = db.session.query(OutboxEvent) \
+                    .filter(OutboxEvent.published_at.is_(None)) \
+                    .order_by(OutboxEvent.id).limit(state.batch_size).all()
+                if not rows:
+                    db.session.rollback()
+                    return 0
+                messages = [event_message(row) for row in rows]
+                state.sink.publish(messages)
+                recommender.consume(messages)
+                db.session.execute(update(OutboxEvent)
+                                   .where(OutboxEvent.id.in_([row.id for row in rows]))
+                                   .values(published_at=datetime.utcnow()),
+                                   execution_options={'synchronize_session': False})
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            recommender.save_thresholds()
+        return len(rows)
+
+    def run(self, once=False):
+        """Relay until stopped, or with ``once`` until the outbox is empty. Returns the count published."""
+        state = self.state
+        published = failures = 0
+        while True:
+            try:
+                count = self.relay_once()
+                failures = 0
+            except Exception:
+                if once:
+                    raise
+                failures += 1
+                delay = min(state.poll_interval * 2 ** failures, MAX_RETRY_DELAY)
+                logger.exception('Outbox relay failed, retrying in %.1fs', delay)
+                time.sleep(delay)
+                continue
+            published += count
+            if count < state.batch_size:
+                if once:
+                    return published
+                time.sleep(state.poll_interval)
+
+    def prune(self, older_than):
+        """Delete events published before ``older_than``. Returns how many were deleted."""
+        deleted = db.session.execute(delete(OutboxEvent).where(OutboxEvent.published_at < older_than),
+                                     execution_options={'synchronize_session': False}).rowcount
+        db.session.commit()
+        return deleted
+
+outbox = OutboxRelay()
@@ -0,0 +1,114 @@
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from flask import current_app
+from werkzeug.security import check_password_hash, generate_password_hash
+
+logger = logging.getLogger(__name__)
+
+# Forking a threaded gunicorn worker can hand the children locks that another
+# thread held at the time; forkserver children start from a clean process.
+START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+class PasswordHasherBusy(Exception):
+    """Every hashing slot stayed taken for PASSWORD_HASH_QUEUE_TIMEOUT seconds."""
+
+def _hash(password, method):
+    return generate_password_hash(password, method=method)
+
+def _verify(stored, password):
+    return check_password_hash(stored, password)
+
+class _HasherState:
+    def __init__(self, app):
+        self.method = app.config['PASSWORD_HASH_METHOD']
+        self.workers = int(app.config['PASSWORD_HASH_WORKERS'])
+        self.queue_timeout = float(app.config['PASSWORD_HASH_QUEUE_TIMEOUT'])
+        # Hashes running or waiting for a worker; beyond this, callers get
+        # PasswordHasherBusy instead of piling up behind a login spike.
+        self.slots = threading.BoundedSemaphore(max(self.workers, 1) * 4)
+        self.executor = None
+        self.prefix = None
+        self.lock = threading.Lock()
+
+    def get_executor(self):
+        # Created on first use so gunicorn workers don't inherit the master's pool.
+        with self.lock:
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                    mp_context=multiprocessing.get_context(START_METHOD))
+            return self.executor
+
+    def discard_executor(self, executor):
+        # Only the thread that finds this pool broken first replaces it.
+        with self.lock:
+            if self.executor is executor:
+                self.executor = None
+        executor.shutdown(wait=False)
+
+class PasswordHasher:
+    """Hashes and verifies passwords, off the request thread if configured.
+
+    ``PASSWORD_HASH_METHOD`` is any Werkzeug method string, e.g. ``scrypt`` or
+    ``pbkdf2:sha256:600000``. With ``PASSWORD_HASH_WORKERS`` > 0 the work runs
+    in a process pool of that size, so a burst of logins can't starve the
+    worker's other requests of CPU; 0 hashes inline.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['passwords'] = _HasherState(app)
+
+    @property
+    def state(self):
+        return current_app.extensions['passwords']
+
+    def _run(self, function, *args):
+        state = self.state
+        if not state.workers:
+            return function(*args)
+        if not state.slots.acquire(timeout=state.queue_timeout):
+            raise PasswordHasherBusy()
+        try:
+            for _ in range(2):
+                executor = state.get_executor()
+                try:
+                    return executor.submit(function, *args).result()
+                except BrokenProcessPool:
+                    # A child died, e.g. OOM-killed; the pool refuses all
+                    # work from then on, so start a new one.
+                    logger.warning('Password hashing pool broke, restarting it')
+                    state.discard_executor(executor)
+            # Two pools in a row died; don't fail the login over it.
+            return function(*args)
+        finally:
+            state.slots.release()
+
+    def hash(self, password):
+        return self._run(_hash, password, self.state.method)
+
+    def verify(self, stored, password):
+        return self._run(_verify, stored, password)
+
+    def needs_rehash(self, stored):
+        """True if ``stored`` was made with other parameters than PASSWORD_HASH_METHOD."""
+        state = self.state
+        if state.prefix is None:
+            # Werkzeug fills in default parameters ('scrypt' -> 'scrypt:32768:8:1');
+            # hashing once is the reliable way to learn them.
+            state.prefix = _hash('', state.method).split('$', 1)[0]
+        return stored.split('$', 1)[0] != state.prefix
+
+    def shutdown(self):
+        state = self.state
+        with state.lock:
+            if state.executor is not None:
+                state.executor.shutdown()
+                state.executor = None
+
+passwords = PasswordHasher()
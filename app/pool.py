@@ -0,0 +1,114 @@
+import threading
+import time
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import NullPool, QueuePool
+
+# Callables taking (waited_seconds, failed), run for every timed checkout.
+checkout_observers = []
+
+class PoolStats:
+    """Counts checkouts and how long they waited for a connection.
+
+    ``failures`` are checkouts that raised, usually a pool timeout.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.failures = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def record(self, waited, failed=False):
+        with self._lock:
+            if failed:
+                self.failures += 1
+            else:
+                self.checkouts += 1
+            self.wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+        for observer in checkout_observers:
+            observer(waited, failed)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'checkouts': self.checkouts,
+                'failures': self.failures,
+                'wait_ms_total': round(self.wait_seconds * 1000, 3),
+                'wait_ms_max': round(self.max_wait_seconds * 1000, 3),
+                'wait_ms_avg': round(self.wait_seconds * 1000 / self.checkouts, 3) if self.checkouts else 0.0,
+            }
+
+class _TimedPool:
+    # Times _do_get, which is where a checkout blocks on a full pool (or, for
+    # NullPool, opens the connection), and keeps the stats across recreate().
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except Exception:
+            self.stats.record(time.perf_counter() - started, failed=True)
+            raise
+        self.stats.record(time.perf_counter() - started)
+        return connection
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+class TimedQueuePool(_TimedPool, QueuePool):
+    pass
+
+class TimedNullPool(_TimedPool, NullPool):
+    pass
+
+def engine_options(config):
+    """Build SQLALCHEMY_ENGINE_OPTIONS from the DB_POOL_* / DB_* settings.
+
+    ``DB_POOL_MODE=queue`` keeps a per-process pool of ``DB_POOL_SIZE`` plus
+    ``DB_MAX_OVERFLOW`` connections; ``null`` opens a connection per checkout
+    and leaves pooling to an external pooler such as PgBouncer. In-memory
+    SQLite keeps SQLAlchemy's own pool, since every new connection would be
+    a fresh, empty database.
+    """
+    uri = config.get('SQLALCHEMY_DATABASE_URI')
+    if not uri:
+        return {}
+    url = make_url(uri)
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        return {}
+    options = {'pool_pre_ping': config['DB_POOL_PRE_PING']}
+    if config['DB_POOL_MODE'] == 'null':
+        options['poolclass'] = TimedNullPool
+    else:
+        options.update(
+            poolclass=TimedQueuePool,
+            pool_size=config['DB_POOL_SIZE'],
+            max_overflow=config['DB_MAX_OVERFLOW'],
+            pool_timeout=config['DB_POOL_TIMEOUT'],
+            pool_recycle=config['DB_POOL_RECYCLE'],
+        )
+    if url.get_backend_name() == 'postgresql':
+        connect_args = {'application_name': config['DB_APPLICATION_NAME']}
+        if config['DB_STATEMENT_TIMEOUT_MS']:
+            connect_args['options'] = f"-c statement_timeout={config['DB_STATEMENT_TIMEOUT_MS']}"
+        options['connect_args'] = connect_args
+    return options
+
+def pool_status(engine):
+    pool = engine.pool
+    status = {'pool': type(pool).__name__, 'status': pool.status()}
+    if isinstance(pool, QueuePool):
+        status.update(size=pool.size(), checked_in=pool.checkedin(), checked_out=pool.checkedout(),
+                      overflow=pool.overflow(), timeout=pool.timeout())
+    stats = getattr(pool, 'stats', None)
+    if stats is not None:
+        status.update(stats.snapshot())
+    return status
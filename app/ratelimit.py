@@ -0,0 +1,237 @@
+import logging
+import math
+import os
+import random
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from flask import current_app, request
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+from app.utils import base_response
+
+try:
+    import redis
+except ImportError:  # optional, only needed for RATELIMIT_BACKEND=redis
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+LIMIT_PATTERN = re.compile(r'^(ip|user|route):(\d+)/(second|minute|hour|day)$')
+
+class Limit(namedtuple('Limit', 'scope capacity rate')):
+    """A token bucket: ``capacity`` requests at once, refilled at ``rate`` per second."""
+
+def parse_limits(spec):
+    """Parse ``'ip:5/minute,user:100/hour'``; each part is ``scope:count/period``."""
+    limits = []
+    for part in filter(None, (part.strip() for part in spec.split(','))):
+        match = LIMIT_PATTERN.match(part)
+        if not match:
+            raise ValueError(f'Invalid rate limit {part!r}; expected e.g. ip:5/minute')
+        scope, count, period = match.groups()
+        limits.append(Limit(scope, int(count), int(count) / PERIODS[period]))
+    return limits
+
+def refill(tokens, updated, now, limit):
+    """Take one token. Returns the tokens left and how long to wait if there was none."""
+    tokens = min(limit.capacity, tokens + max(0.0, now - updated) * limit.rate)
+    if tokens >= 1:
+        return tokens - 1, 0.0
+    return tokens, (1 - tokens) / limit.rate
+
+class MemoryBuckets:
+    """Per-worker buckets. The least recently used are dropped past ``max_keys``; a dropped bucket is full."""
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, limit):
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (limit.capacity, now))
+            tokens, wait = refill(tokens, updated, now, limit)
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return wait
+
+class SQLiteBuckets:
+    """Buckets in a SQLite file, shared by every worker process on the host.
+
+    Each take is one short ``BEGIN IMMEDIATE`` transaction on a WAL database
+    with ``synchronous=OFF``: the state is disposable, so it skips fsyncs.
+    """
+
+    CLEANUP_PROBABILITY = 0.001
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self):
+        # One connection per thread and process; gunicorn forks after import.
+        if getattr(self._local, 'pid', None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=OFF')
+            connection.execute('CREATE TABLE IF NOT EXISTS buckets '
+                               '(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL, full_at REAL NOT NULL)')
+            connection.execute('CREATE INDEX IF NOT EXISTS ix_buckets_full_at ON buckets (full_at)')
+            self._local.connection, self._local.pid = connection, os.getpid()
+        return self._local.connection
+
+    def take(self, key, limit):
+        connection = self._connection()
+        now = time.time()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute('SELECT tokens, updated FROM buckets WHERE key = ?', (key,)).fetchone()
+            tokens, wait = refill(*(row or (limit.capacity, now)), now, limit)
+            connection.execute(
+                'INSERT INTO buckets (key, tokens, updated, full_at) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT (key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated, full_at = excluded.full_at',
+                (key, tokens, now, now + (limit.capacity - tokens) / limit.rate))
+            if random.random() < self.CLEANUP_PROBABILITY:
+                # A bucket that has refilled is the same as no bucket.
+                connection.execute('DELETE FROM buckets WHERE full_at < ?', (now,))
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        return wait
+
+class RedisBuckets:
+    """Buckets in Redis, shared by every worker on every host. Uses the server clock."""
+
+    SCRIPT = """
+    local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+    local capacity, rate = tonumber(ARGV[1]), tonumber(ARGV[2])
+    local clock = redis.call('TIME')
+    local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+    local tokens = math.min(capacity, (tonumber(bucket[1]) or capacity) + math.max(0, now - (tonumber(bucket[2]) or now)) * rate)
+    local wait = 0
+    if tokens >= 1 then tokens = tokens - 1 else wait = (1 - tokens) / rate end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+    redis.call('EXPIRE', KEYS[1], math.ceil((capacity - tokens) / rate) + 1)
+    return tostring(wait)
+    """
+
+    def __init__(self, client, prefix='joblisting:ratelimit:'):
+        self.prefix = prefix
+        self._take = client.register_script(self.SCRIPT)
+
+    def take(self, key, limit):
+        return float(self._take(keys=[self.prefix + key], args=[limit.capacity, limit.rate]))
+
+def _make_backend(app):
+    backend = app.config['RATELIMIT_BACKEND']
+    if backend == 'memory':
+        return MemoryBuckets(int(app.config['RATELIMIT_MAX_KEYS']))
+    if backend == 'sqlite':
+        path = app.config['RATELIMIT_SQLITE_PATH'] or os.path.join(tempfile.gettempdir(), 'joblisting-ratelimit.db')
+        return SQLiteBuckets(path)
+    if backend == 'redis':
+        client = app.config.get('RATELIMIT_REDIS_CLIENT')
+        if client is None:
+            if redis is None:
+                raise RuntimeError('RATELIMIT_BACKEND=redis requires the redis package')
+            client = redis.Redis.from_url(app.config['RATELIMIT_REDIS_URL'])
+        return RedisBuckets(client, app.config['CACHE_KEY_PREFIX'] + 'ratelimit:')
+    raise RuntimeError(f'Unknown RATELIMIT_BACKEND {backend!r}')
+
+class _RateLimitState:
+    def __init__(self, app):
+        self.enabled = app.config['RATELIMIT_ENABLED']
+        proxy_count = app.config['RATELIMIT_PROXY_COUNT']
+        self.proxy_count = None if proxy_count in (None, '') else int(proxy_count)
+        self.rules = {endpoint: parse_limits(spec) for endpoint, spec in app.config['RATELIMIT_RULES'].items()}
+        self.backend = _make_backend(app) if self.enabled else None
+        self.warned_forwarded = False
+        if self.enabled and self.proxy_count is None and any(
+                limit.scope == 'ip' for limits in self.rules.values() for limit in limits):
+            logger.warning('ip rate limits are off until RATELIMIT_PROXY_COUNT is set '
+                           '(0 if clients connect directly, else the number of proxies)')
+
+class RateLimiter:
+    """Token-bucket rate limits on the endpoints named in ``RATELIMIT_RULES``.
+
+    Each rule maps an endpoint to limits such as ``ip:5/minute,user:100/hour``.
+    There is one bucket per endpoint and client IP, JWT identity, or for the
+    whole route. ``ip`` limits only apply once ``RATELIMIT_PROXY_COUNT`` says
+    where the client address comes from; guessing wrong behind a proxy would
+    put every client in the proxy's bucket. A request that finds a bucket empty is answered with ``429``
+    and a ``Retry-After`` header before the view runs, so a throttled login
+    never reaches password hashing and a throttled apply never reads its upload.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['ratelimit'] = _RateLimitState(app)
+        app.before_request(self._check)
+
+    @property
+    def state(self):
+        return current_app.extensions['ratelimit']
+
+    def client_ip(self, state):
+        if state.proxy_count is None:
+            return None
+        # Behind N proxies that each append to X-Forwarded-For, the client is
+        # the Nth entry from the end; anything before it can be forged.
+        if state.proxy_count:
+            route = request.access_route
+            if len(route) >= state.proxy_count:
+                return route[-state.proxy_count]
+        elif 'X-Forwarded-For' in request.headers and not state.warned_forwarded:
+            state.warned_forwarded = True
+            logger.error('Request arrived through a proxy (X-Forwarded-For: %s) but RATELIMIT_PROXY_COUNT is 0; '
+                         'ip rate limits are counting the proxy, not the client', request.headers['X-Forwarded-For'])
+        return request.remote_addr
+
+    def _identity(self):
+        try:
+            verify_jwt_in_request(optional=True)
+        except Exception:
+            return None  # the view will reject the token itself
+        return get_jwt_identity()
+
+    def _check(self):
+        state = self.state
+        if not state.enabled:
+            return None
+        limits = state.rules.get(request.endpoint)
+        if not limits:
+            return None
+        wait = 0.0
+        for limit in limits:
+            if limit.scope == 'ip':
+                value = self.client_ip(state)
+            elif limit.scope == 'user':
+                value = self._identity()
+            else:
+                value = '*'
+            if value is None:
+                continue
+            try:
+                wait = max(wait, state.backend.take(f'{request.endpoint}:{limit.scope}:{value}', limit))
+            except Exception:
+                # Fail open: a broken limiter store must not take logins down with it.
+                logger.warning('Rate limit backend failed for %s', request.endpoint, exc_info=True)
+        if not wait:
+            return None
+        response = base_response(False, 'Too many requests', None, ['Too many requests, please retry later.'])
+        response.status_code = 429
+        response.headers['Retry-After'] = str(math.ceil(wait))
+        return response
+
+rate_limiter = RateLimiter()
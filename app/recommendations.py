@@ -0,0 +1,345 @@
+import logging
+import math
+import os
+import re
+import threading
+import uuid
+from collections import Counter
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import delete, insert, tuple_
+from app import db
+from app.models import Application, Job, JobRecommendation
+
+try:
+    import numpy as np
+except ImportError:  # optional, only needed to build and update feeds
+    np = None
+
+logger = logging.getLogger(__name__)
+
+TOKEN = re.compile(r'[a-z][a-z0-9+#]*')
+STOP_WORDS = frozenset(
+    'about all also an and any are as at be by can for from has have in into is it its of on or our '
+    'that the their this to we who will with you your'.split()
+)
+TITLE_WEIGHT = 3
+# Scores are stored rounded so every JSON backend renders them the same.
+SCORE_DIGITS = 4
+CHUNK_SIZE = 1000
+
+def job_terms(title, description):
+    counts = Counter()
+    for weight, text in ((TITLE_WEIGHT, title), (1, description)):
+        for term in TOKEN.findall((text or '').lower()):
+            if len(term) > 1 and term not in STOP_WORDS:
+                counts[term] += weight
+    return counts
+
+def normalize(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return matrix / norms
+
+class RecommendationModel:
+    """Vocabulary, IDF weights and applicant profiles from the last full build.
+
+    A job is the L2-normalised TF-IDF vector of its title and description, an
+    applicant the normalised sum of the jobs they applied to, and a score the
+    dot product of the two (their cosine similarity).
+    """
+
+    def __init__(self, vocabulary, idf, applicant_ids=(), profiles=None, thresholds=None, feed_size=0):
+        self.vocabulary = vocabulary
+        self.idf = idf
+        self.applicant_ids = list(applicant_ids)
+        self.profiles = profiles if profiles is not None else np.zeros((0, len(vocabulary)), np.float16)
+        self.thresholds = thresholds if thresholds is not None else np.zeros(0, np.float32)
+        self.feed_size = feed_size
+
+    @classmethod
+    def fit(cls, documents, max_features):
+        """Vocabulary and IDF from ``documents``, a list of term Counters."""
+        frequencies = Counter()
+        for counts in documents:
+            frequencies.update(counts.keys())
+        # Alphabetical among equally common terms, so rebuilds are reproducible.
+        common = sorted(frequencies.items(), key=lambda item: (-item[1], item[0]))[:max_features]
+        df = np.array([count for _, count in common], dtype=np.float32)
+        idf = np.log((1 + len(documents)) / (1 + df)) + 1
+        return cls({term: column for column, (term, _) in enumerate(common)}, idf.astype(np.float32))
+
+    def vectorize(self, documents):
+        matrix = np.zeros((len(documents), len(self.vocabulary)), dtype=np.float32)
+        for row, counts in enumerate(documents):
+            for term, count in counts.items():
+                column = self.vocabulary.get(term)
+                if column is not None:
+                    matrix[row, column] = 1 + math.log(count)
+        return normalize(matrix * self.idf)
+
+    def scores(self, vectors, start=0, stop=None):
+        # Profiles are kept as float16 to halve a worker's memory; score in float32.
+        return self.profiles[start:stop].astype(np.float32) @ vectors.T
+
+    def save(self, path):
+        terms = sorted(self.vocabulary, key=self.vocabulary.get)
+        partial = f'{path}.tmp'
+        with open(partial, 'wb') as f:
+            np.savez(f, terms=np.array(terms, dtype=str), idf=self.idf,
+                     applicant_ids=np.array(self.applicant_ids, dtype=str), profiles=self.profiles,
+                     thresholds=self.thresholds, feed_size=np.array(self.feed_size))
+        os.replace(partial, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            vocabulary = {term: column for column, term in enumerate(data['terms'].tolist())}
+            return cls(vocabulary, data['idf'], data['applicant_ids'].tolist(), data['profiles'],
+                       data['thresholds'], int(data['feed_size']))
+
+def _write_feeds(rows):
+    for start in range(0, len(rows), CHUNK_SIZE):
+        db.session.execute(insert(JobRecommendation), rows[start:start + CHUNK_SIZE])
+
+def build_recommendations(feed_size, max_features, candidate_jobs, history, batch_size=256, log=logger.info):
+    """Recompute every applicant's feed from scratch and return the fitted model.
+
+    The newest ``candidate_jobs`` jobs are the candidates and define the
+    vocabulary. Applicants are processed ``batch_size`` at a time: their latest
+    ``history`` applications form the profile, every job they applied to is
+    left out of the feed, and their feed rows are replaced in one commit.
+    """
+    started = datetime.utcnow()
+    candidates = db.session.query(Job.id, Job.title, Job.description) \
+        .order_by(Job.created_at.desc(), Job.id.desc()).limit(candidate_jobs).all()
+    documents = [job_terms(job.title, job.description) for job in candidates]
+    model = RecommendationModel.fit(documents, max_features)
+    model.feed_size = feed_size
+    jobs = model.vectorize(documents)
+    column_of = {job.id: column for column, job in enumerate(candidates)}
+    log(f'candidates: {len(candidates)} jobs, {len(model.vocabulary)} terms')
+
+    applicant_ids, profiles, thresholds = [], [], []
+    last_id = None
+    while True:
+        query = db.session.query(Application.applicant_id).distinct()
+        if last_id is not None:
+            query = query.filter(Application.applicant_id > last_id)
+        block = [row.applicant_id for row in query.order_by(Application.applicant_id).limit(batch_size)]
+        if not block:
+            break
+        last_id = block[-1]
+        applied = {}
+        for applicant_id, job_id in db.session.query(Application.applicant_id, Application.job_id) \
+                .filter(Application.applicant_id.in_(block)) \
+                .order_by(Application.applicant_id, Application.applied_at.desc()):
+            applied.setdefault(applicant_id, []).append(job_id)
+        # Recent applications to jobs older than the candidates still shape the profile.
+        older = {job_id for job_ids in applied.values() for job_id in job_ids[:history] if job_id not in column_of}
+        extra = {}
+        if older:
+            rows = db.session.query(Job.id, Job.title, Job.description).filter(Job.id.in_(older)).all()
+            vectors = model.vectorize([job_terms(job.title, job.description) for job in rows])
+            extra = {job.id: vector for job, vector in zip(rows, vectors)}
+
+        block_profiles = np.zeros((len(block), len(model.vocabulary)), dtype=np.float32)
+        for row, applicant_id in enumerate(block):
+            for job_id in applied[applicant_id][:history]:
+                if job_id in column_of:
+                    block_profiles[row] += jobs[column_of[job_id]]
+                elif job_id in extra:
+                    block_profiles[row] += extra[job_id]
+        block_profiles = normalize(block_profiles)
+        scores = block_profiles @ jobs.T
+        for row, applicant_id in enumerate(block):
+            scores[row, [column_of[job_id] for job_id in applied[applicant_id] if job_id in column_of]] = -1
+
+        # Rows written by incremental updates since the build started are newer than ours.
+        newer = {(applicant_id, job_id) for applicant_id, job_id in db.session.query(
+            JobRecommendation.applicant_id, JobRecommendation.job_id
+        ).filter(JobRecommendation.applicant_id.in_(block), JobRecommendation.built_at >= started)}
+        db.session.execute(delete(JobRecommendation).where(JobRecommendation.applicant_id.in_(block),
+                                                           JobRecommendation.built_at < started))
+        feed_rows = []
+        size = min(feed_size, len(candidates))
+        top = np.argpartition(-scores, size - 1, axis=1)[:, :size] if size else np.zeros((len(block), 0), int)
+        for row, applicant_id in enumerate(block):
+            feed = [(round(float(scores[row, column]), SCORE_DIGITS), column) for column in top[row]]
+            feed = [(score, column) for score, column in feed if score > 0]
+            thresholds.append(min(feed)[0] if len(feed) >= feed_size else 0.0)
+            feed_rows.extend({'applicant_id': applicant_id, 'job_id': candidates[column].id, 'score': score, 'built_at': started}
+                             for score, column in feed if (applicant_id, candidates[column].id) not in newer)
+        _write_feeds(feed_rows)
+        db.session.commit()
+        applicant_ids.extend(str(applicant_id) for applicant_id in block)
+        profiles.append(block_profiles.astype(np.float16))
+        log(f'applicants: {len(applicant_ids)}')
+
+    # Applicants whose applications are all gone keep no feed.
+    db.session.execute(delete(JobRecommendation).where(JobRecommendation.built_at < started))
+    db.session.commit()
+    model.applicant_ids = applicant_ids
+    if profiles:
+        model.profiles = np.concatenate(profiles)
+    model.thresholds = np.array(thresholds, dtype=np.float32)
+    return model
+
+def add_jobs_to_feeds(model, job_ids, batch_size=10000):
+    """Score new jobs against every profile and merge them into the feeds they make.
+
+    Returns how many feed rows were written and raises ``model.thresholds``
+    for the feeds that filled up; the caller commits. Feeds are trimmed back
+    to the model's feed size, so this is cheap enough to run for every new job.
+    """
+    jobs = db.session.query(Job.id, Job.title, Job.description).filter(Job.id.in_(job_ids)).all()
+    if not jobs or not model.applicant_ids:
+        return 0
+    # Skip jobs already in a feed (a build may have got there first) or applied to.
+    present = set()
+    for model_class in (JobRecommendation, Application):
+        present.update(db.session.query(model_class.applicant_id, model_class.job_id)
+                       .filter(model_class.job_id.in_([job.id for job in jobs])))
+    vectors = model.vectorize([job_terms(job.title, job.description) for job in jobs])
+    now = datetime.utcnow()
+    rows, affected = [], set()
+    for start in range(0, len(model.applicant_ids), batch_size):
+        scores = np.round(model.scores(vectors, start, start + batch_size), SCORE_DIGITS)
+        thresholds = model.thresholds[start:start + batch_size, None]
+        for row, column in zip(*np.nonzero((scores > thresholds) & (scores > 0))):
+            applicant = start + row
+            applicant_id = uuid.UUID(model.applicant_ids[applicant])
+            if (applicant_id, jobs[column].id) in present:
+                continue
+            affected.add(applicant)
+            rows.append({'applicant_id': applicant_id, 'job_id': jobs[column].id,
+                         'score': float(scores[row, column]), 'built_at': now})
+    if not rows:
+        return 0
+    _write_feeds(rows)
+    affected = sorted(affected)
+    for start in range(0, len(affected), CHUNK_SIZE):
+        indexes = affected[start:start + CHUNK_SIZE]
+        feeds = {}
+        for applicant_id, job_id, score in db.session.query(
+                JobRecommendation.applicant_id, JobRecommendation.job_id, JobRecommendation.score) \
+                .filter(JobRecommendation.applicant_id.in_([uuid.UUID(model.applicant_ids[i]) for i in indexes])) \
+                .order_by(JobRecommendation.applicant_id, JobRecommendation.score.desc(), JobRecommendation.job_id.desc()):
+            feeds.setdefault(str(applicant_id), []).append((applicant_id, job_id, score))
+        dropped = []
+        for index in indexes:
+            feed = feeds.get(model.applicant_ids[index], [])
+            dropped.extend((applicant_id, job_id) for applicant_id, job_id, _ in feed[model.feed_size:])
+            if len(feed) >= model.feed_size:
+                model.thresholds[index] = feed[model.feed_size - 1][2]
+        if dropped:
+            db.session.execute(delete(JobRecommendation).where(
+                tuple_(JobRecommendation.applicant_id, JobRecommendation.job_id).in_(dropped)))
+    return len(rows)
+
+class _RecommenderState:
+    def __init__(self, app):
+        self.updates = app.config['RECOMMENDATION_UPDATES']
+        self.model_path = app.config['RECOMMENDATION_MODEL_PATH'] or os.path.join(app.instance_path, 'recommendations.npz')
+        self.feed_size = int(app.config['RECOMMENDATION_FEED_SIZE'])
+        self.max_features = int(app.config['RECOMMENDATION_MAX_FEATURES'])
+        self.candidate_jobs = int(app.config['RECOMMENDATION_CANDIDATE_JOBS'])
+        self.history = int(app.config['RECOMMENDATION_HISTORY'])
+        self.model = None
+        self.model_mtime = None
+        self.thresholds_changed = False
+        self.lock = threading.Lock()
+
+class Recommender:
+    """Precomputed per-applicant job feeds, served by GET /jobs/recommended.
+
+    ``flask build-recommendations`` rebuilds every feed and saves the model
+    to ``RECOMMENDATION_MODEL_PATH``. New jobs are then scored against the
+    saved profiles by the outbox relay, which hands every batch of events to
+    ``consume``: a single consumer, so web workers never load the profiles
+    and the feed thresholds have one writer. ``RECOMMENDATION_UPDATES=off``
+    turns that off.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if app.config['RECOMMENDATION_UPDATES'] not in ('relay', 'off'):
+            raise RuntimeError(f"Unknown RECOMMENDATION_UPDATES {app.config['RECOMMENDATION_UPDATES']!r}")
+        if app.config['RECOMMENDATION_UPDATES'] != 'off' and np is None:
+            raise RuntimeError('RECOMMENDATION_UPDATES requires the numpy package (or set it to off)')
+        app.extensions['recommendations'] = _RecommenderState(app)
+
+    @property
+    def state(self):
+        return current_app.extensions['recommendations']
+
+    def build(self, batch_size=256, log=logger.info):
+        if np is None:
+            raise RuntimeError('Building recommendations requires the numpy package')
+        state = self.state
+        model = build_recommendations(state.feed_size, state.max_features, state.candidate_jobs,
+                                      state.history, batch_size, log)
+        os.makedirs(os.path.dirname(os.path.abspath(state.model_path)), exist_ok=True)
+        model.save(state.model_path)
+        with state.lock:
+            state.model, state.model_mtime = model, os.path.getmtime(state.model_path)
+        return model
+
+    def model(self):
+        """The last built model, reloaded when a newer build is saved. None before the first build."""
+        state = self.state
+        try:
+            mtime = os.path.getmtime(state.model_path)
+        except FileNotFoundError:
+            return None
+        with state.lock:
+            if state.model is None or mtime != state.model_mtime:
+                state.model, state.model_mtime = RecommendationModel.load(state.model_path), mtime
+            return state.model
+
+    def consume(self, events):
+        """Merge the jobs of ``job.created`` events into the feeds, in the caller's transaction.
+
+        The relay commits the feed rows together with marking the batch
+        published, so each job is merged once. A failure is logged and skips
+        the batch's jobs rather than holding up event delivery.
+        """
+        state = self.state
+        job_ids = [uuid.UUID(event['aggregate_id']) for event in events if event['type'] == 'job.created']
+        if state.updates == 'off' or not job_ids:
+            return
+        model = self.model()
+        if model is None:
+            return
+        try:
+            with db.session.begin_nested():
+                written = add_jobs_to_feeds(model, job_ids)
+        except Exception:
+            logger.exception('Updating recommendation feeds for %d new job(s) failed', len(job_ids))
+            # The thresholds may have been raised for rows that were rolled back.
+            with state.lock:
+                state.model = None
+            return
+        if written:
+            with state.lock:
+                state.thresholds_changed = True
+
+    def save_thresholds(self):
+        """Write thresholds raised by ``consume`` back to the model file, once its rows have committed."""
+        state = self.state
+        with state.lock:
+            if not state.thresholds_changed or state.model is None:
+                return
+            state.thresholds_changed = False
+            try:
+                if os.path.getmtime(state.model_path) != state.model_mtime:
+                    return  # a newer build replaced the model; its thresholds are current
+            except FileNotFoundError:
+                return
+            state.model.save(state.model_path)
+            state.model_mtime = os.path.getmtime(state.model_path)
+
+recommender = Recommender()
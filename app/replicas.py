@@ -0,0 +1,117 @@
+import logging
+import random
+import threading
+import time
+from functools import wraps
+from flask import current_app, request
+from flask_jwt_extended import get_jwt_identity
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine
+from sqlalchemy.exc import DBAPIError, OperationalError
+from app.cache import cache
+from app.pool import engine_options
+
+logger = logging.getLogger(__name__)
+
+class RoutingSession(Session):
+    """Session that reads from the engine in ``info['replica']`` while one is set.
+
+    Flushes always go to the primary, so an accidental write in a read-only
+    view fails loudly there instead of landing on a replica.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        replica = self.info.get('replica')
+        if replica is not None and bind is None and not self._flushing:
+            return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+class _RouterState:
+    def __init__(self, app):
+        # Plain engines rather than Flask-SQLAlchemy binds: replicas carry the
+        # primary's schema, not models of their own.
+        self.engines = {
+            f'replica_{i}': create_engine(url, **engine_options(dict(app.config, SQLALCHEMY_DATABASE_URI=url)))
+            for i, url in enumerate(app.config['DATABASE_REPLICA_URLS'])
+        }
+        self.keys = list(self.engines)
+        self.sticky_seconds = int(app.config['REPLICA_STICKY_SECONDS'])
+        self.retry_seconds = int(app.config['REPLICA_RETRY_SECONDS'])
+        self.down_until = {}
+        self.lock = threading.Lock()
+
+class ReplicaRouter:
+    """Sends read-only views to a replica, with read-your-writes stickiness.
+
+    A user who made a successful write is pinned to the primary for
+    ``REPLICA_STICKY_SECONDS`` so they see their own change despite replica
+    lag; the marker lives in the cache, so use the redis backend to share it
+    between workers. A replica that fails to answer is skipped for
+    ``REPLICA_RETRY_SECONDS`` and the view is re-run on the primary.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['replicas'] = _RouterState(app)
+        if app.config['DATABASE_REPLICA_URLS'] and app.config['CACHE_BACKEND'] != 'redis':
+            logger.warning('Replica stickiness is kept in the %s cache, so a user is only pinned to the primary '
+                           'on the worker that took their write; use CACHE_BACKEND=redis', app.config['CACHE_BACKEND'])
+        app.after_request(self._remember_write)
+
+    @property
+    def state(self):
+        return current_app.extensions['replicas']
+
+    def choose(self):
+        state = self.state
+        now = time.monotonic()
+        with state.lock:
+            healthy = [key for key in state.keys if state.down_until.get(key, 0) <= now]
+        return random.choice(healthy) if healthy else None
+
+    def mark_down(self, key):
+        state = self.state
+        with state.lock:
+            state.down_until[key] = time.monotonic() + state.retry_seconds
+
+    def is_sticky(self, identity):
+        return identity is not None and cache.get(f'replicas:sticky:{identity}') is not None
+
+    def read_only(self, view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            key = self.choose()
+            if key is None or self.is_sticky(get_jwt_identity()):
+                return view(*args, **kwargs)
+            session = current_app.extensions['sqlalchemy'].session
+            session.info['replica'] = self.state.engines[key]
+            try:
+                return view(*args, **kwargs)
+            except DBAPIError as error:
+                if not isinstance(error, OperationalError) and not error.connection_invalidated:
+                    raise
+                logger.warning('Replica %s failed, reading from the primary: %s', key, error)
+                self.mark_down(key)
+            finally:
+                session.info.pop('replica', None)
+            session.rollback()
+            return view(*args, **kwargs)
+        return wrapper
+
+    def _remember_write(self, response):
+        state = self.state
+        if not state.keys or not state.sticky_seconds or request.method in ('GET', 'HEAD', 'OPTIONS') \
+                or response.status_code >= 400:
+            return response
+        try:
+            identity = get_jwt_identity()
+        except RuntimeError:  # endpoint without a JWT, e.g. signup
+            return response
+        if identity is not None:
+            cache.set(f'replicas:sticky:{identity}', b'1', ttl=state.sticky_seconds)
+        return response
+
+replicas = ReplicaRouter()
@@ -1,21 +1,37 @@
 import os
+import uuid
 import cloudinary
 import cloudinary.uploader
-from flask import Blueprint, request
-from flask_jwt_extended import get_jwt_identity, jwt_required
-from sqlalchemy import func
+from flask import Blueprint, current_app, request, stream_with_context
+from flask_jwt_extended import get_jwt, get_jwt_identity, jwt_required, verify_jwt_in_request
+from sqlalchemy import exists, func, select, update
 from app.models import Application, Job, User
 from app.schemas import ApplicationSchema
 from app import db
-from app.utils import base_response, paginated_response, role_required
+from app.utils import base_response, paginated_response, role_required, current_user_id, parse_uuid
+from app.pagination import paginate
+from app.exports import EXPORT_FORMATS, stream_rows
+from app.counters import begin_write, insert_application, record_status_change, record_status_changes
+from app.models import APPLICATION_STATUSES
+from app.uploads import resume_uploads, ResumeRejected, ResumeUploadError
+from app.replicas import replicas
+from app.outbox import record_event, record_events
+from app.streams import RETRY_MS, ROLE_EVENTS, StreamRejected, issue_ticket, redeem_ticket, replay_events, stream_broker
+from werkzeug.exceptions import RequestEntityTooLarge
 from werkzeug.utils import secure_filename
 from datetime import datetime
 from flasgger import swag_from
 
 bp = Blueprint('applications', __name__, url_prefix='/applications')
 
+def application_event(application_id, job_id, applicant_id, status):
+    return {'application_id': application_id, 'job_id': job_id, 'applicant_id': applicant_id, 'status': status}
+
 application_schema = ApplicationSchema()
 
+# Room for the job_id/cover_letter fields and multipart framing on top of the resume.
+FORM_OVERHEAD_BYTES = 64 * 1024
+
 # Correct Cloudinary config using your provided values
 cloudinary.config(
     cloud_name='dpasgcaqm',
@@ -26,12 +42,28 @@ cloudinary.config(
 @bp.route('/apply', methods=['POST'])
 @jwt_required()
 @role_required('applicant')
-@swag_from({'tags': ['Applications'], 'summary': 'Apply for job', 'description': 'Apply for a job (applicant only, with resume upload).', 'consumes': ['multipart/form-data'], 'parameters': [{'name': 'job_id', 'in': 'formData', 'type': 'string', 'required': True}, {'name': 'cover_letter', 'in': 'formData', 'type': 'string'}, {'name': 'resume', 'in': 'formData', 'type': 'file', 'required': True}], 'responses': {201: {'description': 'Application submitted'}, 400: {'description': 'Validation failed'}, 409: {'description': 'Duplicate application'}}})
+@swag_from({'tags': ['Applications'], 'summary': 'Apply for job', 'description': 'Apply for a job (applicant only, with resume upload).', 'consumes': ['multipart/form-data'], 'parameters': [{'name': 'job_id', 'in': 'formData', 'type': 'string', 'required': True}, {'name': 'cover_letter', 'in': 'formData', 'type': 'string'}, {'name': 'resume', 'in': 'formData', 'type': 'file', 'required': True}], 'responses': {201: {'description': 'Application submitted'}, 400: {'description': 'Validation failed'}, 409: {'description': 'Duplicate application'}, 413: {'description': 'Resume too large'}, 502: {'description': 'Resume upload failed'}}})
 def apply_job():
-    applicant = get_jwt_identity()
-    job_id = request.form.get('job_id')
-    cover_letter = request.form.get('cover_letter', '')
-    resume = request.files.get('resume')
+    applicant = current_user_id()
+    max_bytes = resume_uploads.state.max_bytes
+    message = f'Resume must be at most {max_bytes // (1024 * 1024)} MB.'
+    # Refuse oversized bodies from the header alone, before reading anything;
+    # chunked bodies have no length and are cut off once they pass the limit.
+    if request.content_length and request.content_length > max_bytes + FORM_OVERHEAD_BYTES:
+        return base_response(False, message, None, [message]), 413
+    request.max_content_length = max_bytes + FORM_OVERHEAD_BYTES
+    try:
+        job_id = request.form.get('job_id')
+        cover_letter = request.form.get('cover_letter', '')
+        resume = request.files.get('resume')
+        if resume:
+            resume_uploads.check(resume)
+    except ResumeRejected as e:
+        return base_response(False, e.message, None, [e.message]), e.status_code
+    except RequestEntityTooLarge:
+        if request.resume_spool is not None:
+            request.resume_spool.close()
+        return base_response(False, message, None, [message]), 413
     errors = []
     if not job_id:
         errors.append('Job ID is required.')
@@ -41,98 +73,302 @@ def apply_job():
         errors.append('Cover letter must be under 200 characters.')
     if errors:
         return base_response(False, 'Validation failed', None, errors), 400
-    job = Job.query.get(job_id)
-    if not job:
+    job_id = parse_uuid(job_id)
+    if not job_id:
         return base_response(False, 'Job not found', None, ['Job not found']), 404
-    # Check for duplicate application
-    existing = Application.query.filter_by(applicant_id=applicant, job_id=job_id).first()
-    if existing:
+    application_id = uuid.uuid4()
+    applied_at = datetime.utcnow()
+    resume_sha256 = resume_uploads.content_hash(resume)
+    resume_link = None
+    if not resume_uploads.is_async:
+        # A synchronous upload can take seconds, so it happens before any write:
+        # one read decides whether there is anything to upload, and the
+        # connection goes back to the pool before the upload starts.
+        previous = select(Application.resume_link).where(
+            Application.applicant_id == applicant,
+            Application.resume_sha256 == resume_sha256,
+            Application.resume_status == 'uploaded'
+        ).limit(1).scalar_subquery()
+        applied = exists().where(Application.applicant_id == applicant, Application.job_id == Job.id)
+        found = db.session.query(Job.id, applied, previous).filter(Job.id == job_id).first()
+        db.session.rollback()
+        if found is None:
+            return base_response(False, 'Job not found', None, ['Job not found']), 404
+        if found[1]:
+            return base_response(False, 'Duplicate application', None, ['You have already applied to this job.']), 409
+        resume_link = found[2]
+        if resume_link is None:
+            resume_uploads.spool(resume, application_id)
+            try:
+                resume_link = resume_uploads.upload(application_id)
+            except ResumeUploadError:
+                resume_uploads.discard(application_id)
+                return base_response(False, 'Resume upload failed', None, ['Resume upload failed, please try again.']), 502
+    # One statement checks the job exists, enforces unique_application and,
+    # unless the link is already known, picks up an earlier upload of the same resume.
+    row = insert_application(application_id, applicant, job_id, cover_letter, applied_at,
+                             resume_sha256, resume_link)
+    if row is None:
+        db.session.rollback()
+        if db.session.query(Job.id).filter_by(id=job_id).first() is None:
+            return base_response(False, 'Job not found', None, ['Job not found']), 404
         return base_response(False, 'Duplicate application', None, ['You have already applied to this job.']), 409
-    # Upload resume to Cloudinary
-    if resume and resume.filename.lower().endswith('.pdf'):
-        upload_result = cloudinary.uploader.upload(resume, resource_type='raw', folder='resumes', format='pdf')
-        resume_link = upload_result['secure_url']
-    else:
-        return base_response(False, 'Resume must be a PDF file.', None, ['Resume must be a PDF file.']), 400
-    application = Application(
-        applicant_id=applicant,
-        job_id=job_id,
-        resume_link=resume_link,
-        cover_letter=cover_letter,
-        status='Applied',
-        applied_at=datetime.utcnow()
-    )
-    db.session.add(application)
+    record_event('application.created', 'application', application_id,
+                 application_event(application_id, job_id, applicant, 'Applied'))
+    resume_link, resume_status = row.resume_link, row.resume_status
+    if resume_status == 'pending':
+        resume_uploads.spool(resume, application_id)
     db.session.commit()
-    return base_response(True, 'Application submitted', application_schema.dump(application)), 201
+    if resume_status == 'pending':
+        resume_uploads.submit(application_id)
+    application_data = application_schema.dump({
+        'id': application_id,
+        'applicant_id': applicant,
+        'job_id': job_id,
+        'resume_link': resume_link,
+        'resume_status': resume_status,
+        'cover_letter': cover_letter,
+        'status': 'Applied',
+        'applied_at': applied_at
+    })
+    return base_response(True, 'Application submitted', application_data), 201
 
 @bp.route('/my', methods=['GET'])
 @jwt_required()
 @role_required('applicant')
-@swag_from({'tags': ['Applications'], 'summary': 'Track my applications', 'description': 'Track my applications (applicant only, paginated).', 'parameters': [{'name': 'page', 'in': 'query', 'type': 'integer'}, {'name': 'page_size', 'in': 'query', 'type': 'integer'}], 'responses': {200: {'description': 'Applications fetched'}}})
+@replicas.read_only
+@swag_from({'tags': ['Applications'], 'summary': 'Track my applications', 'description': 'Track my applications (applicant only, paginated).', 'parameters': [{'name': 'page', 'in': 'query', 'type': 'integer'}, {'name': 'page_size', 'in': 'query', 'type': 'integer'}, {'name': 'cursor', 'in': 'query', 'type': 'string', 'description': 'Keyset cursor; pass empty for the first page, then NextCursor'}, {'name': 'total', 'in': 'query', 'type': 'string', 'enum': ['exact', 'approx', 'none']}], 'responses': {200: {'description': 'Applications fetched'}}})
 def my_applications():
-    identity = get_jwt_identity()
-    page = int(request.args.get('page', 1))
-    page_size = int(request.args.get('page_size', 10))
-    query = Application.query.filter_by(applicant_id=identity)
-    total = query.count()
-    applications = query.order_by(Application.applied_at.desc()).offset((page-1)*page_size).limit(page_size).all()
-    result = []
-    for app in applications:
-        job = Job.query.get(app.job_id)
-        company = User.query.get(job.created_by) if job else None
-        result.append({
-            'job_title': job.title if job else None,
-            'company_name': company.name if company else None,
-            'status': app.status,
-            'applied_at': app.applied_at
-        })
-    return paginated_response(True, 'Applications fetched', result, page, page_size, total)
+    identity = current_user_id()
+    query = db.session.query(
+        Application.id,
+        Job.title.label('job_title'),
+        User.name.label('company_name'),
+        Application.status,
+        Application.applied_at
+    ).join(Job, Application.job_id == Job.id) \
+        .join(User, Job.created_by == User.id) \
+        .filter(Application.applicant_id == identity)
+    page = paginate(query, Application.applied_at, Application.id,
+                    count_query=Application.query.filter_by(applicant_id=identity))
+    result = [{
+        'job_title': row.job_title,
+        'company_name': row.company_name,
+        'status': row.status,
+        'applied_at': row.applied_at
+    } for row in page.items]
+    return paginated_response(True, 'Applications fetched', result, page.number, page.size, page.total, next_cursor=page.next_cursor)
+
+@bp.route('/stream/ticket', methods=['POST'])
+@jwt_required()
+@swag_from({'tags': ['Applications'], 'summary': 'Issue a stream ticket', 'description': 'A short-lived, single-use ticket for GET /applications/stream?ticket=. EventSource cannot send headers, and access tokens must not end up in URLs and access logs.', 'responses': {201: {'description': 'Ticket issued'}, 403: {'description': 'Unauthorized'}}})
+def stream_ticket():
+    role = get_jwt().get('role')
+    if role not in ROLE_EVENTS:
+        return base_response(False, 'Unauthorized', None, ['Unauthorized']), 403
+    ticket = issue_ticket(role, current_user_id())
+    return base_response(True, 'Stream ticket issued', {'ticket': ticket, 'expires_in': current_app.config['SSE_TICKET_SECONDS']}), 201
+
+@bp.route('/stream', methods=['GET'])
+@swag_from({'tags': ['Applications'], 'summary': 'Stream application updates', 'description': 'Server-Sent Events: applicants receive status changes of their applications, companies receive new applications on their jobs. Authenticate with a Bearer token or, from EventSource, with ?ticket= from POST /applications/stream/ticket. Reconnect with Last-Event-ID to replay missed events.', 'produces': ['text/event-stream'], 'parameters': [{'name': 'ticket', 'in': 'query', 'type': 'string'}, {'name': 'Last-Event-ID', 'in': 'header', 'type': 'integer'}], 'responses': {200: {'description': 'Event stream'}, 400: {'description': 'Invalid Last-Event-ID'}, 401: {'description': 'Invalid or expired ticket'}, 429: {'description': 'Too many streams for this user'}, 503: {'description': 'Too many streams on this worker'}}})
+def stream_applications():
+    ticket = request.args.get('ticket')
+    if ticket:
+        redeemed = redeem_ticket(ticket)
+        if redeemed is None:
+            return base_response(False, 'Invalid stream ticket', None, ['Stream ticket is invalid, expired or already used.']), 401
+        role, identity = redeemed
+    else:
+        verify_jwt_in_request()
+        role, identity = get_jwt().get('role'), current_user_id()
+    if role not in ROLE_EVENTS:
+        return base_response(False, 'Unauthorized', None, ['Unauthorized']), 403
+    last_event_id = request.headers.get('Last-Event-ID', request.args.get('last_event_id', '0'))
+    if not last_event_id.isdigit():
+        return base_response(False, 'Invalid Last-Event-ID', None, ['Last-Event-ID must be an event id.']), 400
+    # Subscribe before replaying so nothing committed in between is missed;
+    # the stream drops the overlap by id.
+    try:
+        subscription = stream_broker.subscribe(role, identity)
+    except StreamRejected as e:
+        response = base_response(False, 'Too many streams', None, [e.message])
+        response.status_code = e.status_code
+        response.headers['Retry-After'] = str(RETRY_MS // 1000)
+        return response
+    replay = replay_events(role, identity, int(last_event_id), stream_broker.state.replay_limit)
+    response = current_app.response_class(stream_broker.stream(subscription, replay, int(last_event_id)),
+                                          mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    response.call_on_close(lambda state=stream_broker.state: stream_broker.unsubscribe(state, subscription))
+    return response
 
 @bp.route('/job/<uuid:job_id>', methods=['GET'])
 @jwt_required()
 @role_required('company')
-@swag_from({'tags': ['Applications'], 'summary': 'View applications for a job', 'description': 'View applications for a job (company only, own jobs, paginated).', 'parameters': [{'name': 'job_id', 'in': 'path', 'type': 'string', 'required': True}, {'name': 'page', 'in': 'query', 'type': 'integer'}, {'name': 'page_size', 'in': 'query', 'type': 'integer'}], 'responses': {200: {'description': 'Job applications fetched'}, 403: {'description': 'Unauthorized access'}, 404: {'description': 'Job not found'}}})
+@replicas.read_only
+@swag_from({'tags': ['Applications'], 'summary': 'View applications for a job', 'description': 'View applications for a job (company only, own jobs, paginated).', 'parameters': [{'name': 'job_id', 'in': 'path', 'type': 'string', 'required': True}, {'name': 'page', 'in': 'query', 'type': 'integer'}, {'name': 'page_size', 'in': 'query', 'type': 'integer'}, {'name': 'cursor', 'in': 'query', 'type': 'string', 'description': 'Keyset cursor; pass empty for the first page, then NextCursor'}, {'name': 'total', 'in': 'query', 'type': 'string', 'enum': ['exact', 'approx', 'none']}], 'responses': {200: {'description': 'Job applications fetched'}, 403: {'description': 'Unauthorized access'}, 404: {'description': 'Job not found'}}})
 def job_applications(job_id):
-    identity = get_jwt_identity()
-    job = Job.query.get(job_id)
-    if not job:
+    identity = current_user_id()
+    created_by = db.session.query(Job.created_by).filter(Job.id == job_id).scalar()
+    if created_by is None:
         return base_response(False, 'Job not found', None, ['Job not found']), 404
-    if str(job.created_by) != identity['id']:
+    if created_by != identity:
         return base_response(False, 'Unauthorized access', None, ['Unauthorized access']), 403
-    page = int(request.args.get('page', 1))
-    page_size = int(request.args.get('page_size', 10))
-    query = Application.query.filter_by(job_id=job_id)
-    total = query.count()
-    applications = query.order_by(Application.applied_at.desc()).offset((page-1)*page_size).limit(page_size).all()
-    result = []
-    for app in applications:
-        applicant = User.query.get(app.applicant_id)
-        result.append({
-            'applicant_name': applicant.name if applicant else None,
-            'resume_link': app.resume_link,
-            'cover_letter': app.cover_letter,
-            'status': app.status,
-            'applied_at': app.applied_at
-        })
-    return paginated_response(True, 'Job applications fetched', result, page, page_size, total)
+    query = db.session.query(
+        Application.id,
+        User.name.label('applicant_name'),
+        Application.resume_link,
+        Application.cover_letter,
+        Application.status,
+        Application.applied_at
+    ).join(User, Application.applicant_id == User.id) \
+        .filter(Application.job_id == job_id)
+    page = paginate(query, Application.applied_at, Application.id,
+                    count_query=Application.query.filter_by(job_id=job_id))
+    result = [{
+        'applicant_name': row.applicant_name,
+        'resume_link': row.resume_link,
+        'cover_letter': row.cover_letter,
+        'status': row.status,
+        'applied_at': row.applied_at
+    } for row in page.items]
+    return paginated_response(True, 'Job applications fetched', result, page.number, page.size, page.total, next_cursor=page.next_cursor)
+
+@bp.route('/job/<uuid:job_id>/export', methods=['GET'])
+@jwt_required()
+@role_required('company')
+@swag_from({'tags': ['Applications'], 'summary': 'Export applications for a job', 'description': 'Stream every application for a job as NDJSON or CSV (company only, own jobs).', 'parameters': [{'name': 'job_id', 'in': 'path', 'type': 'string', 'required': True}, {'name': 'format', 'in': 'query', 'type': 'string', 'enum': ['ndjson', 'csv']}], 'produces': ['application/x-ndjson', 'text/csv'], 'responses': {200: {'description': 'Applications stream'}, 400: {'description': 'Unsupported format'}, 403: {'description': 'Unauthorized access'}, 404: {'description': 'Job not found'}}})
+def export_job_applications(job_id):
+    identity = current_user_id()
+    fmt = request.args.get('format', 'ndjson').lower()
+    if fmt not in EXPORT_FORMATS:
+        return base_response(False, 'Unsupported format', None, [f'format must be one of: {", ".join(EXPORT_FORMATS)}']), 400
+    created_by = db.session.query(Job.created_by).filter(Job.id == job_id).scalar()
+    if created_by is None:
+        return base_response(False, 'Job not found', None, ['Job not found']), 404
+    if created_by != identity:
+        return base_response(False, 'Unauthorized access', None, ['Unauthorized access']), 403
+    statement = select(
+        Application.id,
+        User.name.label('applicant_name'),
+        User.email.label('applicant_email'),
+        Application.resume_link,
+        Application.resume_status,
+        Application.cover_letter,
+        Application.status,
+        Application.applied_at
+    ).join(User, Application.applicant_id == User.id) \
+        .where(Application.job_id == job_id) \
+        .order_by(Application.applied_at, Application.id)
+    fields = ['id', 'applicant_name', 'applicant_email', 'resume_link', 'resume_status',
+              'cover_letter', 'status', 'applied_at']
+    body = stream_rows(statement, fields, fmt, current_app.config['EXPORT_BATCH_SIZE'])
+    response = current_app.response_class(stream_with_context(body), mimetype=EXPORT_FORMATS[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename=applications-{job_id}.{fmt}'
+    return response
 
 @bp.route('/status/<uuid:application_id>', methods=['PUT'])
 @jwt_required()
 @role_required('company')
 @swag_from({'tags': ['Applications'], 'summary': 'Update application status', 'description': 'Update application status (company only, own jobs).', 'parameters': [{'name': 'application_id', 'in': 'path', 'type': 'string', 'required': True}, {'name': 'body', 'in': 'body', 'required': True, 'schema': {'type': 'object', 'properties': {'status': {'type': 'string', 'enum': ['Applied', 'Reviewed', 'Interview', 'Rejected', 'Hired']}}}}], 'responses': {200: {'description': 'Application status updated'}, 400: {'description': 'Invalid status'}, 403: {'description': 'Unauthorized'}, 404: {'description': 'Application not found'}}})
 def update_application_status(application_id):
-    identity = get_jwt_identity()
+    identity = current_user_id()
     data = request.get_json()
     new_status = data.get('status')
-    if new_status not in ['Applied', 'Reviewed', 'Interview', 'Rejected', 'Hired']:
+    if new_status not in APPLICATION_STATUSES:
         return base_response(False, 'Invalid status', None, ['Invalid status']), 400
-    application = Application.query.get(application_id)
+    # Lock and re-read the row so the counters move out of the status it
+    # really has; a concurrent change waits here instead of being counted twice.
+    application = db.session.query(Application).filter(Application.id == application_id) \
+        .populate_existing().with_for_update().first()
     if not application:
         return base_response(False, 'Application not found', None, ['Application not found']), 404
-    job = Job.query.get(application.job_id)
-    if not job or str(job.created_by) != identity['id']:
+    job = db.session.get(Job, application.job_id)
+    if not job or job.created_by != identity:
+        db.session.rollback()
         return base_response(False, 'Unauthorized', None, ['Unauthorized']), 403
-    application.status = new_status
+    if application.status != new_status:
+        record_status_change(job.id, application.status, new_status)
+        application.status = new_status
+        # Flushing takes the row lock before the event gets its outbox id.
+        db.session.flush()
+        record_event('application.status_changed', 'application', application.id,
+                     application_event(application.id, job.id, application.applicant_id, new_status))
+    db.session.commit()
+    return base_response(True, 'Application status updated', application_schema.dump(application)), 200 
+
+@bp.route('/status/bulk', methods=['PUT'])
+@jwt_required()
+@role_required('company')
+@swag_from({'tags': ['Applications'], 'summary': 'Bulk update application status', 'description': 'Move many applications to a status at once (company only, own jobs). Select them either by application_ids or by job_id, optionally narrowed with from_status.', 'parameters': [{'name': 'body', 'in': 'body', 'required': True, 'schema': {'type': 'object', 'properties': {'status': {'type': 'string', 'enum': ['Applied', 'Reviewed', 'Interview', 'Rejected', 'Hired']}, 'application_ids': {'type': 'array', 'items': {'type': 'string'}}, 'job_id': {'type': 'string'}, 'from_status': {'type': 'string', 'enum': ['Applied', 'Reviewed', 'Interview', 'Rejected', 'Hired']}}, 'required': ['status']}}], 'responses': {200: {'description': 'Application statuses updated'}, 400: {'description': 'Validation failed'}, 403: {'description': 'Unauthorized'}, 404: {'description': 'Job not found'}}})
+def bulk_update_application_status():
+    identity = current_user_id()
+    data = request.get_json(silent=True) or {}
+    new_status = data.get('status')
+    from_status = data.get('from_status')
+    application_ids = data.get('application_ids')
+    job_id = data.get('job_id')
+    errors = []
+    if new_status not in APPLICATION_STATUSES:
+        errors.append('Invalid status')
+    if from_status is not None and from_status not in APPLICATION_STATUSES:
+        errors.append('Invalid from_status')
+    if (application_ids is None) == (job_id is None):
+        errors.append('Provide either application_ids or job_id.')
+    if application_ids is not None:
+        max_ids = current_app.config['BULK_STATUS_MAX_IDS']
+        if not isinstance(application_ids, list) or len(application_ids) > max_ids:
+            errors.append(f'application_ids must be a list of at most {max_ids} ids.')
+        else:
+            application_ids = [parse_uuid(value) for value in application_ids]
+            if None in application_ids:
+                errors.append('application_ids must be UUIDs.')
+    if job_id is not None:
+        job_id = parse_uuid(job_id)
+        if job_id is None:
+            errors.append('job_id must be a UUID.')
+    if errors:
+        return base_response(False, 'Validation failed', None, errors), 400
+
+    selection = []
+    if job_id is not None:
+        created_by = db.session.query(Job.created_by).filter(Job.id == job_id).scalar()
+        if created_by is None:
+            return base_response(False, 'Job not found', None, ['Job not found']), 404
+        if created_by != identity:
+            return base_response(False, 'Unauthorized', None, ['Unauthorized']), 403
+        selection.append(Application.job_id == job_id)
+    else:
+        selection.append(Application.id.in_(application_ids))
+    # One UPDATE per old status: each row's change is counted against the
+    # status it actually left, whatever commits concurrently. Every row
+    # touched returns its job's owner, which must be the caller.
+    owner = select(Job.created_by).where(Job.id == Application.job_id).scalar_subquery()
+    begin_write()
+    changed = []
+    moved = {}
+    for old_status in [from_status] if from_status else APPLICATION_STATUSES:
+        if old_status == new_status:
+            continue
+        rows = db.session.execute(
+            update(Application).where(*selection, Application.status == old_status)
+            .values(status=new_status)
+            .returning(Application.id, Application.job_id, Application.applicant_id, owner.label('created_by')),
+            execution_options={'synchronize_session': False}
+        ).all()
+        if any(row.created_by != identity for row in rows):
+            db.session.rollback()
+            return base_response(False, 'Unauthorized', None, ['Unauthorized']), 403
+        changed.extend(rows)
+        for row in rows:
+            counts = moved.setdefault(row.job_id, {})
+            counts[old_status] = counts.get(old_status, 0) + 1
+    updated = len(changed)
+    record_events('application.status_changed', 'application', [
+        (row.id, application_event(row.id, row.job_id, row.applicant_id, new_status)) for row in changed
+    ])
+    for group_job_id, counts in moved.items():
+        record_status_changes(group_job_id, counts, new_status)
     db.session.commit()
-    return base_response(True, 'Application status updated', application_schema.dump(application)), 200 
\ No newline at end of file
+    return base_response(True, 'Application statuses updated', {'Updated': updated, 'Status': new_status}), 200
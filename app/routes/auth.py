@@ -1,9 +1,10 @@
 from flask import Blueprint, request, jsonify
-from werkzeug.security import generate_password_hash, check_password_hash
 from flask_jwt_extended import create_access_token
 from app.models import User
 from app import db
+from app.passwords import passwords, PasswordHasherBusy
 import re
+from sqlalchemy import update
 from sqlalchemy.exc import IntegrityError
 from flasgger import swag_from
 
@@ -22,6 +23,9 @@ def base_response(success, message, obj=None, errors=None):
         'Errors': errors or None
     })
 
+def busy_response():
+    return base_response(False, 'Server busy', None, ['Too many sign-ins in progress, please retry shortly.']), 503, {'Retry-After': '1'}
+
 @bp.route('/signup', methods=['POST'])
 @swag_from({
     'tags': ['Auth'],
@@ -47,7 +51,8 @@ def base_response(success, message, obj=None, errors=None):
     'responses': {
         201: {'description': 'Signup successful'},
         400: {'description': 'Validation failed'},
-        409: {'description': 'Email already exists'}
+        409: {'description': 'Email already exists'},
+        503: {'description': 'Too many password hashes in progress'}
     }
 })
 def signup():
@@ -70,7 +75,10 @@ def signup():
     if errors:
         return base_response(False, 'Validation failed', None, errors), 400
 
-    hashed_pw = generate_password_hash(password)
+    try:
+        hashed_pw = passwords.hash(password)
+    except PasswordHasherBusy:
+        return busy_response()
     user = User(name=name, email=email, password=hashed_pw, role=role)
     try:
         db.session.add(user)
@@ -105,17 +113,26 @@ def signup():
     'responses': {
         200: {'description': 'Login successful'},
         401: {'description': 'Incorrect password'},
-        404: {'description': 'User not found'}
+        404: {'description': 'User not found'},
+        503: {'description': 'Too many password hashes in progress'}
     }
 })
 def login():
     data = request.get_json()
     email = data.get('email', '').strip().lower()
     password = data.get('password', '')
-    user = User.query.filter_by(email=email).first()
+    user = db.session.query(User.id, User.password, User.role).filter_by(email=email).first()
     if not user:
         return base_response(False, 'User not found', None, ['User not found']), 404
-    if not check_password_hash(user.password, password):
-        return base_response(False, 'Incorrect password', None, ['Incorrect password']), 401
+    try:
+        if not passwords.verify(user.password, password):
+            return base_response(False, 'Incorrect password', None, ['Incorrect password']), 401
+        if passwords.needs_rehash(user.password):
+            # Only replace the hash we verified, in case the password changed meanwhile.
+            db.session.execute(update(User).where(User.id == user.id, User.password == user.password)
+                               .values(password=passwords.hash(password)))
+            db.session.commit()
+    except PasswordHasherBusy:
+        return busy_response()
     token = create_access_token(identity=str(user.id), additional_claims={"role": user.role})
     return base_response(True, 'Login successful', {'token': token, 'user': {'id': str(user.id), 'role': user.role}}) 
\ No newline at end of file
@@ -1,15 +1,49 @@
-from flask import Blueprint, request
+import hashlib
+import json
+import uuid
+from datetime import datetime
+from flask import Blueprint, current_app, request
 from flask_jwt_extended import get_jwt_identity, jwt_required
-from sqlalchemy import func
-from app.models import Job, User, Application
+from sqlalchemy import exists, func, insert
+from app.models import Job, JobRecommendation, User, Application
 from app.schemas import JobSchema
+from app.serializers import RowSerializer
 from app import db
-from app.utils import base_response, paginated_response, role_required
+from app.utils import base_response, paginated_response, role_required, current_user_id
+from app.pagination import paginate
+from app.search import apply_text_search, substring_filter
+from app.counters import STATUS_COUNT_COLUMNS, status_counts
+from app.stats import daily_stats, funnel, since_days
+from app.cache import cache, cached_json_response, pack_response
+from app.replicas import replicas
+from app.outbox import record_event, record_events
+from app.recommendations import recommender
 from flasgger import swag_from
 
 bp = Blueprint('jobs', __name__, url_prefix='/jobs')
 
 job_schema = JobSchema()
+job_rows = RowSerializer(job_schema)
+
+BROWSE_CACHE_NAMESPACE = 'jobs:browse'
+BROWSE_CACHE_ARGS = ('q', 'title', 'location', 'company_name', 'page', 'page_size', 'cursor', 'total')
+
+def job_detail_key(job_id):
+    return f'jobs:detail:{job_id}'
+
+def browse_cache_key():
+    # Filters match case-insensitively, so fold case before they become a key
+    # (the opaque cursor is the exception).
+    args = {}
+    for name in BROWSE_CACHE_ARGS:
+        if name in request.args:
+            value = request.args[name]
+            args[name] = value if name == 'cursor' else value.lower()
+    digest = hashlib.sha1(json.dumps(args, sort_keys=True).encode()).hexdigest()
+    return f'{BROWSE_CACHE_NAMESPACE}:{cache.generation(BROWSE_CACHE_NAMESPACE)}:{digest}'
+
+def invalidate_job_listings():
+    cache.bump_generation(BROWSE_CACHE_NAMESPACE)
 
 @bp.route('', methods=['POST'])
 @jwt_required()
@@ -20,27 +54,129 @@ def create_job():
     errors = job_schema.validate(data)
     if errors:
         return base_response(False, 'Validation failed', None, list(errors.values())), 400
-    identity = get_jwt_identity()
+    identity = current_user_id()
     job = Job(
+        id=uuid.uuid4(),
         title=data['title'],
         description=data['description'],
         location=data.get('location'),
-        created_by=identity  # identity is now a string user id
+        created_by=identity
     )
     db.session.add(job)
+    record_event('job.created', 'job', job.id, job_event(job.id, job.title, job.location, identity))
     db.session.commit()
+    invalidate_job_listings()
     return base_response(True, 'Job created', job_schema.dump(job)), 201
 
+def job_event(job_id, title, location, created_by):
+    return {'job_id': job_id, 'title': title, 'location': location, 'created_by': created_by}
+
+class TooManyJobs(Exception):
+    pass
+
+def read_bulk_items(max_items):
+    """Yield ``(index, item, error)`` for each job in a JSON array or NDJSON body.
+
+    Raises TooManyJobs once the body holds more than ``max_items`` jobs.
+    """
+    if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+        # Parse line by line off the request stream instead of buffering the body.
+        count = 0
+        for index, line in enumerate(request.stream):
+            line = line.strip()
+            if not line:
+                continue
+            count += 1
+            if count > max_items:
+                raise TooManyJobs()
+            try:
+                yield index, json.loads(line), None
+            except ValueError:
+                yield index, None, 'Invalid JSON.'
+        return
+    data = request.get_json(silent=True)
+    if not isinstance(data, list):
+        raise ValueError('Body must be a JSON array or NDJSON.')
+    if len(data) > max_items:
+        raise TooManyJobs()
+    for index, item in enumerate(data):
+        yield index, item, None
+
+def import_job_chunk(chunk, identity, results):
+    """Validate a chunk in one pass and insert its valid jobs with one multi-row INSERT."""
+    items = [item for _, item in chunk]
+    errors = job_schema.validate(items, many=True)
+    rows = []
+    now = datetime.utcnow()
+    for position, (index, item) in enumerate(chunk):
+        if position in errors:
+            results.append({'Index': index, 'Success': False, 'Id': None, 'Errors': list(errors[position].values())})
+            continue
+        row = {
+            'id': uuid.uuid4(),
+            'title': item['title'],
+            'description': item['description'],
+            'location': item.get('location'),
+            'created_by': identity,
+            'created_at': now,
+        }
+        rows.append(row)
+        results.append({'Index': index, 'Success': True, 'Id': str(row['id']), 'Errors': None})
+    if rows:
+        db.session.execute(insert(Job), rows)
+        record_events('job.created', 'job', [
+            (row['id'], job_event(row['id'], row['title'], row['location'], identity)) for row in rows
+        ])
+    return len(rows)
+
+@bp.route('/bulk', methods=['POST'])
+@jwt_required()
+@role_required('company')
+@swag_from({'tags': ['Jobs'], 'summary': 'Bulk import jobs', 'description': 'Create many jobs at once from a JSON array or an NDJSON stream (Content-Type: application/x-ndjson). Jobs are validated and inserted in chunks and committed together; each item gets its own result.', 'consumes': ['application/json', 'application/x-ndjson'], 'parameters': [{'name': 'body', 'in': 'body', 'required': True, 'schema': {'type': 'array', 'items': {'type': 'object', 'properties': {'title': {'type': 'string'}, 'description': {'type': 'string'}, 'location': {'type': 'string'}}, 'required': ['title', 'description']}}}], 'responses': {200: {'description': 'Bulk import finished'}, 400: {'description': 'Malformed body'}, 413: {'description': 'Too many jobs'}}})
+def bulk_create_jobs():
+    identity = current_user_id()
+    chunk_size = current_app.config['BULK_IMPORT_CHUNK_SIZE']
+    max_items = current_app.config['BULK_IMPORT_MAX_ITEMS']
+    results = []
+    created = 0
+    chunk = []
+    # Chunks are inserted as they are read but committed together, so a body
+    # that turns out to be too large or malformed leaves nothing behind.
+    try:
+        for index, item, error in read_bulk_items(max_items):
+            if error or not isinstance(item, dict):
+                results.append({'Index': index, 'Success': False, 'Id': None, 'Errors': [error or 'Each job must be a JSON object.']})
+                continue
+            chunk.append((index, item))
+            if len(chunk) >= chunk_size:
+                created += import_job_chunk(chunk, identity, results)
+                chunk = []
+        if chunk:
+            created += import_job_chunk(chunk, identity, results)
+    except TooManyJobs:
+        db.session.rollback()
+        message = f'At most {max_items} jobs can be imported per request.'
+        return base_response(False, message, None, [message]), 413
+    except ValueError as e:
+        db.session.rollback()
+        return base_response(False, 'Validation failed', None, [str(e)]), 400
+    db.session.commit()
+    if created:
+        invalidate_job_listings()
+    results.sort(key=lambda result: result['Index'])
+    summary = {'Created': created, 'Failed': len(results) - created, 'Results': results}
+    return base_response(True, 'Bulk import finished', summary), 200
+
 @bp.route('/<uuid:job_id>', methods=['PUT'])
 @jwt_required()
 @role_required('company')
 @swag_from({'tags': ['Jobs'], 'summary': 'Update job', 'description': 'Update a job (company only, own jobs).', 'parameters': [{'name': 'job_id', 'in': 'path', 'type': 'string', 'required': True}], 'responses': {200: {'description': 'Job updated'}, 400: {'description': 'Validation failed'}, 403: {'description': 'Unauthorized access'}, 404: {'description': 'Job not found'}}})
 def update_job(job_id):
-    identity = get_jwt_identity()
-    job = Job.query.get(job_id)
+    identity = current_user_id()
+    job = db.session.get(Job, job_id)
     if not job:
         return base_response(False, 'Job not found', None, ['Job not found']), 404
-    if str(job.created_by) != identity['id']:
+    if job.created_by != identity:
         return base_response(False, 'Unauthorized access', None, ['Unauthorized access']), 403
     data = request.get_json()
     errors = job_schema.validate(data, partial=True)
@@ -53,6 +189,8 @@ def update_job(job_id):
     if 'location' in data:
         job.location = data['location']
     db.session.commit()
+    cache.delete(job_detail_key(job_id))
+    invalidate_job_listings()
     return base_response(True, 'Job updated', job_schema.dump(job)), 200
 
 @bp.route('/<uuid:job_id>', methods=['DELETE'])
@@ -60,65 +198,142 @@ def update_job(job_id):
 @role_required('company')
 @swag_from({'tags': ['Jobs'], 'summary': 'Delete job', 'description': 'Delete a job (company only, own jobs).', 'parameters': [{'name': 'job_id', 'in': 'path', 'type': 'string', 'required': True}], 'responses': {200: {'description': 'Job deleted'}, 403: {'description': 'Unauthorized access'}, 404: {'description': 'Job not found'}}})
 def delete_job(job_id):
-    identity = get_jwt_identity()
-    job = Job.query.get(job_id)
+    identity = current_user_id()
+    job = db.session.get(Job, job_id)
     if not job:
         return base_response(False, 'Job not found', None, ['Job not found']), 404
-    if str(job.created_by) != identity['id']:
+    if job.created_by != identity:
         return base_response(False, 'Unauthorized access', None, ['Unauthorized access']), 403
+    # Applications (and with them the job's counters) go in the same transaction.
+    Application.query.filter_by(job_id=job.id).delete(synchronize_session=False)
     db.session.delete(job)
     db.session.commit()
+    cache.delete(job_detail_key(job_id))
+    invalidate_job_listings()
     return base_response(True, 'Job deleted', None), 200
 
 @bp.route('', methods=['GET'])
 @jwt_required()
 @role_required('applicant')
-@swag_from({'tags': ['Jobs'], 'summary': 'Browse jobs', 'description': 'Browse jobs (applicant only, with filters and pagination).', 'parameters': [{'name': 'title', 'in': 'query', 'type': 'string'}, {'name': 'location', 'in': 'query', 'type': 'string'}, {'name': 'company_name', 'in': 'query', 'type': 'string'}, {'name': 'page', 'in': 'query', 'type': 'integer'}, {'name': 'page_size', 'in': 'query', 'type': 'integer'}], 'responses': {200: {'description': 'Jobs fetched'}}})
+@swag_from({'tags': ['Jobs'], 'summary': 'Browse jobs', 'description': 'Browse jobs (applicant only, with filters and pagination).', 'parameters': [{'name': 'q', 'in': 'query', 'type': 'string', 'description': 'Full-text search over title and description, ranked by relevance'}, {'name': 'title', 'in': 'query', 'type': 'string'}, {'name': 'location', 'in': 'query', 'type': 'string'}, {'name': 'company_name', 'in': 'query', 'type': 'string'}, {'name': 'page', 'in': 'query', 'type': 'integer'}, {'name': 'page_size', 'in': 'query', 'type': 'integer'}, {'name': 'cursor', 'in': 'query', 'type': 'string', 'description': 'Keyset cursor; pass empty for the first page, then NextCursor'}, {'name': 'total', 'in': 'query', 'type': 'string', 'enum': ['exact', 'approx', 'none']}], 'responses': {200: {'description': 'Jobs fetched'}}})
 def browse_jobs():
-    title = request.args.get('title', '').lower()
-    location = request.args.get('location', '').lower()
-    company_name = request.args.get('company_name', '').lower()
-    page = int(request.args.get('page', 1))
-    page_size = int(request.args.get('page_size', 10))
-    query = Job.query.join(User, Job.created_by == User.id)
+    # Cached views stay on the primary: a miss filled from a lagging replica
+    # right after an invalidation would serve the stale page for the whole TTL.
+    entry = cache.get_or_set(
+        browse_cache_key(),
+        lambda: pack_response(render_browse_page()),
+        ttl=current_app.config['BROWSE_CACHE_TTL']
+    )
+    return cached_json_response(entry)
+
+def render_browse_page():
+    text = request.args.get('q', '').strip()
+    title = request.args.get('title', '')
+    location = request.args.get('location', '')
+    company_name = request.args.get('company_name', '')
+    query = db.session.query(Job.id, Job.title, Job.description, Job.location, Job.created_by, Job.created_at) \
+        .join(User, Job.created_by == User.id)
     if title:
-        query = query.filter(func.lower(Job.title).contains(title))
+        query = query.filter(substring_filter(Job.title, title))
     if location:
-        query = query.filter(func.lower(Job.location).contains(location))
+        query = query.filter(substring_filter(Job.location, location))
     if company_name:
-        query = query.filter(func.lower(User.name).contains(company_name))
-    total = query.count()
-    jobs = query.order_by(Job.created_at.desc()).offset((page-1)*page_size).limit(page_size).all()
-    jobs_data = [job_schema.dump(job) for job in jobs]
-    return paginated_response(True, 'Jobs fetched', jobs_data, page, page_size, total)
+        query = query.filter(substring_filter(User.name, company_name))
+    rank = None
+    if text:
+        query, rank = apply_text_search(query, text)
+    page = paginate(query, Job.created_at, Job.id, rank=rank)
+    jobs_data = job_rows.many(page.items)
+    return paginated_response(True, 'Jobs fetched', jobs_data, page.number, page.size, page.total, next_cursor=page.next_cursor).get_data()
+
+@bp.route('/recommended', methods=['GET'])
+@jwt_required()
+@role_required('applicant')
+@replicas.read_only
+@swag_from({'tags': ['Jobs'], 'summary': 'Recommended jobs', 'description': 'Jobs recommended from the applicant\'s application history, best match first (applicant only). Empty until the applicant has applied somewhere and feeds have been built.', 'parameters': [{'name': 'limit', 'in': 'query', 'type': 'integer'}], 'responses': {200: {'description': 'Recommended jobs fetched'}}})
+def recommended_jobs():
+    identity = current_user_id()
+    feed_size = recommender.state.feed_size
+    limit = min(max(request.args.get('limit', feed_size, type=int), 1), feed_size)
+    # One range scan of the applicant's feed; jobs applied to since the last
+    # build are skipped through the unique_application index.
+    applied = exists().where(Application.applicant_id == identity, Application.job_id == JobRecommendation.job_id)
+    rows = db.session.query(
+        Job.id, Job.title, Job.description, Job.location, Job.created_by, Job.created_at, JobRecommendation.score
+    ).join(Job, JobRecommendation.job_id == Job.id) \
+        .filter(JobRecommendation.applicant_id == identity, ~applied) \
+        .order_by(JobRecommendation.score.desc(), JobRecommendation.job_id.desc()) \
+        .limit(limit).all()
+    jobs_data = job_rows.many(rows)
+    for job_info, row in zip(jobs_data, rows):
+        job_info['score'] = row.score
+    return base_response(True, 'Recommended jobs fetched', jobs_data), 200
 
 @bp.route('/<uuid:job_id>', methods=['GET'])
 @jwt_required()
-@swag_from({'tags': ['Jobs'], 'summary': 'Job details', 'description': 'Get job details (all authenticated users).', 'parameters': [{'name': 'job_id', 'in': 'path', 'type': 'string', 'required': True}], 'responses': {200: {'description': 'Job details'}, 404: {'description': 'Job not found'}}})
+@swag_from({'tags': ['Jobs'], 'summary': 'Job details', 'description': 'Get job details (all authenticated users).', 'parameters': [{'name': 'job_id', 'in': 'path', 'type': 'string', 'required': True}], 'responses': {200: {'description': 'Job details'}, 304: {'description': 'Not modified (If-None-Match matched the ETag)'}, 404: {'description': 'Job not found'}}})
 def job_detail(job_id):
-    job = Job.query.get(job_id)
-    if not job:
-        return base_response(False, 'Job not found', None, ['Job not found']), 404
-    user = User.query.get(job.created_by)
-    job_data = job_schema.dump(job)
-    job_data['created_by'] = user.name if user else str(job.created_by)
-    return base_response(True, 'Job details', job_data)
+    key = job_detail_key(job_id)
+    entry = cache.get(key)
+    if entry is None:
+        job = db.session.query(
+            Job.id, Job.title, Job.description, Job.location, Job.created_by, Job.created_at,
+            User.name.label('company_name')
+        ).outerjoin(User, Job.created_by == User.id).filter(Job.id == job_id).first()
+        if not job:
+            return base_response(False, 'Job not found', None, ['Job not found']), 404
+        job_data = job_rows(job)
+        job_data['created_by'] = job.company_name or str(job.created_by)
+        entry = pack_response(base_response(True, 'Job details', job_data).get_data())
+        cache.set(key, entry)
+    return cached_json_response(entry)
 
 @bp.route('/my', methods=['GET'])
 @jwt_required()
 @role_required('company')
-@swag_from({'tags': ['Jobs'], 'summary': 'View my posted jobs', 'description': 'View my posted jobs (company only, paginated, with application count).', 'parameters': [{'name': 'page', 'in': 'query', 'type': 'integer'}, {'name': 'page_size', 'in': 'query', 'type': 'integer'}], 'responses': {200: {'description': 'My jobs fetched'}}})
+@replicas.read_only
+@swag_from({'tags': ['Jobs'], 'summary': 'View my posted jobs', 'description': 'View my posted jobs (company only, paginated, with application count).', 'parameters': [{'name': 'page', 'in': 'query', 'type': 'integer'}, {'name': 'page_size', 'in': 'query', 'type': 'integer'}, {'name': 'cursor', 'in': 'query', 'type': 'string', 'description': 'Keyset cursor; pass empty for the first page, then NextCursor'}, {'name': 'total', 'in': 'query', 'type': 'string', 'enum': ['exact', 'approx', 'none']}], 'responses': {200: {'description': 'My jobs fetched'}}})
 def my_jobs():
-    identity = get_jwt_identity()
-    page = int(request.args.get('page', 1))
-    page_size = int(request.args.get('page_size', 10))
-    query = Job.query.filter_by(created_by=identity['id'])
-    total = query.count()
-    jobs = query.order_by(Job.created_at.desc()).offset((page-1)*page_size).limit(page_size).all()
-    jobs_data = []
+    identity = current_user_id()
+    query = db.session.query(
+        Job.id, Job.title, Job.description, Job.location, Job.created_by, Job.created_at,
+        Job.application_count, *STATUS_COUNT_COLUMNS.values()
+    ).filter(Job.created_by == identity)
+    page = paginate(query, Job.created_at, Job.id, count_query=Job.query.filter_by(created_by=identity))
+    jobs_data = job_rows.many(page.items)
+    for job_info, row in zip(jobs_data, page.items):
+        job_info['application_count'] = row.application_count
+        job_info['status_counts'] = status_counts(row)
+    return paginated_response(True, 'My jobs fetched', jobs_data, page.number, page.size, page.total, next_cursor=page.next_cursor)
+
+@bp.route('/my/stats', methods=['GET'])
+@jwt_required()
+@role_required('company')
+@replicas.read_only
+@swag_from({'tags': ['Jobs'], 'summary': 'Dashboard stats for my jobs', 'description': 'Per-job status counts, the Applied → Reviewed → Interview → Hired funnel and applications per day (company only). Served from counters and a daily rollup, not from the application rows.', 'parameters': [{'name': 'days', 'in': 'query', 'type': 'integer', 'description': 'Days of daily history, ending today (default 30, at most 366)'}], 'responses': {200: {'description': 'Job stats fetched'}, 400: {'description': 'Invalid days'}}})
+def my_job_stats():
+    identity = current_user_id()
+    days = request.args.get('days', 30, type=int)
+    if not 1 <= days <= 366:
+        return base_response(False, 'Validation failed', None, ['days must be between 1 and 366.']), 400
+    jobs = db.session.query(Job.id, Job.title, Job.created_at, Job.application_count, *STATUS_COUNT_COLUMNS.values()) \
+        .filter(Job.created_by == identity).order_by(Job.created_at.desc(), Job.id.desc()).all()
+    daily = daily_stats([job.id for job in jobs], since_days(days)) if jobs else {}
+    totals = dict.fromkeys(STATUS_COUNT_COLUMNS, 0)
+    result = []
     for job in jobs:
-        app_count = Application.query.filter_by(job_id=job.id).count()
-        job_info = job_schema.dump(job)
-        job_info['application_count'] = app_count
-        jobs_data.append(job_info)
-    return paginated_response(True, 'My jobs fetched', jobs_data, page, page_size, total)
+        counts = status_counts(job)
+        for status, count in counts.items():
+            totals[status] += count
+        result.append({
+            'id': str(job.id),
+            'title': job.title,
+            'application_count': job.application_count,
+            'status_counts': counts,
+            'funnel': funnel(counts, job.application_count),
+            'daily': [{'day': day.isoformat(), 'applications': sum(statuses.values()), 'status_counts': statuses}
+                      for day, statuses in daily.get(job.id, {}).items()],
+        })
+    total = sum(job.application_count for job in jobs)
+    summary = {'Jobs': result, 'Totals': {'application_count': total, 'status_counts': totals, 'funnel': funnel(totals, total)}}
+    return base_response(True, 'Job stats fetched', summary), 200
@@ -0,0 +1,12 @@
+from flask import Blueprint
+from app import db
+from app.pool import pool_status
+from app.utils import base_response
+from flasgger import swag_from
+
+bp = Blueprint('monitoring', __name__, url_prefix='/monitoring')
+
+@bp.route('/pool', methods=['GET'])
+@swag_from({'tags': ['Monitoring'], 'summary': 'Connection pool statistics', 'description': 'Current pool occupancy plus checkout counts and wait times for this worker process.', 'responses': {200: {'description': 'Pool statistics'}}})
+def pool():
+    return base_response(True, 'Pool statistics', pool_status(db.engine)), 200
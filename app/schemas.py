@@ -18,7 +18,8 @@ class ApplicationSchema(Schema):
     id = fields.UUID(dump_only=True)
     applicant_id = fields.UUID()
     job_id = fields.UUID()
-    resume_link = fields.Url(required=True)
+    resume_link = fields.Url(required=True, allow_none=True)
+    resume_status = fields.Str(dump_only=True)
     cover_letter = fields.Str(validate=validate.Length(max=200))
     status = fields.Str(validate=validate.OneOf(["Applied", "Reviewed", "Interview", "Rejected", "Hired"]))
     applied_at = fields.DateTime() 
\ No newline at end of file
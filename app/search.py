@@ -0,0 +1,106 @@
+import re
+from sqlalchemy import DDL, column, event, func, literal_column, or_, table
+from app import db
+from app.models import Job
+
+# Title matches count for more than description matches in both engines.
+TITLE_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+
+# Postgres keeps a generated tsvector on jobs with a GIN index. The column is
+# not mapped on the model so the ORM never selects or writes it.
+PG_SEARCH_VECTOR = (
+    "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(description, '')), 'B')"
+)
+PG_CREATE_SEARCH_VECTOR = [
+    f"ALTER TABLE jobs ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ({PG_SEARCH_VECTOR}) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_jobs_search_vector ON jobs USING gin (search_vector)",
+]
+
+# SQLite falls back to an external-content FTS5 table kept in sync by triggers.
+# FTS5 keys rows by an integer, and the implicit rowid of a table with a UUID
+# key can change on VACUUM, so jobs get an unmapped search_rowid that the
+# insert trigger numbers. These statements are the only copy: create_all and
+# the job search migration both run them, the last two backfilling old jobs.
+SQLITE_CREATE_FTS = [
+    "ALTER TABLE jobs ADD COLUMN search_rowid INTEGER",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_jobs_search_rowid ON jobs (search_rowid)",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS jobs_fts USING fts5("
+    "title, description, content='jobs', content_rowid='search_rowid', tokenize='porter unicode61')",
+    "CREATE TRIGGER IF NOT EXISTS jobs_fts_ai AFTER INSERT ON jobs BEGIN "
+    "UPDATE jobs SET search_rowid = (SELECT coalesce(max(search_rowid), 0) + 1 FROM jobs) "
+    "WHERE id = new.id AND search_rowid IS NULL; "
+    "INSERT INTO jobs_fts(rowid, title, description) SELECT search_rowid, title, description FROM jobs WHERE id = new.id; END",
+    "CREATE TRIGGER IF NOT EXISTS jobs_fts_ad AFTER DELETE ON jobs BEGIN "
+    "INSERT INTO jobs_fts(jobs_fts, rowid, title, description) VALUES ('delete', old.search_rowid, old.title, old.description); END",
+    "CREATE TRIGGER IF NOT EXISTS jobs_fts_au AFTER UPDATE OF title, description ON jobs BEGIN "
+    "INSERT INTO jobs_fts(jobs_fts, rowid, title, description) VALUES ('delete', old.search_rowid, old.title, old.description); "
+    "INSERT INTO jobs_fts(rowid, title, description) VALUES (new.search_rowid, new.title, new.description); END",
+    "UPDATE jobs SET search_rowid = rowid WHERE search_rowid IS NULL",
+    "INSERT INTO jobs_fts(jobs_fts) VALUES ('rebuild')",
+]
+SQLITE_DROP_FTS = [
+    "DROP TRIGGER IF EXISTS jobs_fts_au",
+    "DROP TRIGGER IF EXISTS jobs_fts_ad",
+    "DROP TRIGGER IF EXISTS jobs_fts_ai",
+    "DROP TABLE IF EXISTS jobs_fts",
+    "DROP INDEX IF EXISTS ix_jobs_search_rowid",
+    "ALTER TABLE jobs DROP COLUMN search_rowid",
+]
+
+jobs_fts = table('jobs_fts', column('rowid'))
+
+event.listen(db.metadata, 'before_create', DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm').execute_if(dialect='postgresql'))
+for statement in PG_CREATE_SEARCH_VECTOR:
+    event.listen(Job.__table__, 'after_create', DDL(statement).execute_if(dialect='postgresql'))
+for statement in SQLITE_CREATE_FTS:
+    event.listen(Job.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+event.listen(Job.__table__, 'before_drop', DDL('DROP TABLE IF EXISTS jobs_fts').execute_if(dialect='sqlite'))
+
+def include_object(obj, name, type_, reflected, compare_to):
+    # Keep autogenerate from dropping search artifacts it doesn't know about.
+    if type_ == 'column' and name in ('search_vector', 'search_rowid'):
+        return False
+    if type_ == 'index' and name in ('ix_jobs_search_vector', 'ix_jobs_search_rowid'):
+        return False
+    if type_ == 'table' and name.startswith('jobs_fts'):
+        return False
+    return True
+
+def like_pattern(value):
+    escaped = value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'%{escaped}%'
+
+def substring_filter(column, value):
+    # ILIKE on Postgres is served by the pg_trgm GIN indexes; SQLite renders it
+    # as lower() LIKE lower().
+    return column.ilike(like_pattern(value), escape='\\')
+
+def fts5_query(text):
+    terms = re.findall(r'\w+', text)
+    return ' '.join('"%s"*' % term for term in terms)
+
+def apply_text_search(query, text):
+    """Restrict ``query`` (which must select from jobs) to jobs matching ``text``.
+
+    Returns the filtered query and a relevance expression where higher is
+    better, or None when the backend cannot rank.
+    """
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        vector = literal_column('jobs.search_vector')
+        tsquery = func.websearch_to_tsquery('english', text)
+        return query.filter(vector.op('@@')(tsquery)), func.ts_rank_cd(vector, tsquery)
+    if dialect == 'sqlite':
+        match = fts5_query(text)
+        if not match:
+            return query, None
+        fts = literal_column('jobs_fts')
+        query = query.join(jobs_fts, jobs_fts.c.rowid == literal_column('jobs.search_rowid')) \
+            .filter(fts.op('MATCH')(match))
+        return query, -func.bm25(fts, TITLE_WEIGHT, DESCRIPTION_WEIGHT)
+    terms = re.findall(r'\w+', text)
+    for term in terms:
+        query = query.filter(or_(substring_filter(Job.title, term), substring_filter(Job.description, term)))
+    return query, None
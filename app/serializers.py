@@ -0,0 +1,102 @@
+import re
+from flask.json.provider import DefaultJSONProvider
+from marshmallow import fields, utils
+
+try:
+    import orjson
+except ImportError:  # optional, only needed for JSON_BACKEND=orjson
+    orjson = None
+
+def _field_converter(name, field):
+    if isinstance(field, fields.DateTime):
+        convert = field.SERIALIZATION_FUNCS.get(field.format or field.DEFAULT_FORMAT)
+        if convert is not None:
+            return convert
+    elif isinstance(field, fields.UUID):
+        return str
+    elif type(field) in (fields.String, fields.Url, fields.Email):
+        return utils.ensure_text_type
+    return lambda value: field._serialize(value, name, None)
+
+class RowSerializer:
+    """Dump query rows exactly as ``schema.dump`` would, without its per-row cost.
+
+    The first time rows with a given set of columns come through, the schema's
+    fields are resolved to (output key, column index, converter) triples; after
+    that each row is a dict comprehension over plain tuples. Schema fields the
+    row has no column for are left out, as marshmallow does.
+    """
+
+    def __init__(self, schema):
+        self.schema = schema
+        self._plans = {}
+
+    def _plan(self, keys):
+        plan = self._plans.get(keys)
+        if plan is None:
+            plan = tuple(
+                (field.data_key or name, keys.index(field.attribute or name), _field_converter(name, field))
+                for name, field in self.schema.dump_fields.items()
+                if (field.attribute or name) in keys
+            )
+            self._plans[keys] = plan
+        return plan
+
+    def __call__(self, row):
+        return self.many([row])[0]
+
+    def many(self, rows):
+        if not rows:
+            return []
+        plan = self._plan(tuple(rows[0]._fields))
+        return [{
+            key: None if row[index] is None else convert(row[index])
+            for key, index, convert in plan
+        } for row in rows]
+
+# orjson writes floats outside [1e-4, 1e16) differently from the json module
+# ("1e16" and "0.00001" where json.dumps gives "1e+16" and "1e-05"). Bodies
+# with such a number go through the stdlib encoder; a look-alike inside a
+# string only costs a fallback.
+_EXPONENT_FLOAT = re.compile(rb'e-?[0-9]+(?:[,}\]]|$)')
+_SMALL_FLOAT = re.compile(rb'0\.0000[0-9]*(?:[,}\]]|$)')
+
+def _orjson_matches_stdlib(body):
+    return body.isascii() and not _EXPONENT_FLOAT.search(body) and not _SMALL_FLOAT.search(body)
+
+class OrjsonProvider(DefaultJSONProvider):
+    """JSON provider that encodes with orjson and falls back to the stdlib.
+
+    Produces the same bytes as ``DefaultJSONProvider``: sorted keys, compact
+    separators, ASCII output, HTTP dates for datetimes. Anything orjson would
+    render differently (pretty printing, non-ASCII text, big integers,
+    exponent floats, str/int subclasses) is handed to the default encoder.
+    """
+
+    _options = (orjson.OPT_SORT_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+                | orjson.OPT_PASSTHROUGH_SUBCLASS) if orjson else 0
+
+    def encode(self, obj):
+        if orjson is not None:
+            try:
+                body = orjson.dumps(obj, default=self.default, option=self._options)
+            except TypeError:
+                pass
+            else:
+                if _orjson_matches_stdlib(body):
+                    return body
+        return super().dumps(obj, separators=(',', ':')).encode()
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        if self.compact is False or (self.compact is None and self._app.debug) \
+                or not self.sort_keys or not self.ensure_ascii:
+            return super().response(*args, **kwargs)
+        return self._app.response_class(self.encode(obj) + b'\n', mimetype=self.mimetype)
+
+def init_json(app):
+    """Install the JSON provider selected by ``JSON_BACKEND`` (``stdlib`` or ``orjson``)."""
+    if app.config['JSON_BACKEND'] == 'orjson':
+        if orjson is None:
+            raise RuntimeError('JSON_BACKEND=orjson requires the orjson package')
+        app.json = OrjsonProvider(app)
@@ -0,0 +1,119 @@
+from datetime import datetime, timedelta
+from sqlalchemy import DDL, cast, delete, event, func, insert, select
+from app import db
+from app.models import APPLICATION_STATUSES, Application, ApplicationDailyStat, Job
+
+# application_daily_stats holds, per job and day applied, how many of that
+# day's applications are in each status. Triggers on applications keep it
+# current in the same transaction as every insert, status change and delete,
+# so no write path has to remember it and none pays an extra round trip.
+
+# Postgres: statement-level triggers with transition tables, so a bulk status
+# update touches each (job, day, status) row once however many rows it moves.
+# Postgres refuses a column list (UPDATE OF ...) on a trigger with transition
+# tables, so the update branch pairs old and new rows by id and only counts
+# those whose job, day or status changed; other updates upsert nothing.
+PG_UPSERT_DELTAS = (
+    "INSERT INTO application_daily_stats (job_id, day, status, count) "
+    "SELECT job_id, day, status, sum(delta) FROM ({rows}) AS deltas "
+    "GROUP BY job_id, day, status HAVING sum(delta) <> 0 "
+    "ON CONFLICT (job_id, day, status) DO UPDATE SET count = application_daily_stats.count + EXCLUDED.count"
+)
+PG_ROWS = ("SELECT {row}.job_id, {row}.applied_at::date AS day, {row}.status, {delta} AS delta "
+           "FROM {source} WHERE {row}.status IS NOT NULL")
+PG_CHANGED_ROWS = (
+    "old_rows JOIN new_rows ON old_rows.id = new_rows.id AND (old_rows.status IS DISTINCT FROM new_rows.status "
+    "OR old_rows.applied_at IS DISTINCT FROM new_rows.applied_at OR old_rows.job_id IS DISTINCT FROM new_rows.job_id)"
+)
+PG_CREATE_TRIGGERS = [
+    "CREATE OR REPLACE FUNCTION application_daily_stats_apply() RETURNS trigger AS $$ BEGIN "
+    "IF TG_OP = 'INSERT' THEN "
+    + PG_UPSERT_DELTAS.format(rows=PG_ROWS.format(row='new_rows', delta=1, source='new_rows')) + "; "
+    "ELSIF TG_OP = 'DELETE' THEN "
+    + PG_UPSERT_DELTAS.format(rows=PG_ROWS.format(row='old_rows', delta=-1, source='old_rows')) + "; "
+    "ELSE "
+    + PG_UPSERT_DELTAS.format(rows=PG_ROWS.format(row='old_rows', delta=-1, source=PG_CHANGED_ROWS) + ' UNION ALL '
+                              + PG_ROWS.format(row='new_rows', delta=1, source=PG_CHANGED_ROWS)) + "; "
+    "END IF; RETURN NULL; END; $$ LANGUAGE plpgsql",
+    "DROP TRIGGER IF EXISTS application_daily_stats_ai ON applications",
+    "CREATE TRIGGER application_daily_stats_ai AFTER INSERT ON applications "
+    "REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION application_daily_stats_apply()",
+    "DROP TRIGGER IF EXISTS application_daily_stats_au ON applications",
+    "CREATE TRIGGER application_daily_stats_au AFTER UPDATE ON applications "
+    "REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION application_daily_stats_apply()",
+    "DROP TRIGGER IF EXISTS application_daily_stats_ad ON applications",
+    "CREATE TRIGGER application_daily_stats_ad AFTER DELETE ON applications "
+    "REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION application_daily_stats_apply()",
+]
+
+# SQLite has no transition tables; row-level triggers do the same bookkeeping.
+# The statements in both lists are the only copy: create_all and the daily
+# stats migration run them.
+SQLITE_INCREMENT = (
+    "INSERT INTO application_daily_stats (job_id, day, status, count) "
+    "VALUES (new.job_id, date(new.applied_at), new.status, 1) "
+    "ON CONFLICT (job_id, day, status) DO UPDATE SET count = count + 1"
+)
+SQLITE_DECREMENT = (
+    "UPDATE application_daily_stats SET count = count - 1 "
+    "WHERE job_id = old.job_id AND day = date(old.applied_at) AND status = old.status"
+)
+SQLITE_CREATE_TRIGGERS = [
+    "CREATE TRIGGER IF NOT EXISTS application_daily_stats_ai AFTER INSERT ON applications "
+    f"WHEN new.status IS NOT NULL BEGIN {SQLITE_INCREMENT}; END",
+    "CREATE TRIGGER IF NOT EXISTS application_daily_stats_au AFTER UPDATE OF status, applied_at, job_id ON applications "
+    "WHEN old.status IS NOT new.status OR old.applied_at IS NOT new.applied_at OR old.job_id IS NOT new.job_id "
+    f"BEGIN {SQLITE_DECREMENT}; {SQLITE_INCREMENT}; END",
+    "CREATE TRIGGER IF NOT EXISTS application_daily_stats_ad AFTER DELETE ON applications "
+    f"BEGIN {SQLITE_DECREMENT}; END",
+]
+
+for statement in PG_CREATE_TRIGGERS:
+    event.listen(ApplicationDailyStat.__table__, 'after_create', DDL(statement).execute_if(dialect='postgresql'))
+for statement in SQLITE_CREATE_TRIGGERS:
+    event.listen(ApplicationDailyStat.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+
+# Applied → Reviewed → Interview → Hired; an application counts towards every
+# stage up to the one it is in. Rejected applications only reached Applied.
+FUNNEL = ('Applied', 'Reviewed', 'Interview', 'Hired')
+
+def funnel(counts, total):
+    reached = {'Applied': total}
+    for index, stage in enumerate(FUNNEL[1:], start=1):
+        reached[stage] = sum(counts[status] for status in FUNNEL[index:])
+    return reached
+
+def applied_day(column):
+    if db.engine.dialect.name == 'sqlite':
+        # SQLite keeps datetimes as text; date() yields the 'YYYY-MM-DD' that Date reads back.
+        return func.date(column)
+    return cast(column, db.Date)
+
+def daily_stats(job_ids, since):
+    """``{job_id: {day: {status: count}}}`` for applications made on or after ``since``."""
+    rows = db.session.query(ApplicationDailyStat.job_id, ApplicationDailyStat.day,
+                            ApplicationDailyStat.status, ApplicationDailyStat.count) \
+        .filter(ApplicationDailyStat.job_id.in_(job_ids), ApplicationDailyStat.day >= since,
+                ApplicationDailyStat.count != 0) \
+        .order_by(ApplicationDailyStat.job_id, ApplicationDailyStat.day)
+    stats = {}
+    for job_id, day, status, count in rows:
+        days = stats.setdefault(job_id, {})
+        days.setdefault(day, dict.fromkeys(APPLICATION_STATUSES, 0))[status] = count
+    return stats
+
+def rebuild_application_stats():
+    """Recompute application_daily_stats from applications. Returns the number of rows written."""
+    db.session.execute(delete(ApplicationDailyStat))
+    day = applied_day(Application.applied_at)
+    grouped = select(Application.job_id, day, Application.status, func.count()) \
+        .where(Application.status.isnot(None)) \
+        .group_by(Application.job_id, day, Application.status)
+    written = db.session.execute(insert(ApplicationDailyStat).from_select(
+        ['job_id', 'day', 'status', 'count'], grouped)).rowcount
+    db.session.commit()
+    return written
+
+def since_days(days):
+    # applied_at is stored in UTC.
+    return datetime.utcnow().date() - timedelta(days=days - 1)
@@ -0,0 +1,315 @@
+import json
+import logging
+import queue
+import select
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import timedelta
+from flask import current_app, has_app_context
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+from sqlalchemy import event, func, or_
+from app import db
+from app.cache import cache
+from app.models import Application, Job, OutboxEvent
+from app.outbox import event_message
+from app.replicas import RoutingSession
+
+logger = logging.getLogger(__name__)
+
+NOTIFY_CHANNEL = 'outbox_events'
+RETRY_MS = 3000
+# Outbox ids can commit out of order; a missing id is looked for again until
+# it turns up or this many seconds pass (a rolled back insert never will).
+GAP_SECONDS = 10
+MAX_GAP = 1000
+OWNER_CACHE_SIZE = 10000
+
+# What each role is streamed: applicants the status changes of their own
+# applications, companies the new applications on their jobs.
+ROLE_EVENTS = {
+    'applicant': 'application.status_changed',
+    'company': 'application.created',
+}
+
+class StreamRejected(Exception):
+    def __init__(self, message, status_code):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+def _ticket_serializer():
+    return URLSafeTimedSerializer(current_app.config['JWT_SECRET_KEY'], salt='sse-ticket')
+
+def issue_ticket(role, identity):
+    """A credential for opening one stream, short-lived so it can go in a URL."""
+    return _ticket_serializer().dumps({'role': role, 'sub': str(identity), 'nonce': uuid.uuid4().hex})
+
+def redeem_ticket(ticket):
+    """Return ``(role, identity)`` for a valid, unused ticket, else None.
+
+    Redeemed tickets are remembered in the cache until they expire, so with
+    ``CACHE_BACKEND=memory`` a ticket is single use per worker only.
+    """
+    ttl = current_app.config['SSE_TICKET_SECONDS']
+    try:
+        claims = _ticket_serializer().loads(ticket, max_age=ttl)
+    except BadSignature:
+        return None
+    if not cache.backend.add(f"sse-ticket:{claims['nonce']}", b'1', ttl):
+        return None
+    return claims['role'], uuid.UUID(claims['sub'])
+
+def format_event(message, cursor=None):
+    # The SSE id is the stream's resume cursor, the highest id sent so far: a
+    # late event with a lower id must not move the client's Last-Event-ID back.
+    cursor = message['id'] if cursor is None else cursor
+    return f"id: {cursor}\nevent: {message['type']}\ndata: {json.dumps(message, sort_keys=True)}\n\n"
+
+def replay_events(role, identity, after_id, limit):
+    """Events for ``(role, identity)`` the client with cursor ``after_id`` may lack, oldest first.
+
+    That is up to ``limit`` events after the cursor, plus ids just below it
+    that were created within GAP_SECONDS of it: they may have committed after
+    the cursor was streamed. Clients deduplicate those on the event's ``id``.
+    """
+    query = db.session.query(OutboxEvent) \
+        .join(Application, Application.id == OutboxEvent.aggregate_id) \
+        .filter(OutboxEvent.event_type == ROLE_EVENTS[role])
+    if role == 'applicant':
+        query = query.filter(Application.applicant_id == identity)
+    else:
+        query = query.join(Job, Application.job_id == Job.id).filter(Job.created_by == identity)
+    late = []
+    if after_id:
+        cursor_created_at = db.session.query(OutboxEvent.created_at).filter(OutboxEvent.id == after_id).scalar()
+        if cursor_created_at is not None:
+            late = query.filter(OutboxEvent.id > after_id - MAX_GAP, OutboxEvent.id < after_id,
+                                OutboxEvent.created_at >= cursor_created_at - timedelta(seconds=GAP_SECONDS)) \
+                .order_by(OutboxEvent.id).all()
+    rows = query.filter(OutboxEvent.id > after_id).order_by(OutboxEvent.id).limit(limit).all()
+    return [event_message(row) for row in late + rows]
+
+class Subscription:
+    def __init__(self, key, size):
+        self.key = key
+        self.queue = queue.Queue(size)
+        self.overflowed = False
+
+    def put(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except queue.Full:
+            # The stream ends once drained and the client resumes from
+            # Last-Event-ID, which replays what was dropped.
+            self.overflowed = True
+
+class _BrokerState:
+    def __init__(self, app):
+        self.app = app
+        self.backend = app.config['SSE_BACKEND']
+        self.poll_interval = float(app.config['SSE_POLL_INTERVAL'])
+        self.heartbeat = float(app.config['SSE_HEARTBEAT_SECONDS'])
+        self.max_seconds = float(app.config['SSE_MAX_STREAM_SECONDS'])
+        self.replay_limit = int(app.config['SSE_REPLAY_LIMIT'])
+        self.queue_size = int(app.config['SSE_QUEUE_SIZE'])
+        self.max_streams = int(app.config['SSE_MAX_STREAMS'])
+        self.max_streams_per_user = int(app.config['SSE_MAX_STREAMS_PER_USER'])
+        self.batch_size = int(app.config['OUTBOX_BATCH_SIZE'])
+        self.subscribers = {}
+        self.cursor = None
+        self.gaps = {}
+        self.owners = OrderedDict()
+        self.wakeup = threading.Event()
+        self.thread = None
+        self.lock = threading.Lock()
+
+def _wake_on_commit(session):
+    if session.info.pop('outbox_pending', False) and has_app_context():
+        state = current_app.extensions.get('stream_broker')
+        if state is not None:
+            state.wakeup.set()
+
+def _forget_on_rollback(session):
+    session.info.pop('outbox_pending', None)
+
+class StreamBroker:
+    """Fans committed outbox events out to Server-Sent Event streams.
+
+    One background thread per worker reads new outbox rows, so a thousand
+    open streams cost one query per ``SSE_POLL_INTERVAL``, not a thousand
+    page refreshes. With ``SSE_BACKEND=listen`` (Postgres) the thread sleeps on
+    ``LISTEN outbox_events`` instead, which a trigger notifies on every
+    insert; commits made by the same worker wake it with either backend.
+    Streams send the outbox id as the event id, so a reconnecting client's
+    ``Last-Event-ID`` replays whatever it missed.
+
+    Every open stream holds a worker thread, so a worker refuses streams past
+    ``SSE_MAX_STREAMS`` (503) and past ``SSE_MAX_STREAMS_PER_USER`` for one
+    user (429), leaving threads for ordinary requests.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['stream_broker'] = _BrokerState(app)
+        if not event.contains(RoutingSession, 'after_commit', _wake_on_commit):
+            event.listen(RoutingSession, 'after_commit', _wake_on_commit)
+            event.listen(RoutingSession, 'after_rollback', _forget_on_rollback)
+
+    @property
+    def state(self):
+        return current_app.extensions['stream_broker']
+
+    def subscribe(self, role, identity):
+        state = self.state
+        subscription = Subscription((role, str(identity)), state.queue_size)
+        with state.lock:
+            if len(state.subscribers.get(subscription.key, ())) >= state.max_streams_per_user:
+                raise StreamRejected('Too many open streams for this account.', 429)
+            if sum(map(len, state.subscribers.values())) >= state.max_streams:
+                raise StreamRejected('Too many open streams, please retry later.', 503)
+            if state.cursor is None:
+                state.cursor = db.session.query(func.max(OutboxEvent.id)).scalar() or 0
+            state.subscribers.setdefault(subscription.key, set()).add(subscription)
+            if state.thread is None:
+                # Started on first use so gunicorn workers don't share the master's.
+                state.thread = threading.Thread(target=self._run, args=(state,), name='sse-broker', daemon=True)
+                state.thread.start()
+        return subscription
+
+    def unsubscribe(self, state, subscription):
+        with state.lock:
+            subscribers = state.subscribers.get(subscription.key)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del state.subscribers[subscription.key]
+
+    def stream(self, subscription, replay, after_id):
+        """The SSE body: replayed events, then live ones, with heartbeats in between."""
+        state = self.state
+        def generate(cursor):
+            # Ids below the cursor can still commit late (see GAP_SECONDS), so
+            # repeats are recognised by the ids already sent, not by order.
+            sent = {cursor}
+            yield f'retry: {RETRY_MS}\n\n'
+            for message in replay:
+                sent.add(message['id'])
+                cursor = max(cursor, message['id'])
+                yield format_event(message, cursor)
+            if sum(message['id'] > after_id for message in replay) >= state.replay_limit:
+                # More to replay; the client reconnects from where this left off.
+                return
+            deadline = time.monotonic() + state.max_seconds
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or (subscription.overflowed and subscription.queue.empty()):
+                    return
+                try:
+                    message = subscription.queue.get(timeout=min(state.heartbeat, remaining))
+                except queue.Empty:
+                    yield ': heartbeat\n\n'
+                    continue
+                if message['id'] in sent or message['id'] <= cursor - MAX_GAP:
+                    continue
+                sent.add(message['id'])
+                cursor = max(cursor, message['id'])
+                if len(sent) > 2 * MAX_GAP:
+                    sent = {sent_id for sent_id in sent if sent_id > cursor - MAX_GAP}
+                yield format_event(message, cursor)
+        return generate(after_id)
+
+    def _run(self, state):
+        listener = None
+        while True:
+            try:
+                if state.backend == 'listen' and listener is None:
+                    listener = self._listen(state)
+                self._wait(state, listener)
+                with state.app.app_context():
+                    try:
+                        while self._dispatch(state) >= state.batch_size:
+                            pass
+                    finally:
+                        db.session.remove()
+            except Exception:
+                logger.exception('SSE broker failed, retrying in %.1fs', state.poll_interval)
+                if listener is not None:
+                    listener.close()
+                    listener = None
+                time.sleep(state.poll_interval)
+
+    def _listen(self, state):
+        with state.app.app_context():
+            connection = db.engine.raw_connection()
+        # Kept out of the pool: it sits in LISTEN for the life of the worker.
+        connection.detach()
+        listener = connection.dbapi_connection
+        listener.autocommit = True
+        listener.cursor().execute(f'LISTEN {NOTIFY_CHANNEL}')
+        return listener
+
+    def _wait(self, state, listener):
+        if listener is None:
+            state.wakeup.wait(state.poll_interval)
+        elif select.select([listener], [], [], state.poll_interval)[0]:
+            listener.poll()
+            listener.notifies.clear()
+        state.wakeup.clear()
+
+    def _job_owners(self, state, job_ids):
+        missing = [job_id for job_id in set(job_ids) if job_id not in state.owners]
+        if missing:
+            rows = db.session.query(Job.id, Job.created_by).filter(Job.id.in_(missing)).all()
+            for job_id, created_by in rows:
+                state.owners[str(job_id)] = str(created_by)
+        while len(state.owners) > OWNER_CACHE_SIZE:
+            state.owners.popitem(last=False)
+        return {job_id: state.owners.get(job_id) for job_id in job_ids}
+
+    def _dispatch(self, state):
+        with state.lock:
+            if not state.subscribers:
+                state.cursor = None
+                state.gaps.clear()
+                return 0
+            cursor = state.cursor
+            gaps = list(state.gaps)
+        condition = OutboxEvent.id > cursor
+        if gaps:
+            condition = or_(condition, OutboxEvent.id.in_(gaps))
+        rows = db.session.query(OutboxEvent).filter(condition) \
+            .order_by(OutboxEvent.id).limit(state.batch_size).all()
+        messages = [event_message(row) for row in rows]
+        owners = self._job_owners(state, [m['payload']['job_id'] for m in messages
+                                          if m['type'] == ROLE_EVENTS['company']])
+        now = time.monotonic()
+        with state.lock:
+            if state.cursor != cursor:
+                return 0
+            expected = cursor + 1
+            for message in messages:
+                state.gaps.pop(message['id'], None)
+                if message['id'] >= expected:
+                    if message['id'] - expected <= MAX_GAP:
+                        state.gaps.update(dict.fromkeys(range(expected, message['id']), now))
+                    expected = message['id'] + 1
+                    state.cursor = message['id']
+                if message['type'] == ROLE_EVENTS['applicant']:
+                    key = ('applicant', message['payload']['applicant_id'])
+                elif message['type'] == ROLE_EVENTS['company']:
+                    key = ('company', owners.get(message['payload']['job_id']))
+                else:
+                    continue
+                for subscription in state.subscribers.get(key, ()):
+                    subscription.put(message)
+            for missing, since in list(state.gaps.items()):
+                if now - since > GAP_SECONDS:
+                    del state.gaps[missing]
+        return len(rows)
+
+stream_broker = StreamBroker()
@@ -0,0 +1,260 @@
+import hashlib
+import logging
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+import cloudinary.uploader
+from flask import current_app
+from flask.wrappers import Request
+from sqlalchemy import update
+from app import db
+from app.models import Application
+
+logger = logging.getLogger(__name__)
+
+PDF_MAGIC = b'%PDF-'
+
+class ResumeUploadError(Exception):
+    pass
+
+class ResumeRejected(Exception):
+    # Deliberately not a ValueError: Werkzeug's form parser swallows those.
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+class ResumeSpool:
+    """Writable target for a resume while the multipart body streams in.
+
+    Werkzeug's parser writes the file part here chunk by chunk, so the PDF
+    signature and the size limit are enforced on the first offending chunk
+    and nothing is buffered in memory. The bytes land in the spool directory
+    and are hashed on the way through.
+    """
+
+    def __init__(self, directory, max_bytes):
+        fd, self.path = tempfile.mkstemp(dir=directory, suffix='.part')
+        self.file = os.fdopen(fd, 'w+b')
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.head = b''
+        self.digest = hashlib.sha256()
+        self.claimed = False
+
+    def write(self, chunk):
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            self.close()
+            raise ResumeRejected(f'Resume must be at most {self.max_bytes // (1024 * 1024)} MB.', 413)
+        if len(self.head) < len(PDF_MAGIC):
+            self.head += chunk[:len(PDF_MAGIC) - len(self.head)]
+            if not PDF_MAGIC.startswith(self.head):
+                self.close()
+                raise ResumeRejected('Resume must be a PDF file.')
+        self.digest.update(chunk)
+        return self.file.write(chunk)
+
+    @property
+    def is_pdf(self):
+        return self.head == PDF_MAGIC
+
+    @property
+    def sha256(self):
+        return self.digest.hexdigest()
+
+    def seek(self, *args):
+        return self.file.seek(*args)
+
+    def tell(self):
+        return self.file.tell()
+
+    def read(self, *args):
+        return self.file.read(*args)
+
+    def claim(self, path):
+        self.file.close()
+        os.replace(self.path, path)
+        self.claimed = True
+
+    def close(self):
+        self.file.close()
+        if not self.claimed:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+
+class ResumeRequest(Request):
+    """Streams file parts of resume endpoints straight into a ResumeSpool.
+
+    Only one file part is accepted; each would otherwise get its own spool
+    file of up to ``RESUME_MAX_BYTES``.
+    """
+
+    spooled_endpoints = {'applications.apply_job'}
+    resume_spool = None
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if self.endpoint in self.spooled_endpoints:
+            if self.resume_spool is not None:
+                self.resume_spool.close()
+                raise ResumeRejected('Only one file can be uploaded.')
+            state = current_app.extensions['resume_uploads']
+            self.resume_spool = ResumeSpool(state.spool_dir, state.max_bytes)
+            return self.resume_spool
+        return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+
+class CloudinaryResumeUploader:
+    def upload(self, path):
+        result = cloudinary.uploader.upload(path, resource_type='raw', folder='resumes', format='pdf')
+        return result['secure_url']
+
+class LocalResumeUploader:
+    """Stand-in for Cloudinary that copies resumes into a local directory."""
+
+    def __init__(self, directory, base_url='http://localhost/resumes'):
+        self.directory = directory
+        self.base_url = base_url.rstrip('/')
+        os.makedirs(directory, exist_ok=True)
+
+    def upload(self, path):
+        name = os.path.basename(path)
+        shutil.copyfile(path, os.path.join(self.directory, name))
+        return f'{self.base_url}/{name}'
+
+class _PipelineState:
+    def __init__(self, app):
+        self.mode = app.config['RESUME_UPLOAD_MODE']
+        self.spool_dir = app.config['RESUME_SPOOL_DIR'] or os.path.join(tempfile.gettempdir(), 'resume-spool')
+        self.workers = int(app.config['RESUME_UPLOAD_WORKERS'])
+        self.retries = int(app.config['RESUME_UPLOAD_RETRIES'])
+        self.backoff = float(app.config['RESUME_UPLOAD_BACKOFF'])
+        self.max_bytes = int(app.config['RESUME_MAX_BYTES'])
+        self.uploader = app.config.get('RESUME_UPLOADER') or CloudinaryResumeUploader()
+        self.executor = None
+        self.futures = set()
+        self.lock = threading.Lock()
+        os.makedirs(self.spool_dir, exist_ok=True)
+
+    def get_executor(self):
+        with self.lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='resume-upload')
+            return self.executor
+
+class ResumeUploadPipeline:
+    """Spools resumes to disk and uploads them, inline or on a worker pool.
+
+    In ``sync`` mode the request waits for the upload, as before. In ``async``
+    mode the application is saved with ``resume_status='pending'`` and a
+    background thread uploads the spooled file, retrying with exponential
+    backoff, then fills in ``resume_link``.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['resume_uploads'] = _PipelineState(app)
+
+    @property
+    def state(self):
+        return current_app.extensions['resume_uploads']
+
+    @property
+    def is_async(self):
+        return self.state.mode == 'async'
+
+    def spool_path(self, application_id):
+        return os.path.join(self.state.spool_dir, f'{application_id}.pdf')
+
+    def check(self, file_storage):
+        """Raise ResumeRejected unless the upload is a PDF within the size limit."""
+        if not file_storage.filename.lower().endswith('.pdf'):
+            raise ResumeRejected('Resume must be a PDF file.')
+        stream = file_storage.stream
+        if isinstance(stream, ResumeSpool) and not stream.is_pdf:
+            raise ResumeRejected('Resume must be a PDF file.')
+
+    def content_hash(self, file_storage):
+        stream = file_storage.stream
+        return stream.sha256 if isinstance(stream, ResumeSpool) else None
+
+    def spool(self, file_storage, application_id):
+        path = self.spool_path(application_id)
+        if isinstance(file_storage.stream, ResumeSpool):
+            file_storage.stream.claim(path)
+        else:
+            file_storage.save(path)
+        return path
+
+    def discard(self, application_id):
+        try:
+            os.remove(self.spool_path(application_id))
+        except FileNotFoundError:
+            pass
+
+    def upload(self, application_id):
+        """Upload the spooled resume, retrying with backoff. Returns the URL."""
+        state = self.state
+        path = self.spool_path(application_id)
+        for attempt in range(state.retries + 1):
+            try:
+                url = state.uploader.upload(path)
+                break
+            except Exception:
+                if attempt == state.retries:
+                    logger.exception('Resume upload for application %s failed after %d attempts', application_id, attempt + 1)
+                    raise ResumeUploadError(f'Resume upload failed for application {application_id}')
+                delay = state.backoff * (2 ** attempt)
+                time.sleep(delay + random.uniform(0, delay / 2))
+        os.remove(path)
+        return url
+
+    def submit(self, application_id):
+        app = current_app._get_current_object()
+        state = self.state
+        future = state.get_executor().submit(self._run, app, application_id)
+        with state.lock:
+            state.futures.add(future)
+        future.add_done_callback(lambda f: self._forget(state, f))
+        return future
+
+    def process(self, application_id):
+        """Upload one pending resume and record the outcome on its application."""
+        try:
+            url = self.upload(application_id)
+        except ResumeUploadError:
+            values = {'resume_status': 'failed'}
+        else:
+            values = {'resume_status': 'uploaded', 'resume_link': url}
+        db.session.execute(update(Application).where(Application.id == application_id).values(values))
+        db.session.commit()
+        return values['resume_status']
+
+    def drain(self, timeout=None):
+        """Block until every submitted upload has finished."""
+        state = self.state
+        with state.lock:
+            pending = list(state.futures)
+        wait(pending, timeout=timeout)
+
+    def _run(self, app, application_id):
+        with app.app_context():
+            try:
+                return self.process(application_id)
+            finally:
+                db.session.remove()
+
+    @staticmethod
+    def _forget(state, future):
+        with state.lock:
+            state.futures.discard(future)
+
+resume_uploads = ResumeUploadPipeline()
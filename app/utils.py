@@ -1,3 +1,4 @@
+import uuid
 from flask import jsonify
 from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity, get_jwt
 from functools import wraps
@@ -10,7 +11,7 @@ def base_response(success, message, obj=None, errors=None):
         'Errors': errors or None
     })
 
-def paginated_response(success, message, obj, page_number, page_size, total_size, errors=None):
+def paginated_response(success, message, obj, page_number, page_size, total_size, errors=None, next_cursor=None):
     return jsonify({
         'Success': success,
         'Message': message,
@@ -18,9 +19,20 @@ def paginated_response(success, message, obj, page_number, page_size, total_size
         'PageNumber': page_number,
         'PageSize': page_size,
         'TotalSize': total_size,
+        'NextCursor': next_cursor,
         'Errors': errors or None
     })
 
+def current_user_id():
+    # Tokens carry the user id as a string; the model columns expect a UUID.
+    return uuid.UUID(get_jwt_identity())
+
+def parse_uuid(value):
+    try:
+        return uuid.UUID(str(value))
+    except (TypeError, ValueError):
+        return None
+
 def role_required(role):
     def decorator(fn):
         @wraps(fn)
@@ -0,0 +1,57 @@
+"""Compare job creation throughput: one POST /jobs per job vs POST /jobs/bulk.
+
+Usage:
+    python -m benchmarks.bench_bulk_import --jobs 2000
+
+Runs against DATABASE_URL if set, otherwise a throwaway SQLite file.
+"""
+import argparse
+import os
+import tempfile
+import time
+from app import create_app, db
+
+def make_jobs(count, prefix):
+    return [{
+        'title': f'{prefix} job {i}',
+        'description': 'A synthetic job posting used for throughput measurements.',
+        'location': 'Remote'
+    } for i in range(count)]
+
+def company_token(client):
+    credentials = {'email': 'bench@company.test', 'password': 'Password123!'}
+    client.post('/auth/signup', json={'name': 'Bench Company', 'role': 'company', **credentials})
+    return client.post('/auth/login', json=credentials).get_json()['Object']['token']
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--jobs', type=int, default=1000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench-bulk-')
+    uri = os.getenv('DATABASE_URL') or f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    app = create_app({'SQLALCHEMY_DATABASE_URI': uri, 'JWT_SECRET_KEY': 'bench-secret-key-of-sufficient-length',
+                      'BULK_IMPORT_MAX_ITEMS': max(args.jobs, 10000)})
+    with app.app_context():
+        db.create_all()
+        client = app.test_client()
+        headers = {'Authorization': f'Bearer {company_token(client)}'}
+
+        started = time.perf_counter()
+        for job in make_jobs(args.jobs, 'Single'):
+            assert client.post('/jobs', json=job, headers=headers).status_code == 201
+        single = time.perf_counter() - started
+
+        started = time.perf_counter()
+        resp = client.post('/jobs/bulk', json=make_jobs(args.jobs, 'Bulk'), headers=headers)
+        bulk = time.perf_counter() - started
+        assert resp.get_json()['Object']['Created'] == args.jobs
+
+        print(f'{"path":<16}{"seconds":>10}{"jobs/s":>12}')
+        print(f'{"POST /jobs":<16}{single:>10.3f}{args.jobs / single:>12.0f}')
+        print(f'{"POST /jobs/bulk":<16}{bulk:>10.3f}{args.jobs / bulk:>12.0f}')
+        print(f'speedup: {single / bulk:.1f}x')
+        db.drop_all()
+
+if __name__ == '__main__':
+    main()
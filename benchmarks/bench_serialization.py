@@ -0,0 +1,64 @@
+"""Compare list serialization: marshmallow + json vs RowSerializer + orjson.
+
+Usage:
+    python -m benchmarks.bench_serialization --rows 100 --rounds 2000
+
+Queries ``--rows`` job rows once, then times turning them into a paginated
+response body ``--rounds`` times along each path. The bodies are checked to
+be byte-identical before timing.
+"""
+import argparse
+import time
+import uuid
+from flask.json.provider import DefaultJSONProvider
+from app import create_app, db
+from app.models import Job, User
+from app.schemas import JobSchema
+from app.serializers import OrjsonProvider, RowSerializer, orjson
+from app.utils import paginated_response
+
+def seed(count):
+    company = User(name='Bench Company', email='bench@company.test', password='x', role='company')
+    db.session.add(company)
+    db.session.flush()
+    db.session.add_all([Job(title=f'Job {i} {uuid.uuid4().hex[:8]}', location='Remote', created_by=company.id,
+                            description='A synthetic job posting used for serialization measurements.')
+                        for i in range(count)])
+    db.session.commit()
+
+def render(app, provider, dump, rows):
+    app.json = provider
+    return paginated_response(True, 'Jobs fetched', dump(rows), 1, len(rows), len(rows)).get_data()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100)
+    parser.add_argument('--rounds', type=int, default=2000)
+    args = parser.parse_args()
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:', 'JWT_SECRET_KEY': 'bench-secret-key-of-sufficient-length'})
+    with app.app_context():
+        db.create_all()
+        seed(args.rows)
+        rows = db.session.query(Job.id, Job.title, Job.description, Job.location, Job.created_by, Job.created_at).all()
+        schema = JobSchema()
+        serializer = RowSerializer(schema)
+        paths = [('marshmallow+json', DefaultJSONProvider(app), lambda items: [schema.dump(row) for row in items]),
+                 ('rows+json', DefaultJSONProvider(app), serializer.many)]
+        if orjson is not None:
+            paths.append(('rows+orjson', OrjsonProvider(app), serializer.many))
+        bodies = {render(app, provider, dump, rows) for _, provider, dump in paths}
+        assert len(bodies) == 1, 'serialization paths disagree'
+
+        print(f'{"path":<20}{"seconds":>10}{"pages/s":>12}')
+        baseline = None
+        for name, provider, dump in paths:
+            started = time.perf_counter()
+            for _ in range(args.rounds):
+                render(app, provider, dump, rows)
+            elapsed = time.perf_counter() - started
+            baseline = baseline or elapsed
+            print(f'{name:<20}{elapsed:>10.3f}{args.rounds / elapsed:>12.0f}  ({baseline / elapsed:.1f}x)')
+
+if __name__ == '__main__':
+    main()
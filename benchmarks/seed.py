@@ -0,0 +1,118 @@
+"""Seed a database with synthetic users, jobs and applications.
+
+Usage:
+    python -m benchmarks.seed --jobs 100000 --applications 5000000
+
+Writes to DATABASE_URL (or --database-url). The data is derived from --seed,
+so two runs at the same scale produce the same rows. Every seeded user's
+password is BENCH_PASSWORD.
+"""
+import argparse
+import os
+import random
+import time
+import uuid
+from datetime import datetime, timedelta
+from sqlalchemy import insert
+from werkzeug.security import generate_password_hash
+from app import create_app, db
+from app.counters import reconcile_application_counts
+from app.models import APPLICATION_STATUSES, Application, Job, User
+
+BENCH_PASSWORD = 'BenchPassword1!'
+CHUNK_SIZE = 5000
+
+TITLES = ('Backend Engineer', 'Frontend Developer', 'Data Analyst', 'DevOps Engineer', 'Product Designer',
+          'QA Engineer', 'Mobile Developer', 'Python Developer', 'Site Reliability Engineer', 'ML Engineer')
+LOCATIONS = ('Remote', 'Addis Ababa', 'Nairobi', 'Lagos', 'Berlin', 'London', 'New York', 'Toronto')
+WORDS = ('python', 'postgres', 'flask', 'kubernetes', 'react', 'typescript', 'analytics', 'cloud',
+         'security', 'testing', 'design', 'mentoring', 'distributed', 'systems', 'api', 'mobile')
+STATUS_WEIGHTS = (60, 20, 10, 7, 3)
+
+def company_email(i):
+    return f'company{i}@bench.test'
+
+def applicant_email(i):
+    return f'applicant{i}@bench.test'
+
+def _uuid(rng):
+    return uuid.UUID(int=rng.getrandbits(128), version=4)
+
+def _insert(table, rows):
+    for start in range(0, len(rows), CHUNK_SIZE):
+        db.session.execute(insert(table), rows[start:start + CHUNK_SIZE])
+    db.session.commit()
+
+def seed(companies=50, applicants=5000, jobs=2000, applications=20000, seed=42, log=print):
+    """Insert the synthetic data set. Applications are spread evenly over jobs."""
+    if applications > jobs * applicants:
+        raise ValueError('applications must not exceed jobs * applicants')
+    rng = random.Random(seed)
+    password = generate_password_hash(BENCH_PASSWORD)
+    started = time.perf_counter()
+    company_ids = [_uuid(rng) for _ in range(companies)]
+    applicant_ids = [_uuid(rng) for _ in range(applicants)]
+    _insert(User.__table__, [
+        {'id': company_ids[i], 'name': f'Bench Company {i}', 'email': company_email(i), 'password': password, 'role': 'company'}
+        for i in range(companies)
+    ] + [
+        {'id': applicant_ids[i], 'name': f'Bench Applicant {i}', 'email': applicant_email(i), 'password': password, 'role': 'applicant'}
+        for i in range(applicants)
+    ])
+    log(f'users: {companies + applicants}')
+
+    now = datetime.utcnow()
+    job_ids = [_uuid(rng) for _ in range(jobs)]
+    for start in range(0, jobs, CHUNK_SIZE):
+        _insert(Job.__table__, [{
+            'id': job_ids[i],
+            'title': f'{rng.choice(TITLES)} {i}',
+            'description': ' '.join(rng.choices(WORDS, k=24)),
+            'location': rng.choice(LOCATIONS),
+            'created_by': company_ids[i % companies],
+            'created_at': now - timedelta(minutes=jobs - i),
+        } for i in range(start, min(start + CHUNK_SIZE, jobs))])
+    log(f'jobs: {jobs}')
+
+    # Application n goes to job n % jobs; the k-th application of a job picks
+    # applicant (offset + k) % applicants, so (applicant, job) pairs are unique.
+    for start in range(0, applications, CHUNK_SIZE):
+        rows = []
+        for n in range(start, min(start + CHUNK_SIZE, applications)):
+            job, k = n % jobs, n // jobs
+            rows.append({
+                'id': _uuid(rng),
+                'applicant_id': applicant_ids[(job * 7919 + k) % applicants],
+                'job_id': job_ids[job],
+                'resume_link': f'https://example.com/resumes/{n}.pdf',
+                'resume_status': 'uploaded',
+                'cover_letter': 'Synthetic cover letter for benchmarking.',
+                'status': rng.choices(APPLICATION_STATUSES, STATUS_WEIGHTS)[0],
+                'applied_at': now - timedelta(seconds=applications - n),
+            })
+        _insert(Application.__table__, rows)
+        if (start // CHUNK_SIZE) % 100 == 99:
+            log(f'applications: {start + len(rows)}')
+    log(f'applications: {applications}')
+    reconcile_application_counts()
+    log(f'seeded in {time.perf_counter() - started:.1f}s')
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', default=os.getenv('DATABASE_URL'))
+    parser.add_argument('--companies', type=int, default=50)
+    parser.add_argument('--applicants', type=int, default=5000)
+    parser.add_argument('--jobs', type=int, default=2000)
+    parser.add_argument('--applications', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    if not args.database_url:
+        parser.error('set DATABASE_URL or pass --database-url')
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': args.database_url, 'METRICS_ENABLED': False})
+    with app.app_context():
+        db.create_all()
+        seed(args.companies, args.applicants, args.jobs, args.applications, args.seed)
+
+if __name__ == '__main__':
+    main()
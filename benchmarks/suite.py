@@ -0,0 +1,313 @@
+"""Latency and throughput of every auth, jobs and applications endpoint.
+
+Usage:
+    python -m benchmarks.suite                                  # test client, throwaway SQLite
+    python -m benchmarks.suite --jobs 100000 --applications 5000000
+    python -m benchmarks.suite --mode http --spawn-gunicorn --workers 4 --processes 8
+    python -m benchmarks.suite --mode http --url http://127.0.0.1:5000 --no-seed
+    python -m benchmarks.suite --baseline benchmarks/baseline.json
+
+Seeds DATABASE_URL (or a throwaway SQLite file) unless --no-seed is given,
+then sends --requests requests to each scenario in turn. In ``client`` mode
+requests go through Flask's test client in this process. In ``http`` mode
+--processes load generator processes share the requests against a running
+server (--url) or a gunicorn started for the run (--spawn-gunicorn). Reports
+p50/p95/p99 latency and throughput per scenario.
+
+With --baseline, exits non-zero if a scenario's p95 rose or its throughput
+fell by more than --tolerance, or if it returned errors. --save-baseline
+writes the results in the baseline format along with the run's mode, scale,
+seed and request counts; a baseline recorded with other settings is refused.
+Baselines only compare runs on the same machine.
+
+POST /applications/apply is not covered: it uploads the resume to Cloudinary.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from benchmarks.seed import BENCH_PASSWORD, WORDS, applicant_email, company_email, seed
+
+IDENTITIES = 10
+JWT_SECRET = 'bench-secret-key-of-sufficient-length'
+
+def _own_job(rng, ctx, identity):
+    return rng.choice(ctx['company_jobs'][identity['company']])
+
+def _job_payload(rng):
+    return {'title': f'Load test job {rng.randrange(10 ** 6)}', 'location': 'Remote',
+            'description': ' '.join(rng.choices(WORDS, k=12))}
+
+# name -> (role, build(rng, ctx, identity) -> (method, path, options))
+SCENARIOS = {
+    'auth.login': (None, lambda rng, ctx, identity: (
+        'POST', '/auth/login', {'json': {'email': identity['applicant'], 'password': BENCH_PASSWORD}})),
+    'auth.signup': (None, lambda rng, ctx, identity: (
+        'POST', '/auth/signup', {'json': {'name': 'Load Tester', 'role': 'applicant', 'password': BENCH_PASSWORD,
+                                          'email': f'load-{uuid.UUID(int=rng.getrandbits(128))}@bench.test'}})),
+    'jobs.browse': ('applicant', lambda rng, ctx, identity: (
+        'GET', '/jobs', {'params': {'page': rng.randint(1, 20)}})),
+    'jobs.browse_cursor': ('applicant', lambda rng, ctx, identity: (
+        'GET', '/jobs', {'params': {'cursor': '', 'location': rng.choice(('Remote', 'Berlin', ''))}})),
+    'jobs.search': ('applicant', lambda rng, ctx, identity: (
+        'GET', '/jobs', {'params': {'q': rng.choice(WORDS)}})),
+    'jobs.detail': ('applicant', lambda rng, ctx, identity: (
+        'GET', f"/jobs/{rng.choice(ctx['job_ids'])}", {})),
+    'jobs.my': ('company', lambda rng, ctx, identity: ('GET', '/jobs/my', {})),
+    'jobs.create': ('company', lambda rng, ctx, identity: ('POST', '/jobs', {'json': _job_payload(rng)})),
+    'jobs.update': ('company', lambda rng, ctx, identity: (
+        'PUT', f'/jobs/{_own_job(rng, ctx, identity)}', {'json': {'location': rng.choice(('Remote', 'Berlin'))}})),
+    'applications.my': ('applicant', lambda rng, ctx, identity: ('GET', '/applications/my', {})),
+    'applications.job': ('company', lambda rng, ctx, identity: (
+        'GET', f'/applications/job/{_own_job(rng, ctx, identity)}', {'params': {'cursor': ''}})),
+    'applications.status': ('company', lambda rng, ctx, identity: (
+        'PUT', f"/applications/status/{rng.choice(ctx['company_applications'][identity['company']])}",
+        {'json': {'status': rng.choice(('Reviewed', 'Interview', 'Rejected'))}})),
+}
+
+def load_context(companies, applicants):
+    """Ids the scenarios pick from, read from the seeded database."""
+    from app import db
+    from app.models import Application, Job, User
+    ctx = {'identities': [], 'company_jobs': {}, 'company_applications': {}}
+    ctx['job_ids'] = [str(row.id) for row in db.session.query(Job.id).order_by(Job.created_at.desc()).limit(1000)]
+    for i in range(min(IDENTITIES, companies)):
+        email = company_email(i)
+        jobs = [row.id for row in db.session.query(Job.id).join(User, Job.created_by == User.id)
+                .filter(User.email == email).order_by(Job.created_at.desc()).limit(50)]
+        ctx['company_jobs'][email] = [str(job_id) for job_id in jobs]
+        ctx['company_applications'][email] = [str(row.id) for row in db.session.query(Application.id)
+                                              .filter(Application.job_id.in_(jobs)).limit(500)]
+    for i in range(IDENTITIES):
+        ctx['identities'].append({'company': company_email(i % min(IDENTITIES, companies)),
+                                  'applicant': applicant_email(i % applicants)})
+    return ctx
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+def summarize(latencies, errors, elapsed):
+    latencies = sorted(latencies)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+    }
+
+class _Runner:
+    """Sends scenario requests through ``send(method, path, headers, options) -> status``."""
+
+    def __init__(self, send, ctx):
+        self.send = send
+        self.ctx = ctx
+        self.tokens = {}
+        for identity in ctx['identities']:
+            for role in ('company', 'applicant'):
+                email = identity[role]
+                if email not in self.tokens:
+                    status, body = send('POST', '/auth/login', {}, {'json': {'email': email, 'password': BENCH_PASSWORD}})
+                    if status != 200:
+                        raise RuntimeError(f'login for {email} failed with {status}')
+                    self.tokens[email] = body['Object']['token']
+
+    def run(self, name, count, rng):
+        role, build = SCENARIOS[name]
+        latencies, errors = [], 0
+        for _ in range(count):
+            identity = rng.choice(self.ctx['identities'])
+            method, path, options = build(rng, self.ctx, identity)
+            headers = {'Authorization': f'Bearer {self.tokens[identity[role]]}'} if role else {}
+            started = time.perf_counter()
+            status, _ = self.send(method, path, headers, options)
+            latencies.append(time.perf_counter() - started)
+            if status >= 400:
+                errors += 1
+        return latencies, errors
+
+def client_sender(client):
+    def send(method, path, headers, options):
+        resp = client.open(path, method=method, headers=headers, json=options.get('json'),
+                           query_string=options.get('params'))
+        return resp.status_code, resp.get_json(silent=True)
+    return send
+
+def http_sender(base_url):
+    import requests
+    session = requests.Session()
+    def send(method, path, headers, options):
+        resp = session.request(method, base_url + path, headers=headers, json=options.get('json'),
+                               params=options.get('params'))
+        return resp.status_code, (resp.json() if resp.headers.get('Content-Type', '').startswith('application/json') else None)
+    return send
+
+_worker = None
+
+def _init_http_worker(base_url, ctx):
+    global _worker
+    _worker = _Runner(http_sender(base_url), ctx)
+
+def _run_http_share(name, count, seed):
+    return _worker.run(name, count, random.Random(seed))
+
+def run_client(args, ctx):
+    runner = _Runner(client_sender(args.app.test_client()), ctx)
+    results = {}
+    for n, name in enumerate(args.scenarios):
+        started = time.perf_counter()
+        latencies, errors = runner.run(name, args.requests, random.Random(args.seed + n))
+        results[name] = summarize(latencies, errors, time.perf_counter() - started)
+    return results
+
+def run_http(args, ctx, base_url):
+    results = {}
+    with multiprocessing.Pool(args.processes, _init_http_worker, (base_url, ctx)) as pool:
+        for n, name in enumerate(args.scenarios):
+            shares = [(name, args.requests // args.processes + (i < args.requests % args.processes),
+                       args.seed + n * 1000 + i) for i in range(args.processes)]
+            started = time.perf_counter()
+            outcomes = pool.starmap(_run_http_share, shares)
+            elapsed = time.perf_counter() - started
+            results[name] = summarize([latency for latencies, _ in outcomes for latency in latencies],
+                                      sum(errors for _, errors in outcomes), elapsed)
+    return results
+
+def spawn_gunicorn(args):
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+    env = dict(os.environ, DATABASE_URL=args.database_url, JWT_SECRET_KEY=JWT_SECRET, RATELIMIT_ENABLED='false')
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-w', str(args.workers), '-b', f'127.0.0.1:{port}',
+                               '--log-level', 'warning', 'run:app'], env=env)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return server, f'http://127.0.0.1:{port}'
+        except OSError:
+            if server.poll() is not None:
+                raise RuntimeError('gunicorn exited during startup')
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError('gunicorn did not start within 30s')
+
+# What a baseline must share with a run for their numbers to be comparable.
+RUN_PARAMETERS = ('mode', 'requests', 'seed', 'scale', 'processes', 'workers')
+
+def run_parameters(args):
+    parameters = {'mode': args.mode, 'requests': args.requests, 'seed': args.seed,
+                  'scale': {'companies': args.companies, 'applicants': args.applicants,
+                            'jobs': args.jobs, 'applications': args.applications}}
+    if args.mode == 'http':
+        parameters['processes'] = args.processes
+        if args.spawn_gunicorn:
+            parameters['workers'] = args.workers
+    return parameters
+
+def mismatched_parameters(parameters, baseline):
+    """Return a line per run parameter that differs from ``baseline``."""
+    return [f'{key}: {baseline.get(key)!r} in the baseline, {parameters.get(key)!r} in this run'
+            for key in RUN_PARAMETERS if baseline.get(key) != parameters.get(key)]
+
+def compare(results, baseline, tolerance):
+    """Return a line per scenario that regressed against ``baseline``."""
+    failures = []
+    for name, base in baseline['results'].items():
+        current = results.get(name)
+        if current is None:
+            continue
+        if current['errors']:
+            failures.append(f'{name}: {current["errors"]} error responses')
+        if current['p95_ms'] > base['p95_ms'] * (1 + tolerance):
+            failures.append(f'{name}: p95 {current["p95_ms"]}ms vs baseline {base["p95_ms"]}ms')
+        if current['rps'] < base['rps'] * (1 - tolerance):
+            failures.append(f'{name}: {current["rps"]} req/s vs baseline {base["rps"]} req/s')
+    return failures
+
+def print_report(results):
+    print(f'{"scenario":<24}{"requests":>9}{"errors":>8}{"req/s":>10}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}')
+    for name, row in results.items():
+        print(f'{name:<24}{row["requests"]:>9}{row["errors"]:>8}{row["rps"]:>10.1f}'
+              f'{row["p50_ms"]:>10.2f}{row["p95_ms"]:>10.2f}{row["p99_ms"]:>10.2f}')
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mode', choices=('client', 'http'), default='client')
+    parser.add_argument('--database-url', default=os.getenv('DATABASE_URL'))
+    parser.add_argument('--no-seed', action='store_true', help='use the data already in the database')
+    parser.add_argument('--companies', type=int, default=50)
+    parser.add_argument('--applicants', type=int, default=5000)
+    parser.add_argument('--jobs', type=int, default=2000)
+    parser.add_argument('--applications', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--scenarios', default='', help='comma separated names or prefixes, e.g. jobs,auth.login')
+    parser.add_argument('--requests', type=int, default=200, help='requests per scenario')
+    parser.add_argument('--processes', type=int, default=4, help='load generator processes (http mode)')
+    parser.add_argument('--url', help='server to load (http mode)')
+    parser.add_argument('--spawn-gunicorn', action='store_true', help='start gunicorn on the database (http mode)')
+    parser.add_argument('--workers', type=int, default=4, help='gunicorn workers for --spawn-gunicorn')
+    parser.add_argument('--output', help='write the results as JSON')
+    parser.add_argument('--baseline', help='fail on regressions against this results file')
+    parser.add_argument('--save-baseline', help='write the results as a new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    args = parser.parse_args()
+    if args.mode == 'http' and not (args.url or args.spawn_gunicorn):
+        parser.error('http mode needs --url or --spawn-gunicorn')
+    prefixes = [prefix.strip() for prefix in args.scenarios.split(',') if prefix.strip()]
+    args.scenarios = [name for name in SCENARIOS if not prefixes or any(name.startswith(p) for p in prefixes)]
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as handle:
+            baseline = json.load(handle)
+        mismatches = mismatched_parameters(run_parameters(args), baseline)
+        if mismatches:
+            parser.error(f'{args.baseline} was recorded with different settings:\n  ' + '\n  '.join(mismatches))
+    if not args.database_url:
+        args.database_url = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='bench-suite-'), 'bench.db')}"
+
+    from app import create_app, db
+    args.app = create_app({'SQLALCHEMY_DATABASE_URI': args.database_url, 'JWT_SECRET_KEY': JWT_SECRET,
+                           'METRICS_ENABLED': False, 'RATELIMIT_ENABLED': False})
+    with args.app.app_context():
+        if not args.no_seed:
+            db.create_all()
+            seed(args.companies, args.applicants, args.jobs, args.applications, args.seed)
+        ctx = load_context(args.companies, args.applicants)
+        if args.mode == 'client':
+            results = run_client(args, ctx)
+        else:
+            db.session.remove()
+            server, base_url = spawn_gunicorn(args) if args.spawn_gunicorn else (None, args.url.rstrip('/'))
+            try:
+                results = run_http(args, ctx, base_url)
+            finally:
+                if server is not None:
+                    server.terminate()
+                    server.wait()
+
+    print_report(results)
+    report = dict(run_parameters(args), results=results)
+    for path in filter(None, (args.output, args.save_baseline)):
+        with open(path, 'w') as handle:
+            json.dump(report, handle, indent=2, sort_keys=True)
+    if baseline is not None:
+        failures = compare(results, baseline, args.tolerance)
+        if failures:
+            print('\nRegressions:')
+            print('\n'.join(f'  {line}' for line in failures))
+            sys.exit(1)
+        print(f'\nNo regressions against {args.baseline} (tolerance {args.tolerance:.0%}).')
+
+if __name__ == '__main__':
+    main()
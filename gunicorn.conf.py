@@ -0,0 +1,28 @@
+"""Gunicorn settings for running several workers with shared Prometheus metrics.
+
+    PROMETHEUS_MULTIPROC_DIR=/tmp/joblisting-metrics gunicorn run:app
+
+The directory must be set in the environment before gunicorn starts, so the
+workers pick the multiprocess value store when they import prometheus_client.
+"""
+import os
+import shutil
+
+workers = int(os.getenv('WEB_CONCURRENCY', 2))
+# Threads per worker; each open /applications/stream holds one, up to SSE_MAX_STREAMS.
+threads = int(os.getenv('GUNICORN_THREADS', 8))
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+
+
+def on_starting(server):
+    directory = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if directory:
+        # Samples left by a previous run would be added to the new totals.
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory)
+
+
+def child_exit(server, worker):
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
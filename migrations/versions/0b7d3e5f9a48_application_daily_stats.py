@@ -0,0 +1,59 @@
+"""Application daily stats rollup
+
+Revision ID: 0b7d3e5f9a48
+Revises: f2a6c8d91b35
+Create Date: 2026-10-17 15:48:19.377025
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# The trigger DDL is shared with db.create_all(), so there is one copy of it.
+from app.stats import PG_CREATE_TRIGGERS, SQLITE_CREATE_TRIGGERS
+
+
+# revision identifiers, used by Alembic.
+revision = '0b7d3e5f9a48'
+down_revision = 'f2a6c8d91b35'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    op.create_table('application_daily_stats',
+    sa.Column('job_id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('status', postgresql.ENUM('Applied', 'Reviewed', 'Interview', 'Rejected', 'Hired', name='application_status', create_type=False)
+              if dialect == 'postgresql' else sa.Enum('Applied', 'Reviewed', 'Interview', 'Rejected', 'Hired', name='application_status'),
+              nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['job_id'], ['jobs.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('job_id', 'day', 'status')
+    )
+
+    if dialect == 'postgresql':
+        for statement in PG_CREATE_TRIGGERS:
+            op.execute(statement)
+        day = 'applied_at::date'
+    else:
+        for statement in SQLITE_CREATE_TRIGGERS:
+            op.execute(statement)
+        day = 'date(applied_at)'
+
+    # Backfill; `flask rebuild-application-stats` does the same later on.
+    op.execute(
+        "INSERT INTO application_daily_stats (job_id, day, status, count) "
+        f"SELECT job_id, {day}, status, count(*) FROM applications WHERE status IS NOT NULL "
+        f"GROUP BY job_id, {day}, status"
+    )
+
+
+def downgrade():
+    for trigger in ('application_daily_stats_ad', 'application_daily_stats_au', 'application_daily_stats_ai'):
+        op.execute(f'DROP TRIGGER IF EXISTS {trigger} ON applications' if op.get_bind().dialect.name == 'postgresql'
+                   else f'DROP TRIGGER IF EXISTS {trigger}')
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute('DROP FUNCTION IF EXISTS application_daily_stats_apply()')
+    op.drop_table('application_daily_stats')
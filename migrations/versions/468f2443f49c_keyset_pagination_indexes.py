@@ -0,0 +1,30 @@
+"""Keyset pagination indexes
+
+Revision ID: 468f2443f49c
+Revises: 2482b500bd91
+Create Date: 2026-10-16 09:12:04.381920
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '468f2443f49c'
+down_revision = '2482b500bd91'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_jobs_created_at_id', 'jobs', ['created_at', 'id'], unique=False)
+    op.create_index('ix_jobs_created_by_created_at_id', 'jobs', ['created_by', 'created_at', 'id'], unique=False)
+    op.create_index('ix_applications_applicant_id_applied_at_id', 'applications', ['applicant_id', 'applied_at', 'id'], unique=False)
+    op.create_index('ix_applications_job_id_applied_at_id', 'applications', ['job_id', 'applied_at', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_applications_job_id_applied_at_id', table_name='applications')
+    op.drop_index('ix_applications_applicant_id_applied_at_id', table_name='applications')
+    op.drop_index('ix_jobs_created_by_created_at_id', table_name='jobs')
+    op.drop_index('ix_jobs_created_at_id', table_name='jobs')
@@ -0,0 +1,28 @@
+"""Application resume content hash
+
+Revision ID: 58869688b24f
+Revises: 5e1e5d410ad7
+Create Date: 2026-10-16 13:58:31.904452
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '58869688b24f'
+down_revision = '5e1e5d410ad7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('applications', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('resume_sha256', sa.String(length=64), nullable=True))
+        batch_op.create_index('ix_applications_applicant_id_resume_sha256', ['applicant_id', 'resume_sha256'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('applications', schema=None) as batch_op:
+        batch_op.drop_index('ix_applications_applicant_id_resume_sha256')
+        batch_op.drop_column('resume_sha256')
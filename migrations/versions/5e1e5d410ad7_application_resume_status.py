@@ -0,0 +1,33 @@
+"""Application resume upload status
+
+Revision ID: 5e1e5d410ad7
+Revises: 91193c89d31f
+Create Date: 2026-10-16 12:41:55.270194
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e1e5d410ad7'
+down_revision = '91193c89d31f'
+branch_labels = None
+depends_on = None
+
+resume_status = sa.Enum('pending', 'uploaded', 'failed', name='resume_status')
+
+
+def upgrade():
+    resume_status.create(op.get_bind(), checkfirst=True)
+    with op.batch_alter_table('applications', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('resume_status', resume_status, server_default='uploaded', nullable=False))
+        batch_op.alter_column('resume_link', existing_type=sa.String(length=255), nullable=True)
+
+
+def downgrade():
+    op.execute("DELETE FROM applications WHERE resume_link IS NULL")
+    with op.batch_alter_table('applications', schema=None) as batch_op:
+        batch_op.alter_column('resume_link', existing_type=sa.String(length=255), nullable=False)
+        batch_op.drop_column('resume_status')
+    resume_status.drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,49 @@
+"""Job search indexes
+
+Revision ID: 6c275b3b8ca9
+Revises: 468f2443f49c
+Create Date: 2026-10-16 10:02:47.115603
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# The search DDL is shared with db.create_all(), so there is one copy of it.
+from app.search import PG_CREATE_SEARCH_VECTOR, SQLITE_CREATE_FTS, SQLITE_DROP_FTS
+
+
+# revision identifiers, used by Alembic.
+revision = '6c275b3b8ca9'
+down_revision = '468f2443f49c'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        for statement in SQLITE_CREATE_FTS:
+            op.execute(statement)
+        return
+    if dialect != 'postgresql':
+        return
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for statement in PG_CREATE_SEARCH_VECTOR:
+        op.execute(statement)
+    op.create_index('ix_jobs_title_trgm', 'jobs', ['title'], unique=False, postgresql_using='gin', postgresql_ops={'title': 'gin_trgm_ops'})
+    op.create_index('ix_jobs_location_trgm', 'jobs', ['location'], unique=False, postgresql_using='gin', postgresql_ops={'location': 'gin_trgm_ops'})
+    op.create_index('ix_users_name_trgm', 'users', ['name'], unique=False, postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        for statement in SQLITE_DROP_FTS:
+            op.execute(statement)
+        return
+    if dialect != 'postgresql':
+        return
+    op.drop_index('ix_users_name_trgm', table_name='users')
+    op.drop_index('ix_jobs_location_trgm', table_name='jobs')
+    op.drop_index('ix_jobs_title_trgm', table_name='jobs')
+    op.drop_index('ix_jobs_search_vector', table_name='jobs')
+    op.drop_column('jobs', 'search_vector')
@@ -0,0 +1,42 @@
+"""Job application counters
+
+Revision ID: 91193c89d31f
+Revises: 6c275b3b8ca9
+Create Date: 2026-10-16 11:20:13.502771
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '91193c89d31f'
+down_revision = '6c275b3b8ca9'
+branch_labels = None
+depends_on = None
+
+STATUSES = ('Applied', 'Reviewed', 'Interview', 'Rejected', 'Hired')
+
+
+def upgrade():
+    with op.batch_alter_table('jobs', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('application_count', sa.Integer(), server_default='0', nullable=False))
+        for status in STATUSES:
+            batch_op.add_column(sa.Column(f'{status.lower()}_count', sa.Integer(), server_default='0', nullable=False))
+
+    # Backfill from the existing rows; `flask reconcile-application-counts`
+    # repairs any drift later on.
+    assignments = ['application_count = (SELECT count(*) FROM applications WHERE applications.job_id = jobs.id)']
+    for status in STATUSES:
+        assignments.append(
+            f"{status.lower()}_count = (SELECT count(*) FROM applications "
+            f"WHERE applications.job_id = jobs.id AND applications.status = '{status}')"
+        )
+    op.execute(f"UPDATE jobs SET {', '.join(assignments)}")
+
+
+def downgrade():
+    with op.batch_alter_table('jobs', schema=None) as batch_op:
+        for status in reversed(STATUSES):
+            batch_op.drop_column(f'{status.lower()}_count')
+        batch_op.drop_column('application_count')
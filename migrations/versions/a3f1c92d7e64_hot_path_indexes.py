@@ -0,0 +1,34 @@
+"""Hot path indexes
+
+Revision ID: a3f1c92d7e64
+Revises: 58869688b24f
+Create Date: 2026-10-16 23:05:41.208316
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3f1c92d7e64'
+down_revision = '58869688b24f'
+branch_labels = None
+depends_on = None
+
+UNFINISHED = sa.text("resume_status IN ('pending', 'failed')")
+
+
+def upgrade():
+    # CONCURRENTLY keeps the tables writable during the build on Postgres,
+    # but it can't run inside a transaction.
+    with op.get_context().autocommit_block():
+        op.create_index('ix_applications_job_id_status', 'applications', ['job_id', 'status'], unique=False,
+                        postgresql_concurrently=True)
+        op.create_index('ix_applications_resume_unfinished', 'applications', ['resume_status'], unique=False,
+                        postgresql_concurrently=True, postgresql_where=UNFINISHED, sqlite_where=UNFINISHED)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_applications_resume_unfinished', table_name='applications', postgresql_concurrently=True)
+        op.drop_index('ix_applications_job_id_status', table_name='applications', postgresql_concurrently=True)
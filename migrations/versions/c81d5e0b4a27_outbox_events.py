@@ -0,0 +1,39 @@
+"""Outbox events
+
+Revision ID: c81d5e0b4a27
+Revises: a3f1c92d7e64
+Create Date: 2026-10-17 09:12:27.640915
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'c81d5e0b4a27'
+down_revision = 'a3f1c92d7e64'
+branch_labels = None
+depends_on = None
+
+UNPUBLISHED = sa.text('published_at IS NULL')
+
+
+def upgrade():
+    op.create_table('outbox_events',
+    sa.Column('id', sa.BigInteger().with_variant(sa.Integer(), 'sqlite'), autoincrement=True, nullable=False),
+    sa.Column('event_type', sa.String(length=64), nullable=False),
+    sa.Column('aggregate_type', sa.String(length=32), nullable=False),
+    sa.Column('aggregate_id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('payload', sa.JSON(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('published_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_outbox_events_unpublished', 'outbox_events', ['id'], unique=False,
+                    postgresql_where=UNPUBLISHED, sqlite_where=UNPUBLISHED)
+
+
+def downgrade():
+    op.drop_index('ix_outbox_events_unpublished', table_name='outbox_events')
+    op.drop_table('outbox_events')
@@ -0,0 +1,37 @@
+"""Outbox notify trigger
+
+Revision ID: e4b9f07a6c13
+Revises: c81d5e0b4a27
+Create Date: 2026-10-17 10:41:03.228157
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4b9f07a6c13'
+down_revision = 'c81d5e0b4a27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Wakes SSE brokers running with SSE_BACKEND=listen; NOTIFY is delivered on commit.
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute(
+        "CREATE OR REPLACE FUNCTION notify_outbox_events() RETURNS trigger AS $$ "
+        "BEGIN PERFORM pg_notify('outbox_events', ''); RETURN NULL; END; $$ LANGUAGE plpgsql"
+    )
+    op.execute(
+        "CREATE TRIGGER outbox_events_notify AFTER INSERT ON outbox_events "
+        "FOR EACH STATEMENT EXECUTE FUNCTION notify_outbox_events()"
+    )
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute('DROP TRIGGER IF EXISTS outbox_events_notify ON outbox_events')
+    op.execute('DROP FUNCTION IF EXISTS notify_outbox_events()')
@@ -0,0 +1,37 @@
+"""Job recommendations
+
+Revision ID: f2a6c8d91b35
+Revises: e4b9f07a6c13
+Create Date: 2026-10-17 13:26:52.904311
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2a6c8d91b35'
+down_revision = 'e4b9f07a6c13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('job_recommendations',
+    sa.Column('applicant_id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('job_id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('score', sa.Float(), nullable=False),
+    sa.Column('built_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['applicant_id'], ['users.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['job_id'], ['jobs.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('applicant_id', 'job_id')
+    )
+    op.create_index('ix_job_recommendations_applicant_id_score', 'job_recommendations', ['applicant_id', 'score', 'job_id'], unique=False)
+    op.create_index('ix_job_recommendations_job_id', 'job_recommendations', ['job_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_job_recommendations_job_id', table_name='job_recommendations')
+    op.drop_index('ix_job_recommendations_applicant_id_score', table_name='job_recommendations')
+    op.drop_table('job_recommendations')
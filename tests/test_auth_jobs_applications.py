@@ -1,15 +1,37 @@
+import base64
 import io
+import json
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
 import pytest
+from sqlalchemy import event
 from app import create_app, db
-from app.models import User, Job, Application
+from app.models import User, Job, Application, ApplicationDailyStat, OutboxEvent
+from app.counters import reconcile_application_counts
+from app.uploads import resume_uploads
+from app.cache import cache
+from app.outbox import FileSink, outbox
+from app.passwords import passwords
+from app.ratelimit import Limit, MemoryBuckets, SQLiteBuckets
+from app.recommendations import RecommendationModel, recommender
+from app.stats import rebuild_application_stats
+from app.pool import TimedNullPool, TimedQueuePool, engine_options
+from app.schemas import JobSchema
+from app.serializers import OrjsonProvider, RowSerializer
 from flask_jwt_extended import decode_token
+from werkzeug.test import encode_multipart
 
 @pytest.fixture
 def client():
-    app = create_app()
-    app.config['TESTING'] = True
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
-    app.config['JWT_SECRET_KEY'] = 'test_secret'
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+        'JWT_SECRET_KEY': 'test_secret',
+        'PASSWORD_HASH_WORKERS': 0
+    })
     with app.app_context():
         db.create_all()
         yield app.test_client()
@@ -34,6 +56,31 @@ def signup_and_login(client, role, email, password='Password123!'):
     token = resp.get_json()['Object']['token']
     return token
 
+@contextmanager
+def count_statements():
+    statements = []
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+def seed_applications(company_email, applicant_emails, job_count):
+    company = User.query.filter_by(email=company_email).first()
+    applicants = [User.query.filter_by(email=email).first() or User(name='Seed Applicant', email=email, password='x', role='applicant')
+                  for email in applicant_emails]
+    db.session.add_all(applicants)
+    jobs = [Job(title=f'Job {i}', description='Seeded job description text.', created_by=company.id) for i in range(job_count)]
+    db.session.add_all(jobs)
+    db.session.flush()
+    db.session.add_all([Application(applicant_id=applicant.id, job_id=job.id, resume_link='https://example.com/r.pdf')
+                        for job in jobs for applicant in applicants])
+    db.session.commit()
+    reconcile_application_counts([job.id for job in jobs])
+    return jobs
+
 def test_company_can_create_job(client):
     token = signup_and_login(client, 'company', 'company@test.com')
     resp = client.post('/jobs',
@@ -66,13 +113,14 @@ def test_applicant_can_browse_jobs(client):
     assert resp.status_code == 200
     assert any(job['title'] == 'Frontend Developer' for job in resp.get_json()['Object'])
 
-def test_applicant_can_apply_for_job(client):
+def test_applicant_can_apply_for_job(client, mocker):
+    mocker.patch('cloudinary.uploader.upload', return_value={'secure_url': 'https://res.cloudinary.com/demo/raw/upload/resumes/resume.pdf'})
     # Create job as company
     company_token = signup_and_login(client, 'company', 'company3@test.com')
     job_resp = client.post('/jobs',
         json={
             'title': 'Fullstack Dev',
-            'description': 'Fullstack dev job.',
+            'description': 'Fullstack developer job on our platform.',
             'location': 'Remote'
         },
         headers={'Authorization': f'Bearer {company_token}'}
@@ -102,7 +150,7 @@ def test_company_cannot_apply_for_job(client):
     job_resp = client.post('/jobs',
         json={
             'title': 'QA Engineer',
-            'description': 'QA job.',
+            'description': 'QA engineering job for our web products.',
             'location': 'Remote'
         },
         headers={'Authorization': f'Bearer {company_token}'}
@@ -127,7 +175,7 @@ def test_resume_must_be_pdf(client):
     job_resp = client.post('/jobs',
         json={
             'title': 'Designer',
-            'description': 'Design job.',
+            'description': 'Product design job for our mobile apps.',
             'location': 'Remote'
         },
         headers={'Authorization': f'Bearer {company_token}'}
@@ -146,4 +194,1117 @@ def test_resume_must_be_pdf(client):
         headers={'Authorization': f'Bearer {applicant_token}'}
     )
     assert resp.status_code == 400
-    assert 'Resume must be a PDF file.' in resp.get_json()['Errors'][0] 
\ No newline at end of file
+    assert 'Resume must be a PDF file.' in resp.get_json()['Errors'][0] 
+
+class FlakyUploader:
+    def __init__(self, failures):
+        self.failures = failures
+        self.calls = 0
+
+    def upload(self, path):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise ConnectionError('upstream unavailable')
+        with open(path, 'rb') as f:
+            assert f.read(5) == b'%PDF-'
+        return f'https://uploads.example.com/{self.calls}.pdf'
+
+@pytest.fixture
+def configure(client):
+    """Returns ``configure(extension, **config)``: update the app config and re-run the extension's init_app."""
+    def configure(extension, **config):
+        client.application.config.update(config)
+        extension.init_app(client.application)
+    return configure
+
+@pytest.fixture
+def company(client):
+    return {'Authorization': f"Bearer {signup_and_login(client, 'company', 'company@test.com')}"}
+
+@pytest.fixture
+def rival(client):
+    return {'Authorization': f"Bearer {signup_and_login(client, 'company', 'rival@test.com')}"}
+
+@pytest.fixture
+def applicant(client):
+    return {'Authorization': f"Bearer {signup_and_login(client, 'applicant', 'applicant@test.com')}"}
+
+def post_job(client, headers, title='Barista', description='Make coffee for early commuters.', **fields):
+    resp = client.post('/jobs', json={'title': title, 'description': description, **fields}, headers=headers)
+    assert resp.status_code == 201
+    return resp.get_json()['Object']['id']
+
+@pytest.fixture
+def job_id(client, company):
+    return post_job(client, company)
+
+def apply_to(client, headers, job_id, content=b'%PDF-1.4\nresume', filename='resume.pdf'):
+    return client.post('/applications/apply', data={'job_id': job_id, 'resume': (io.BytesIO(content), filename)},
+                       content_type='multipart/form-data', headers=headers)
+
+@pytest.fixture
+def spool_dir(tmp_path):
+    return tmp_path / 'spool'
+
+@pytest.fixture
+def uploader(configure, spool_dir):
+    uploader = FlakyUploader(failures=0)
+    configure(resume_uploads, RESUME_UPLOADER=uploader, RESUME_SPOOL_DIR=str(spool_dir))
+    return uploader
+
+@pytest.fixture
+def app_factory(tmp_path):
+    """Returns ``build(**config)``: a test client for an app on a database file.
+
+    Streams, replicas and pool limits need more than the single connection of
+    an in-memory database.
+    """
+    contexts = []
+    def build(**config):
+        app = create_app({'TESTING': True, 'JWT_SECRET_KEY': 'test_secret', 'PASSWORD_HASH_WORKERS': 0,
+                          'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'app.db'}", **config})
+        context = app.app_context()
+        context.push()
+        contexts.append(context)
+        db.create_all()
+        return app.test_client()
+    yield build
+    for context in reversed(contexts):
+        db.session.remove()
+        db.engine.dispose()
+        for engine in context.app.extensions['replicas'].engines.values():
+            engine.dispose()
+        context.pop()
+
+@pytest.mark.parametrize('url, role', [('/applications/my', 'applicant'), ('/applications/job/{job}', 'company'),
+                                       ('/jobs/my', 'company')])
+def test_listing_statement_count_is_independent_of_page_size(client, company, applicant, url, role):
+    others = [f'seed{i}@test.com' for i in range(5)]
+    jobs = seed_applications('company@test.com', ['applicant@test.com'] + others, 6)
+    url = url.format(job=jobs[0].id)
+    headers = company if role == 'company' else applicant
+    counts = []
+    for page_size in (1, 6):
+        with count_statements() as statements:
+            resp = client.get(url, query_string={'page_size': page_size}, headers=headers)
+        assert resp.status_code == 200
+        assert len(resp.get_json()['Object']) == page_size
+        counts.append(len(statements))
+    assert counts[0] == counts[1]
+    assert counts[1] <= 3
+
+@pytest.fixture
+def seeded_jobs(client, company, applicant):
+    return seed_applications('company@test.com', ['applicant@test.com'], 5)
+
+def test_cursor_pagination_walks_every_row_once(client, applicant, seeded_jobs):
+    offset_page = client.get('/jobs', query_string={'page_size': 10}, headers=applicant).get_json()
+    assert offset_page['TotalSize'] == 5
+    seen = []
+    cursor = ''
+    while cursor is not None:
+        body = client.get('/jobs', query_string={'page_size': 2, 'cursor': cursor}, headers=applicant).get_json()
+        assert body['TotalSize'] is None
+        seen.extend(job['id'] for job in body['Object'])
+        cursor = body['NextCursor']
+    assert seen == [job['id'] for job in offset_page['Object']]
+    assert sorted(seen) == sorted(str(job.id) for job in seeded_jobs)
+
+def test_cursor_pages_report_an_exact_total_on_request(client, applicant, seeded_jobs):
+    body = client.get('/applications/my', query_string={'cursor': '', 'total': 'exact'}, headers=applicant).get_json()
+    assert body['TotalSize'] == 5 and body['NextCursor'] is None
+
+def test_malformed_cursors_are_rejected(client, applicant, seeded_jobs):
+    assert client.get('/jobs', query_string={'cursor': 'not-a-cursor'}, headers=applicant).status_code == 400
+    crafted = base64.urlsafe_b64encode(json.dumps(['2024-01-01T00:00:00', 5]).encode()).decode()
+    assert client.get('/jobs', query_string={'cursor': crafted}, headers=applicant).status_code == 400
+
+@pytest.fixture
+def searchable_jobs(client, company):
+    for title, description in [
+        ('Office Manager', 'Coordinate the office; some Python scripting is a plus.'),
+        ('Python Engineer', 'Build backend services and data pipelines.'),
+        ('Graphic Designer', 'Design marketing material for campaigns.'),
+    ]:
+        post_job(client, company, title, description, location='Addis Ababa')
+
+def search_titles(client, headers, **params):
+    return [job['title'] for job in client.get('/jobs', query_string=params, headers=headers).get_json()['Object']]
+
+def test_full_text_search_ranks_title_matches_first(client, applicant, searchable_jobs):
+    body = client.get('/jobs', query_string={'q': 'python'}, headers=applicant).get_json()
+    assert [job['title'] for job in body['Object']] == ['Python Engineer', 'Office Manager']
+    assert body['TotalSize'] == 2
+
+def test_full_text_search_matches_word_prefixes(client, applicant, searchable_jobs):
+    assert search_titles(client, applicant, q='pipe') == ['Python Engineer']
+
+def test_title_and_location_filters_match_substrings_case_insensitively(client, applicant, searchable_jobs):
+    assert search_titles(client, applicant, location='ABABA', title='design') == ['Graphic Designer']
+
+def test_filter_wildcards_are_matched_literally(client, applicant, searchable_jobs):
+    assert search_titles(client, applicant, title='%') == []
+
+def test_full_text_search_survives_renumbered_rowids(client, company, applicant):
+    job_ids = [post_job(client, company, title, 'Day shifts at our city branch.') for title in ('Cashier', 'Plumber', 'Electrician')]
+    client.delete(f'/jobs/{job_ids[0]}', headers=company)
+    # What VACUUM or a dump and restore may do to the implicit rowids of a UUID-keyed table.
+    db.session.execute(db.text('UPDATE jobs SET rowid = rowid + 100'))
+    db.session.commit()
+    for title in ('Plumber', 'Electrician'):
+        assert search_titles(client, applicant, q=title) == [title]
+
+def test_application_counters_follow_applies_and_status_changes(client, company, job_id, uploader):
+    for email in ('applicant9a@test.com', 'applicant9b@test.com'):
+        token = signup_and_login(client, 'applicant', email)
+        resp = apply_to(client, {'Authorization': f'Bearer {token}'}, job_id)
+        assert resp.status_code == 201
+    application_id = resp.get_json()['Object']['id']
+    resp = client.put(f'/applications/status/{application_id}', json={'status': 'Interview'}, headers=company)
+    assert resp.status_code == 200
+    job = client.get('/jobs/my', headers=company).get_json()['Object'][0]
+    assert job['application_count'] == 2
+    assert job['status_counts'] == {'Applied': 1, 'Reviewed': 0, 'Interview': 1, 'Rejected': 0, 'Hired': 0}
+
+def test_reconcile_command_repairs_drifted_counters(client, company):
+    seed_applications('company@test.com', ['applicant9a@test.com', 'applicant9b@test.com'], 1)
+    db.session.execute(db.update(Job).values(application_count=7, hired_count=3))
+    db.session.commit()
+    result = client.application.test_cli_runner().invoke(args=['reconcile-application-counts'])
+    assert result.exit_code == 0
+    assert 'Repaired counters on 1 job(s).' in result.output
+    job = client.get('/jobs/my', headers=company).get_json()['Object'][0]
+    assert job['application_count'] == 2
+    assert job['status_counts']['Hired'] == 0
+
+def test_deleting_a_job_deletes_its_applications(client, company):
+    job = seed_applications('company@test.com', ['applicant9a@test.com'], 1)[0]
+    assert client.delete(f'/jobs/{job.id}', headers=company).status_code == 200
+    assert Application.query.filter_by(job_id=job.id).count() == 0
+
+def test_async_resume_upload_retries_then_fills_link(client, configure, spool_dir, job_id, applicant):
+    uploader = FlakyUploader(failures=2)
+    configure(resume_uploads, RESUME_UPLOAD_MODE='async', RESUME_UPLOAD_BACKOFF=0, RESUME_UPLOADER=uploader,
+              RESUME_SPOOL_DIR=str(spool_dir))
+    resp = apply_to(client, applicant, job_id)
+    assert resp.status_code == 201
+    body = resp.get_json()['Object']
+    assert body['resume_status'] == 'pending' and body['resume_link'] is None
+    resume_uploads.drain(timeout=5)
+    application = db.session.get(Application, uuid.UUID(body['id']))
+    db.session.refresh(application)
+    assert uploader.calls == 3
+    assert application.resume_status == 'uploaded'
+    assert application.resume_link == 'https://uploads.example.com/3.pdf'
+    assert list(spool_dir.iterdir()) == []
+
+@pytest.fixture
+def small_resumes(configure, spool_dir):
+    configure(resume_uploads, RESUME_MAX_BYTES=1024, RESUME_SPOOL_DIR=str(spool_dir))
+
+@pytest.mark.parametrize('content, status', [
+    (b'%PDF-1.4\n' + b'x' * 4096, 413),
+    (b'MZ\x90\x00 renamed executable', 400),
+    (b'%PDF-1.4\n' + b'x' * (256 * 1024), 413),
+])
+def test_resume_is_sniffed_and_bounded_before_any_db_work(client, applicant, small_resumes, spool_dir, content, status):
+    with count_statements() as statements:
+        resp = apply_to(client, applicant, str(uuid.uuid4()), content)
+    assert resp.status_code == status
+    assert statements == []
+    assert list(spool_dir.iterdir()) == []
+
+def test_apply_accepts_only_one_file(client, applicant, small_resumes, spool_dir):
+    resp = client.post('/applications/apply', content_type='multipart/form-data', headers=applicant, data={
+        'job_id': str(uuid.uuid4()),
+        'resume': (io.BytesIO(b'%PDF-1.4\none'), 'one.pdf'),
+        'extra': (io.BytesIO(b'%PDF-1.4\ntwo'), 'two.pdf'),
+    })
+    assert resp.status_code == 400 and resp.get_json()['Errors'] == ['Only one file can be uploaded.']
+    assert list(spool_dir.iterdir()) == []
+
+def test_chunked_apply_bodies_are_cut_off_at_the_limit(client, applicant, small_resumes):
+    # A chunked body has no Content-Length; it is cut off at the limit all the same.
+    fields = {'job_id': str(uuid.uuid4()), 'padding': 'x' * (128 * 1024)}
+    boundary, body = encode_multipart(fields)
+    resp = client.post('/applications/apply', input_stream=io.BytesIO(body),
+                       content_type=f'multipart/form-data; boundary={boundary}', headers=applicant,
+                       environ_overrides={'wsgi.input_terminated': True, 'HTTP_TRANSFER_ENCODING': 'chunked'})
+    assert resp.status_code == 413
+
+def test_identical_resume_is_uploaded_once_per_applicant(client, company, applicant, uploader):
+    job_ids = [post_job(client, company, f'Courier {i}', 'Deliver parcels around the city.') for i in range(3)]
+    links = []
+    for job_id, content in zip(job_ids, [b'%PDF-1.4\nsame', b'%PDF-1.4\nsame', b'%PDF-1.4\nnew']):
+        resp = apply_to(client, applicant, job_id, content)
+        assert resp.status_code == 201
+        links.append(resp.get_json()['Object']['resume_link'])
+    assert uploader.calls == 2
+    assert links[0] == links[1] != links[2]
+
+def test_sync_resume_upload_runs_outside_the_transaction(client, configure, spool_dir, job_id, applicant):
+    seen = []
+    class RecordingUploader(FlakyUploader):
+        def upload(self, path):
+            seen.append(db.session().in_transaction())
+            return super().upload(path)
+    configure(resume_uploads, RESUME_UPLOADER=RecordingUploader(failures=0), RESUME_SPOOL_DIR=str(spool_dir))
+    resp = apply_to(client, applicant, job_id)
+    assert resp.status_code == 201
+    assert resp.get_json()['Object']['resume_status'] == 'uploaded'
+    assert seen == [False]
+
+def test_apply_reads_once_then_writes_through_the_constraint(client, job_id, applicant, uploader):
+    with count_statements() as statements:
+        assert apply_to(client, applicant, job_id).status_code == 201
+    writes = [s for s in statements if not s.lstrip().upper().startswith('SELECT')]
+    # One read ahead of the upload, then the application insert, counter update
+    # and the outbox event.
+    assert statements[0] not in writes and statements[1:] == writes and len(writes) <= 3
+
+def test_duplicate_application_is_rejected_without_a_second_upload(client, job_id, applicant, uploader, spool_dir):
+    apply_to(client, applicant, job_id, b'%PDF-1.4\nfirst')
+    resp = apply_to(client, applicant, job_id, b'%PDF-1.4\nsecond')
+    assert resp.status_code == 409
+    assert 'You have already applied to this job.' in resp.get_json()['Errors']
+    assert uploader.calls == 1
+    assert db.session.get(Job, uuid.UUID(job_id)).application_count == 1
+    assert list(spool_dir.iterdir()) == []
+
+def test_apply_to_a_missing_job_is_not_found(client, applicant, uploader):
+    assert apply_to(client, applicant, str(uuid.uuid4())).status_code == 404
+    assert uploader.calls == 0
+
+class FakeRedis:
+    """Just enough of the redis-py client for the cache backends."""
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None, nx=False):
+        if nx and key in self.data:
+            return False
+        self.data[key] = value if isinstance(value, bytes) else str(value).encode()
+        return True
+
+    def delete(self, *keys):
+        return sum(self.data.pop(key, None) is not None for key in keys)
+
+    def incr(self, key):
+        value = int(self.data.get(key, b'0')) + 1
+        self.data[key] = str(value).encode()
+        return value
+
+    def scan_iter(self, match):
+        return [key for key in list(self.data) if key.startswith(match.rstrip('*'))]
+
+@pytest.fixture(params=['memory', 'redis'])
+def cache_backend(request, configure):
+    fake = FakeRedis()
+    configure(cache, CACHE_BACKEND=request.param, CACHE_REDIS_CLIENT=fake)
+    return request.param, fake
+
+def test_job_detail_is_served_from_cache_with_an_etag(client, company, job_id, cache_backend):
+    first = client.get(f'/jobs/{job_id}', headers=company)
+    assert first.status_code == 200 and first.headers['ETag']
+    assert first.get_json()['Object']['created_by'] == 'Test User'
+    with count_statements() as statements:
+        again = client.get(f'/jobs/{job_id}', headers=company)
+        not_modified = client.get(f'/jobs/{job_id}', headers={**company, 'If-None-Match': first.headers['ETag']})
+    assert statements == []
+    assert again.get_data() == first.get_data()
+    assert not_modified.status_code == 304 and not_modified.get_data() == b''
+    backend, fake = cache_backend
+    if backend == 'redis':
+        assert f'joblisting:jobs:detail:{job_id}' in fake.data
+
+def test_job_detail_cache_is_invalidated_on_update(client, company, job_id, cache_backend):
+    first = client.get(f'/jobs/{job_id}', headers=company)
+    client.put(f'/jobs/{job_id}', json={'title': 'Senior Barista'}, headers=company)
+    changed = client.get(f'/jobs/{job_id}', headers={**company, 'If-None-Match': first.headers['ETag']})
+    assert changed.status_code == 200
+    assert changed.get_json()['Object']['title'] == 'Senior Barista'
+    assert changed.headers['ETag'] != first.headers['ETag']
+
+def test_job_detail_cache_is_invalidated_on_delete(client, company, job_id, cache_backend):
+    client.get(f'/jobs/{job_id}', headers=company)
+    client.delete(f'/jobs/{job_id}', headers=company)
+    assert client.get(f'/jobs/{job_id}', headers=company).status_code == 404
+
+def test_browse_pages_are_cached_until_a_job_write(client, company, applicant):
+    post_job(client, company, 'Chef', 'Cook for our downtown restaurant.')
+    first = client.get('/jobs', query_string={'title': 'chef'}, headers=applicant)
+    with count_statements() as statements:
+        again = client.get('/jobs', query_string={'title': 'CHEF'}, headers=applicant)
+    assert statements == []
+    assert again.get_data() == first.get_data()
+    post_job(client, company, 'Sous Chef', 'Assist the head chef every evening.')
+    fresh = client.get('/jobs', query_string={'title': 'chef'}, headers=applicant).get_json()
+    assert fresh['TotalSize'] == 2
+
+@pytest.fixture
+def slow_compute():
+    calls = []
+    def compute():
+        calls.append(1)
+        time.sleep(0.2)
+        return b'page'
+    compute.calls = calls
+    return compute
+
+def test_cache_miss_is_computed_once_under_concurrency(client, slow_compute):
+    app = client.application
+    def worker(results):
+        with app.app_context():
+            results.append(cache.get_or_set('jobs:browse:hot', slow_compute))
+    results = []
+    threads = [threading.Thread(target=worker, args=(results,)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == [b'page'] * 8
+    assert len(slow_compute.calls) == 1
+
+def test_cache_miss_waits_for_another_process_holding_the_lock(client, slow_compute):
+    backend = client.application.extensions['cache']
+    backend.add('jobs:browse:other:lock', b'1', 5)
+    threading.Timer(0.1, lambda: backend.set('jobs:browse:other', b'theirs')).start()
+    assert cache.get_or_set('jobs:browse:other', slow_compute) == b'theirs'
+    assert slow_compute.calls == []
+
+BULK_JOBS = [
+    {'title': 'Welder', 'description': 'Weld steel frames in the workshop.', 'location': 'Adama'},
+    {'title': 'Painter', 'description': 'Too short'},
+    'not an object',
+    {'title': 'Electrician', 'description': 'Wire new office buildings safely.'},
+    {'title': 'Plumber', 'description': 'Fix pipes for residential customers.'},
+]
+
+@pytest.fixture
+def bulk_client(client):
+    client.application.config['BULK_IMPORT_CHUNK_SIZE'] = 2
+    return client
+
+def test_bulk_import_reports_per_item_results(bulk_client, company):
+    resp = bulk_client.post('/jobs/bulk', json=BULK_JOBS, headers=company)
+    assert resp.status_code == 200
+    body = resp.get_json()['Object']
+    assert (body['Created'], body['Failed']) == (3, 2)
+    assert [r['Success'] for r in body['Results']] == [True, False, False, True, True]
+    assert body['Results'][1]['Errors']
+    assert bulk_client.get('/jobs/my', query_string={'page_size': 20}, headers=company).get_json()['TotalSize'] == 3
+
+def test_bulk_import_reads_ndjson_and_reports_broken_lines(bulk_client, company):
+    ndjson = '\n'.join([json.dumps(BULK_JOBS[0]), '{broken', json.dumps(BULK_JOBS[4])])
+    resp = bulk_client.post('/jobs/bulk', data=ndjson, content_type='application/x-ndjson', headers=company)
+    body = resp.get_json()['Object']
+    assert (body['Created'], body['Failed']) == (2, 1)
+    assert body['Results'][1] == {'Index': 1, 'Success': False, 'Id': None, 'Errors': ['Invalid JSON.']}
+
+def test_bulk_import_needs_an_array(bulk_client, company):
+    assert bulk_client.post('/jobs/bulk', json={'title': 'x'}, headers=company).status_code == 400
+
+def test_bulk_import_over_the_limit_writes_nothing(bulk_client, company):
+    # Over the limit nothing is written, even when earlier chunks were already inserted.
+    bulk_client.application.config['BULK_IMPORT_MAX_ITEMS'] = 4
+    assert bulk_client.post('/jobs/bulk', json=[BULK_JOBS[0]] * 5, headers=company).status_code == 413
+    too_many = '\n'.join(json.dumps(BULK_JOBS[0] | {'title': f'Welder {i}'}) for i in range(5))
+    resp = bulk_client.post('/jobs/bulk', data=too_many, content_type='application/x-ndjson', headers=company)
+    assert resp.status_code == 413
+    assert Job.query.count() == 0
+
+def status_counts(client, headers):
+    return {job['id']: job['status_counts'] for job in client.get('/jobs/my', query_string={'page_size': 5}, headers=headers).get_json()['Object']}
+
+@pytest.fixture
+def bulk_jobs(client, company):
+    return seed_applications('company@test.com', [f'bulk{i}@test.com' for i in range(6)], 2)
+
+def test_bulk_status_update_by_ids(client, company, bulk_jobs):
+    ids = [str(a.id) for a in Application.query.filter_by(job_id=bulk_jobs[0].id).limit(2)]
+    resp = client.put('/applications/status/bulk', json={'status': 'Interview', 'application_ids': ids}, headers=company)
+    assert resp.get_json()['Object']['Updated'] == 2
+    assert status_counts(client, company)[str(bulk_jobs[0].id)]['Interview'] == 2
+
+def test_bulk_status_update_by_job_is_set_based(client, company, bulk_jobs):
+    ids = [str(a.id) for a in Application.query.filter_by(job_id=bulk_jobs[0].id).limit(2)]
+    client.put('/applications/status/bulk', json={'status': 'Interview', 'application_ids': ids}, headers=company)
+    body = {'status': 'Rejected', 'job_id': str(bulk_jobs[0].id), 'from_status': 'Applied'}
+    with count_statements() as statements:
+        resp = client.put('/applications/status/bulk', json=body, headers=company)
+    assert resp.status_code == 200 and resp.get_json()['Object']['Updated'] == 4
+    assert len(statements) <= 5
+    counts = status_counts(client, company)
+    assert counts[str(bulk_jobs[0].id)] == {'Applied': 0, 'Reviewed': 0, 'Interview': 2, 'Rejected': 4, 'Hired': 0}
+    assert counts[str(bulk_jobs[1].id)]['Applied'] == 6
+
+def test_bulk_status_update_is_owner_checked(client, company, rival, bulk_jobs):
+    rival_job = seed_applications('rival@test.com', ['bulk0@test.com'], 1)[0]
+    ids = [str(a.id) for a in Application.query.filter(Application.job_id.in_([bulk_jobs[0].id, rival_job.id]))]
+    resp = client.put('/applications/status/bulk', json={'status': 'Hired', 'application_ids': ids}, headers=company)
+    assert resp.status_code == 403
+    assert Application.query.filter_by(status='Hired').count() == 0
+    resp = client.put('/applications/status/bulk', json={'status': 'Hired', 'job_id': str(rival_job.id)}, headers=company)
+    assert resp.status_code == 403
+
+def test_bulk_status_update_needs_ids_or_a_job(client, company):
+    assert client.put('/applications/status/bulk', json={'status': 'Hired'}, headers=company).status_code == 400
+
+def test_bulk_status_update_counts_each_row_against_its_old_status(client, company):
+    job = seed_applications('company@test.com', [f'mixed{i}@test.com' for i in range(5)], 1)[0]
+    ids = [str(a.id) for a in Application.query.filter_by(job_id=job.id).limit(2)]
+    client.put('/applications/status/bulk', json={'status': 'Interview', 'application_ids': ids}, headers=company)
+    client.put(f'/applications/status/{ids[0]}', json={'status': 'Reviewed'}, headers=company)
+    with count_statements() as statements:
+        resp = client.put('/applications/status/bulk', json={'status': 'Hired', 'job_id': str(job.id)}, headers=company)
+    assert resp.get_json()['Object']['Updated'] == 5
+    assert [s for s in statements if not s.startswith('SELECT')][0] == 'BEGIN IMMEDIATE'
+    assert status_counts(client, company)[str(job.id)] == {'Applied': 0, 'Reviewed': 0, 'Interview': 0, 'Rejected': 0, 'Hired': 5}
+    reconcile_application_counts()
+    assert reconcile_application_counts() == []
+
+@pytest.fixture
+def exported_job(client, company):
+    job = seed_applications('company@test.com', [f'export{i}@test.com' for i in range(5)], 1)[0]
+    client.application.config['EXPORT_BATCH_SIZE'] = 2
+    return str(job.id)
+
+def test_export_streams_ndjson(client, company, exported_job):
+    resp = client.get(f'/applications/job/{exported_job}/export', headers=company)
+    assert resp.status_code == 200 and resp.is_streamed
+    assert resp.mimetype == 'application/x-ndjson'
+    rows = [json.loads(line) for line in resp.get_data(as_text=True).splitlines()]
+    assert sorted(row['applicant_email'] for row in rows) == [f'export{i}@test.com' for i in range(5)]
+    assert all(row['status'] == 'Applied' for row in rows)
+
+def test_export_streams_csv_as_an_attachment(client, company, exported_job):
+    resp = client.get(f'/applications/job/{exported_job}/export', query_string={'format': 'csv'}, headers=company)
+    assert resp.mimetype == 'text/csv'
+    assert 'attachment' in resp.headers['Content-Disposition']
+    lines = resp.get_data(as_text=True).splitlines()
+    assert lines[0].split(',')[:3] == ['id', 'applicant_name', 'applicant_email']
+    assert len(lines) == 6
+
+def test_export_rejects_unknown_formats_and_jobs(client, company, exported_job):
+    assert client.get(f'/applications/job/{exported_job}/export', query_string={'format': 'xml'}, headers=company).status_code == 400
+    assert client.get(f'/applications/job/{uuid.uuid4()}/export', headers=company).status_code == 404
+
+def test_export_is_limited_to_the_job_owner(client, rival, exported_job):
+    assert client.get(f'/applications/job/{exported_job}/export', headers=rival).status_code == 403
+
+def test_csv_export_neutralizes_formulas(client, company):
+    job = seed_applications('company@test.com', ['formula@test.com'], 1)[0]
+    Application.query.filter_by(job_id=job.id).update({'cover_letter': '=HYPERLINK("http://evil.example")'})
+    db.session.commit()
+    resp = client.get(f'/applications/job/{job.id}/export', query_string={'format': 'csv'}, headers=company)
+    assert '\'=HYPERLINK' in resp.get_data(as_text=True)
+
+@pytest.fixture
+def unicode_jobs(client, company):
+    for title in ('Plain title', 'Café señor ☕'):
+        post_job(client, company, title, 'Serializer parity job description.')
+
+def test_row_serializer_matches_marshmallow(unicode_jobs):
+    rows = db.session.query(Job.id, Job.title, Job.description, Job.location, Job.created_by, Job.created_at).all()
+    assert RowSerializer(JobSchema()).many(rows) == [JobSchema().dump(row) for row in rows]
+
+def test_orjson_provider_matches_stdlib_json_byte_for_byte(client, applicant, unicode_jobs):
+    app = client.application
+    stdlib = client.get('/jobs', headers=applicant).get_data()
+    payloads = [
+        {'b': 1, 'a': [1.5, 1e16, 2.5e-5, 0.0001, -3], 'when': datetime(2024, 5, 1, 12, 30), 'id': uuid.uuid4()},
+        {'text': 'naïve', 'n': 2 ** 70, 'none': None, 'flag': True},
+        ['1e5', ':0.00001', {'nested': {'z': 1, 'y': 2}}],
+    ]
+    expected = [app.json.response(payload).get_data() for payload in payloads]
+    app.json = OrjsonProvider(app)
+    cache.clear()
+    assert client.get('/jobs', headers=applicant).get_data() == stdlib
+    assert [app.json.response(payload).get_data() for payload in payloads] == expected
+
+def test_engine_options_follow_pool_settings(client):
+    config = dict(client.application.config, SQLALCHEMY_DATABASE_URI='postgresql://u:p@db/app',
+                  DB_POOL_SIZE=3, DB_MAX_OVERFLOW=1, DB_STATEMENT_TIMEOUT_MS=5000)
+    options = engine_options(config)
+    assert options['poolclass'] is TimedQueuePool
+    assert (options['pool_size'], options['max_overflow'], options['pool_pre_ping']) == (3, 1, True)
+    assert options['connect_args'] == {'application_name': 'joblisting-api', 'options': '-c statement_timeout=5000'}
+    assert engine_options(dict(config, DB_POOL_MODE='null'))['poolclass'] is TimedNullPool
+    assert engine_options(dict(config, SQLALCHEMY_DATABASE_URI='sqlite:///:memory:')) == {}
+
+def test_pool_monitoring_is_off_by_default(client):
+    assert client.get('/monitoring/pool').status_code == 404
+
+def test_pool_monitoring_reports_checkout_waits_and_failures(app_factory):
+    client = app_factory(DB_POOL_SIZE=1, DB_MAX_OVERFLOW=0, DB_POOL_TIMEOUT=1, MONITORING_ENABLED=True)
+    before = client.get('/monitoring/pool').get_json()['Object']
+    held = db.engine.connect()
+    with pytest.raises(Exception):
+        db.engine.connect()
+    held.close()
+    stats = client.get('/monitoring/pool').get_json()['Object']
+    assert stats['pool'] == 'TimedQueuePool' and stats['size'] == 1
+    assert stats['checkouts'] - before['checkouts'] == 1 and stats['failures'] - before['failures'] == 1
+    assert stats['wait_ms_max'] >= 900
+
+@pytest.fixture
+def replica_client(app_factory, tmp_path):
+    client = app_factory(DATABASE_REPLICA_URLS=[f"sqlite:///{tmp_path / 'replica.db'}"])
+    db.metadata.create_all(client.application.extensions['replicas'].engines['replica_0'])
+    return client
+
+def test_reads_stay_on_the_primary_right_after_a_write(replica_client):
+    company = {'Authorization': f"Bearer {signup_and_login(replica_client, 'company', 'company@test.com')}"}
+    post_job(replica_client, company, 'Replicated Job', 'Written to the primary, not yet replicated.')
+    assert len(replica_client.get('/jobs/my', headers=company).get_json()['Object']) == 1
+
+def test_reads_go_to_the_replica_once_no_longer_sticky(replica_client):
+    company = {'Authorization': f"Bearer {signup_and_login(replica_client, 'company', 'company@test.com')}"}
+    post_job(replica_client, company, 'Replicated Job', 'Written to the primary, not yet replicated.')
+    cache.clear()
+    # Served from the (lagging, empty) replica.
+    assert replica_client.get('/jobs/my', headers=company).get_json()['Object'] == []
+
+def test_reads_fall_back_to_the_primary_when_the_replica_fails(app_factory, tmp_path):
+    client = app_factory(DATABASE_REPLICA_URLS=[f"sqlite:///{tmp_path / 'missing' / 'replica.db'}"])
+    company = {'Authorization': f"Bearer {signup_and_login(client, 'company', 'company@test.com')}"}
+    post_job(client, company, 'Replicated Job', 'Written to the primary, not yet replicated.')
+    cache.clear()
+    resp = client.get('/jobs/my', headers=company)
+    assert resp.status_code == 200 and len(resp.get_json()['Object']) == 1
+    assert client.application.extensions['replicas'].down_until
+
+def test_cached_job_views_fill_from_the_primary(replica_client):
+    company = {'Authorization': f"Bearer {signup_and_login(replica_client, 'company', 'company@test.com')}"}
+    job_id = post_job(replica_client, company, 'Baker', 'Bake bread before dawn.')
+    replica_client.put(f'/jobs/{job_id}', json={'title': 'Head Baker'}, headers=company)
+    # Another user, not pinned to the primary, misses the invalidated entries.
+    applicant = {'Authorization': f"Bearer {signup_and_login(replica_client, 'applicant', 'applicant@test.com')}"}
+    assert replica_client.get(f'/jobs/{job_id}', headers=applicant).get_json()['Object']['title'] == 'Head Baker'
+    assert search_titles(replica_client, applicant) == ['Head Baker']
+
+@contextmanager
+def capture_queries():
+    queries = []
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE')):
+            queries.append((statement, parameters))
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield queries
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+def query_plans(queries):
+    with db.engine.connect() as connection:
+        return [' | '.join(row[-1] for row in connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters))
+                for statement, parameters in queries]
+
+INDEXED_REQUESTS = {
+    'ix_jobs_created_by_created_at_id': lambda client, job_id, company, applicant: client.get('/jobs/my', headers=company),
+    'ix_applications_job_id_applied_at_id': lambda client, job_id, company, applicant: client.get(
+        f'/applications/job/{job_id}', query_string={'cursor': ''}, headers=company),
+    'ix_applications_applicant_id_applied_at_id': lambda client, job_id, company, applicant: client.get(
+        '/applications/my', query_string={'cursor': ''}, headers=applicant),
+    'ix_applications_job_id_status': lambda client, job_id, company, applicant: client.put(
+        '/applications/status/bulk', json={'status': 'Reviewed', 'job_id': job_id, 'from_status': 'Applied'}, headers=company),
+}
+
+@pytest.mark.parametrize('index', list(INDEXED_REQUESTS))
+def test_listing_and_status_queries_use_their_indexes(client, company, applicant, index):
+    job_id = str(seed_applications('company@test.com', ['applicant@test.com', 'other@test.com'], 3)[0].id)
+    with capture_queries() as queries:
+        assert INDEXED_REQUESTS[index](client, job_id, company, applicant).status_code == 200
+    plans = query_plans(queries)
+    assert any(index in plan for plan in plans), plans
+    assert not any('SCAN applications' in plan and 'USING' not in plan for plan in plans), plans
+
+def test_unfinished_resume_lookup_uses_its_partial_index(client):
+    unfinished = db.session.query(Application.id).filter(Application.resume_status.in_(['pending', 'failed']))
+    statement = str(unfinished.statement.compile(db.engine, compile_kwargs={'literal_binds': True}))
+    assert 'ix_applications_resume_unfinished' in query_plans([(statement, ())])[0]
+
+def test_responses_report_sql_server_timing(client, company):
+    seed_applications('company@test.com', ['applicant@test.com'], 2)
+    with count_statements() as statements:
+        resp = client.get('/jobs/my', headers=company)
+    timing = resp.headers.getlist('Server-Timing')
+    assert timing[0].startswith(f'db;desc="{len(statements)} queries";dur=')
+    assert timing[1].startswith('db-slowest;dur=')
+
+def test_slow_queries_and_request_summaries_are_logged(client, company, caplog):
+    seed_applications('company@test.com', ['applicant@test.com'], 2)
+    client.application.extensions['sql_instrumentation'].slow_seconds = 0
+    with caplog.at_level('INFO', logger='app.instrumentation'), count_statements() as statements:
+        client.get('/jobs/my', headers=company)
+    events = [json.loads(record.getMessage()) for record in caplog.records]
+    assert {event['event'] for event in events} == {'slow_query', 'request_sql'}
+    summary = next(event for event in events if event['event'] == 'request_sql')
+    assert summary['endpoint'] == 'jobs.my_jobs' and summary['queries'] == len(statements)
+    assert summary['slowest_statement'].startswith('SELECT')
+
+def metric_sample(body, name):
+    line = next((line for line in body.splitlines() if line.startswith(name + ' ')), None)
+    return float(line.rsplit(' ', 1)[1]) if line else 0.0
+
+def test_metrics_endpoint_reports_requests_and_pool(client, company):
+    metric = 'http_requests_total{endpoint="jobs.my_jobs",method="GET",status="200"}'
+    before = client.get('/metrics').get_data(as_text=True)
+    for _ in range(3):
+        client.get('/jobs/my', headers=company)
+    resp = client.get('/metrics')
+    assert resp.status_code == 200 and resp.mimetype == 'text/plain'
+    body = resp.get_data(as_text=True)
+    assert metric_sample(body, metric) - metric_sample(before, metric) == 3
+    assert 'http_request_duration_seconds_bucket{endpoint="jobs.my_jobs",le="0.005",method="GET"}' in body
+    assert 'http_requests_in_progress{endpoint="jobs.my_jobs",method="GET"} 0.0' in body
+    assert 'db_pool_connections_checked_out' in body
+    assert 'endpoint="metrics"' not in body
+
+def test_metrics_endpoint_is_limited_to_allowed_networks_and_token(client):
+    assert client.get('/metrics', environ_base={'REMOTE_ADDR': '203.0.113.7'}).status_code == 403
+    client.application.extensions['metrics']['token'] = 'scrape-token'
+    assert client.get('/metrics').status_code == 403
+    assert client.get('/metrics', headers={'Authorization': 'Bearer scrape-token'}).status_code == 200
+
+@pytest.fixture
+def credentials(client):
+    signup_and_login(client, 'applicant', 'applicant@test.com')
+    return {'email': 'applicant@test.com', 'password': 'Password123!'}
+
+@pytest.fixture
+def hashing_pool(configure, credentials):
+    # The account was hashed with the default scrypt before the method changed.
+    configure(passwords, PASSWORD_HASH_METHOD='pbkdf2:sha256:1000', PASSWORD_HASH_WORKERS=1)
+    yield
+    passwords.shutdown()
+
+def stored_hash():
+    db.session.expire_all()
+    return User.query.filter_by(email='applicant@test.com').one().password
+
+def test_login_rehashes_outdated_passwords_in_the_process_pool(client, credentials, hashing_pool):
+    assert stored_hash().startswith('scrypt:')
+    with count_statements() as statements:
+        assert client.post('/auth/login', json=credentials).status_code == 200
+    assert 'users.name' not in statements[0] and 'users.email,' not in statements[0]
+    assert stored_hash().startswith('pbkdf2:sha256:1000$')
+
+def test_login_with_a_current_hash_runs_one_query(client, credentials, hashing_pool):
+    client.post('/auth/login', json=credentials)
+    with count_statements() as statements:
+        assert client.post('/auth/login', json=credentials).status_code == 200
+    assert len(statements) == 1
+
+def test_wrong_password_is_rejected_by_the_process_pool(client, credentials, hashing_pool):
+    assert client.post('/auth/login', json=dict(credentials, password='Wrong123!')).status_code == 401
+
+def test_broken_hashing_pool_is_replaced(client, credentials, hashing_pool):
+    # A pool whose child was killed is replaced instead of failing every later login.
+    client.post('/auth/login', json=credentials)
+    state = client.application.extensions['passwords']
+    broken = state.executor
+    for process in list(broken._processes.values()):
+        process.kill()
+        process.join()
+    assert client.post('/auth/login', json=credentials).status_code == 200
+    assert state.executor is not broken
+
+def test_login_is_shed_when_the_hashing_queue_is_full(client, credentials, hashing_pool):
+    state = client.application.extensions['passwords']
+    for _ in range(4):
+        state.slots.acquire()
+    state.queue_timeout = 0.01
+    resp = client.post('/auth/login', json=credentials)
+    assert resp.status_code == 503 and resp.headers['Retry-After'] == '1'
+
+class FlakySink(FileSink):
+    def __init__(self, path, failures):
+        super().__init__(path)
+        self.failures = failures
+
+    def publish(self, events):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError('broker unavailable')
+        super().publish(events)
+
+@pytest.fixture
+def events_path(client, configure, tmp_path):
+    path = tmp_path / 'events.ndjson'
+    configure(outbox, OUTBOX_SINK=FlakySink(str(path), failures=1), OUTBOX_BATCH_SIZE=3)
+    return path
+
+@pytest.fixture
+def application_history(client, company, applicant, job_id, uploader, events_path):
+    """One job and one application moved Applied -> Reviewed -> Interview -> Hired."""
+    apply_to(client, applicant, job_id)
+    application_id = str(Application.query.one().id)
+    for status in ('Reviewed', 'Interview'):
+        client.put(f'/applications/status/{application_id}', json={'status': status}, headers=company)
+    client.put('/applications/status/bulk', json={'status': 'Hired', 'job_id': job_id}, headers=company)
+    return job_id, application_id
+
+def test_outbox_events_commit_with_their_writes(client, company, application_history):
+    assert OutboxEvent.query.count() == 5
+    # A status change that fails validation writes nothing.
+    _, application_id = application_history
+    client.put(f'/applications/status/{application_id}', json={'status': 'Lost'}, headers=company)
+    assert OutboxEvent.query.count() == 5
+
+def test_outbox_relay_retries_a_failed_batch(application_history):
+    with pytest.raises(ConnectionError):
+        outbox.run(once=True)
+    assert OutboxEvent.query.filter(OutboxEvent.published_at.isnot(None)).count() == 0
+    assert outbox.run(once=True) == 5
+    assert outbox.run(once=True) == 0
+
+def test_outbox_relay_publishes_events_in_order(application_history, events_path):
+    job_id, application_id = application_history
+    with pytest.raises(ConnectionError):
+        outbox.run(once=True)
+    outbox.run(once=True)
+    events = [json.loads(line) for line in events_path.read_text().splitlines()]
+    assert [e['type'] for e in events] == ['job.created', 'application.created'] + ['application.status_changed'] * 3
+    assert [e['id'] for e in events] == sorted(e['id'] for e in events)
+    assert events[0]['aggregate_id'] == job_id
+    assert [e['payload']['status'] for e in events[1:]] == ['Applied', 'Reviewed', 'Interview', 'Hired']
+    assert all(e['aggregate_id'] == application_id for e in events[1:])
+
+def next_event(chunks):
+    for chunk in chunks:
+        chunk = chunk.decode()
+        if chunk.startswith('id: '):
+            fields = dict(line.split(': ', 1) for line in chunk.strip().splitlines())
+            return int(fields['id']), fields['event'], json.loads(fields['data'])
+    raise AssertionError('stream ended without an event')
+
+STREAM_CONFIG = {'SSE_POLL_INTERVAL': 0.05, 'SSE_HEARTBEAT_SECONDS': 0.1}
+
+@pytest.fixture
+def stream_client(app_factory, spool_dir):
+    # Streams are read by the broker thread, so they need a database file.
+    return app_factory(**STREAM_CONFIG, RESUME_UPLOADER=FlakyUploader(failures=0), RESUME_SPOOL_DIR=str(spool_dir))
+
+def stream_ticket(client, token):
+    resp = client.post('/applications/stream/ticket', headers={'Authorization': f'Bearer {token}'})
+    assert resp.status_code == 201
+    return resp.get_json()['Object']['ticket']
+
+@pytest.fixture
+def streamed_application(stream_client):
+    client = stream_client
+    company = {'Authorization': f"Bearer {signup_and_login(client, 'company', 'company@test.com')}"}
+    job_id = post_job(client, company, 'Florist', 'Arrange flowers for weddings.')
+    token = signup_and_login(client, 'applicant', 'applicant@test.com')
+    apply_to(client, {'Authorization': f'Bearer {token}'}, job_id)
+    return company, token, job_id, str(Application.query.one().id)
+
+def test_status_changes_are_streamed_live(stream_client, streamed_application):
+    company, token, _, application_id = streamed_application
+    # EventSource can't set headers, hence the ticket in the query string.
+    stream = stream_client.get('/applications/stream', query_string={'ticket': stream_ticket(stream_client, token)},
+                               buffered=False)
+    assert stream.mimetype == 'text/event-stream'
+    chunks = iter(stream.response)
+    assert next(chunks).startswith(b'retry: ')
+    stream_client.put(f'/applications/status/{application_id}', json={'status': 'Interview'}, headers=company)
+    _, kind, message = next_event(chunks)
+    assert kind == 'application.status_changed'
+    assert message['aggregate_id'] == application_id and message['payload']['status'] == 'Interview'
+    stream.close()
+    assert stream_client.application.extensions['stream_broker'].subscribers == {}
+
+def test_missed_events_are_replayed_from_last_event_id(stream_client, streamed_application):
+    company, token, _, application_id = streamed_application
+    stream_client.put(f'/applications/status/{application_id}', json={'status': 'Interview'}, headers=company)
+    seen = db.session.query(db.func.max(OutboxEvent.id)).scalar()
+    # Missed while disconnected, replayed on reconnect.
+    stream_client.put(f'/applications/status/{application_id}', json={'status': 'Hired'}, headers=company)
+    resumed = stream_client.get('/applications/stream', query_string={'ticket': stream_ticket(stream_client, token)},
+                                headers={'Last-Event-ID': str(seen)}, buffered=False)
+    chunks = iter(resumed.response)
+    event_id, _, message = next_event(chunks)
+    assert event_id > seen and message['payload']['status'] == 'Hired'
+    assert next(chunks) == b': heartbeat\n\n'
+    resumed.close()
+
+def test_companies_are_streamed_applications_to_their_jobs(stream_client, streamed_application):
+    company, _, job_id, _ = streamed_application
+    stream = stream_client.get('/applications/stream', headers=company, buffered=False)
+    _, kind, message = next_event(iter(stream.response))
+    assert kind == 'application.created' and message['payload']['job_id'] == job_id
+    stream.close()
+
+@pytest.fixture
+def stream_token(stream_client):
+    return signup_and_login(stream_client, 'applicant', 'applicant@test.com')
+
+def test_stream_does_not_take_tokens_in_the_query_string(stream_client, stream_token):
+    assert stream_client.get('/applications/stream', query_string={'jwt': stream_token}).status_code == 401
+
+def test_stream_tickets_are_single_use(stream_client, stream_token):
+    ticket = stream_ticket(stream_client, stream_token)
+    assert stream_client.get('/applications/stream', query_string={'ticket': ticket + 'x'}).status_code == 401
+    stream = stream_client.get('/applications/stream', query_string={'ticket': ticket}, buffered=False)
+    assert stream.status_code == 200
+    stream.close()
+    resp = stream_client.get('/applications/stream', query_string={'ticket': ticket})
+    assert resp.status_code == 401
+    assert 'Stream ticket is invalid, expired or already used.' in resp.get_json()['Errors']
+
+def test_stream_ticket_is_not_an_access_token(stream_client, stream_token):
+    ticket = stream_ticket(stream_client, stream_token)
+    assert stream_client.get('/applications/my', headers={'Authorization': f'Bearer {ticket}'}).status_code == 422
+
+@pytest.fixture
+def capped_client(app_factory):
+    return app_factory(**STREAM_CONFIG, SSE_MAX_STREAMS=2, SSE_MAX_STREAMS_PER_USER=1)
+
+def open_stream(client, email, role='applicant'):
+    headers = {'Authorization': f'Bearer {signup_and_login(client, role, email)}'}
+    return headers, client.get('/applications/stream', headers=headers, buffered=False)
+
+def test_open_streams_are_capped_per_user(capped_client):
+    headers, stream = open_stream(capped_client, 'applicant@test.com')
+    resp = capped_client.get('/applications/stream', headers=headers)
+    assert resp.status_code == 429 and resp.headers['Retry-After']
+    stream.close()
+
+def test_open_streams_are_capped_per_worker(capped_client):
+    streams = [open_stream(capped_client, email)[1] for email in ('applicant@test.com', 'applicant2@test.com')]
+    headers = {'Authorization': f"Bearer {signup_and_login(capped_client, 'company', 'company@test.com')}"}
+    resp = capped_client.get('/applications/stream', headers=headers)
+    assert resp.status_code == 503 and resp.headers['Retry-After']
+    streams.pop().close()
+    streams.append(capped_client.get('/applications/stream', headers=headers, buffered=False))
+    assert [stream.status_code for stream in streams] == [200, 200]
+    for stream in streams:
+        stream.close()
+    assert capped_client.application.extensions['stream_broker'].subscribers == {}
+
+@pytest.fixture
+def model_path(configure, tmp_path):
+    path = tmp_path / 'model.npz'
+    configure(recommender, RECOMMENDATION_FEED_SIZE=2, RECOMMENDATION_MODEL_PATH=str(path))
+    return path
+
+@pytest.fixture
+def recommended_jobs(client, company, applicant, model_path):
+    """Four jobs, one of them applied to, and a freshly built model."""
+    jobs = {
+        'applied': post_job(client, company, 'Python Backend Developer', 'Build Flask APIs on Postgres with Python.'),
+        'python_data': post_job(client, company, 'Python Data Engineer', 'Python pipelines feeding our Postgres warehouse.'),
+        'pastry': post_job(client, company, 'Pastry Chef', 'Bake croissants and cakes in our kitchen.'),
+        'frontend': post_job(client, company, 'Frontend Developer', 'Build React interfaces for our customers.'),
+    }
+    user = User.query.filter_by(email='applicant@test.com').one()
+    db.session.add(Application(applicant_id=user.id, job_id=uuid.UUID(jobs['applied']), resume_link='https://example.com/r.pdf'))
+    db.session.commit()
+    recommender.build()
+    return jobs
+
+def recommended_ids(client, headers, **params):
+    return [job['id'] for job in client.get('/jobs/recommended', query_string=params, headers=headers).get_json()['Object']]
+
+def test_recommendations_are_empty_before_a_first_application(client, company, applicant, model_path):
+    post_job(client, company, 'Python Backend Developer', 'Build Flask APIs on Postgres with Python.')
+    assert recommended_ids(client, applicant) == []
+
+def test_recommendations_are_precomputed_and_served_in_one_query(client, applicant, recommended_jobs):
+    assert recommender.build().applicant_ids == [str(User.query.filter_by(email='applicant@test.com').one().id)]
+    with count_statements() as statements:
+        feed = client.get('/jobs/recommended', headers=applicant).get_json()['Object']
+    assert len(statements) == 1
+    assert [job['id'] for job in feed] == [recommended_jobs['python_data'], recommended_jobs['frontend']]
+    assert feed[0]['score'] > feed[1]['score'] > 0 and feed[0]['title'] == 'Python Data Engineer'
+
+def test_recommendations_can_be_limited(client, applicant, recommended_jobs):
+    assert recommended_ids(client, applicant, limit=1) == [recommended_jobs['python_data']]
+
+def test_new_jobs_are_scored_into_feeds_by_the_outbox_relay(client, company, applicant, recommended_jobs):
+    # A close match displaces the weakest entry; an unrelated job doesn't get in.
+    flask_job = post_job(client, company, 'Python Flask Developer', 'Build Flask APIs in Python for our platform.')
+    post_job(client, company, 'Forklift Driver', 'Move pallets around the warehouse floor safely.')
+    # Web requests leave scoring to the outbox relay.
+    assert recommended_ids(client, applicant) == [recommended_jobs['python_data'], recommended_jobs['frontend']]
+    outbox.run(once=True)
+    assert recommended_ids(client, applicant) == [flask_job, recommended_jobs['python_data']]
+
+def test_raised_feed_thresholds_are_saved_with_the_model(client, company, applicant, recommended_jobs, model_path):
+    post_job(client, company, 'Python Flask Developer', 'Build Flask APIs in Python for our platform.')
+    outbox.run(once=True)
+    feed = client.get('/jobs/recommended', headers=applicant).get_json()['Object']
+    # The raised bar is saved for the next relay process.
+    assert RecommendationModel.load(str(model_path)).thresholds.tolist() == pytest.approx([feed[1]['score']], abs=1e-4)
+
+@pytest.fixture
+def stats_history(client, company):
+    """Two jobs: one with two of four applications from yesterday moved on, one all rejected."""
+    jobs = seed_applications('company@test.com', [f'stats{i}@test.com' for i in range(4)], 2)
+    yesterday = datetime.utcnow() - timedelta(days=1)
+    early = Application.query.filter_by(job_id=jobs[0].id).limit(2).all()
+    for application in early:
+        application.applied_at = yesterday
+    db.session.commit()
+    early_ids = [str(application.id) for application in early]
+    client.put('/applications/status/bulk', json={'status': 'Interview', 'application_ids': early_ids}, headers=company)
+    client.put(f'/applications/status/{early_ids[0]}', json={'status': 'Hired'}, headers=company)
+    client.put('/applications/status/bulk', json={'status': 'Rejected', 'job_id': str(jobs[1].id)}, headers=company)
+    return [str(job.id) for job in jobs], yesterday
+
+def job_stats(client, headers, **params):
+    stats = client.get('/jobs/my/stats', query_string=params, headers=headers).get_json()['Object']
+    return {job['id']: job for job in stats['Jobs']}, stats['Totals']
+
+def test_job_stats_report_status_counts_and_funnel(client, company, stats_history):
+    (first, second), _ = stats_history
+    with count_statements() as statements:
+        jobs, totals = job_stats(client, company)
+    assert len(statements) == 2
+    assert jobs[first]['status_counts'] == {'Applied': 2, 'Reviewed': 0, 'Interview': 1, 'Rejected': 0, 'Hired': 1}
+    assert jobs[first]['funnel'] == {'Applied': 4, 'Reviewed': 2, 'Interview': 2, 'Hired': 1}
+    assert totals['funnel'] == {'Applied': 8, 'Reviewed': 2, 'Interview': 2, 'Hired': 1}
+
+def test_job_stats_report_daily_history(client, company, stats_history):
+    (first, second), yesterday = stats_history
+    jobs, _ = job_stats(client, company)
+    assert [(d['day'], d['applications']) for d in jobs[first]['daily']] == [
+        (yesterday.date().isoformat(), 2), (datetime.utcnow().date().isoformat(), 2)]
+    assert jobs[first]['daily'][0]['status_counts']['Hired'] == 1
+    assert jobs[second]['daily'][0]['status_counts']['Rejected'] == 4
+    jobs, _ = job_stats(client, company, days=1)
+    assert len(jobs[first]['daily']) == 1
+
+def stats_rollup():
+    return sorted((row.job_id, row.day, row.status, row.count)
+                  for row in ApplicationDailyStat.query.filter(ApplicationDailyStat.count != 0))
+
+def test_triggers_keep_the_rollup_equal_to_a_rebuild(stats_history):
+    maintained = stats_rollup()
+    rebuild_application_stats()
+    assert stats_rollup() == maintained
+
+def test_deleting_a_job_removes_its_rollup_rows(client, company, stats_history):
+    (first, second), _ = stats_history
+    client.delete(f'/jobs/{second}', headers=company)
+    assert {str(row[0]) for row in stats_rollup()} == {first}
+
+@pytest.fixture
+def ratelimit_path(tmp_path):
+    return str(tmp_path / 'ratelimit.db')
+
+@pytest.fixture
+def limited_client(app_factory, ratelimit_path):
+    return app_factory(RATELIMIT_BACKEND='sqlite', RATELIMIT_SQLITE_PATH=ratelimit_path, RATELIMIT_PROXY_COUNT=0,
+                       RATELIMIT_RULES={'auth.login': 'ip:3/minute', 'applications.apply_job': 'user:1/minute'})
+
+def test_login_is_rate_limited_per_client_ip(limited_client):
+    signup_and_login(limited_client, 'applicant', 'applicant@test.com')
+    credentials = {'email': 'applicant@test.com', 'password': 'Password123!'}
+    # The login in signup_and_login took the first of three tokens.
+    assert [limited_client.post('/auth/login', json=credentials).status_code for _ in range(2)] == [200, 200]
+    resp = limited_client.post('/auth/login', json=credentials)
+    assert resp.status_code == 429
+    assert 1 <= int(resp.headers['Retry-After']) <= 20
+    assert resp.get_json()['Message'] == 'Too many requests'
+    assert limited_client.post('/auth/login', json=credentials, environ_base={'REMOTE_ADDR': '10.0.0.2'}).status_code == 200
+
+def test_apply_is_throttled_before_the_view_runs(limited_client):
+    company = {'Authorization': f"Bearer {signup_and_login(limited_client, 'company', 'company@test.com')}"}
+    job_id = post_job(limited_client, company)
+    headers = {'Authorization': f"Bearer {signup_and_login(limited_client, 'applicant', 'applicant@test.com')}"}
+    limited_client.post('/applications/apply', data={'job_id': job_id}, content_type='multipart/form-data', headers=headers)
+    # No queries and the upload isn't read.
+    with count_statements() as statements:
+        resp = apply_to(limited_client, headers, job_id)
+    assert resp.status_code == 429 and statements == []
+    assert 30 <= int(resp.headers['Retry-After']) <= 60
+
+def test_sqlite_buckets_are_shared_between_workers(ratelimit_path):
+    limit = Limit('ip', 1, 1 / 60)
+    assert SQLiteBuckets(ratelimit_path).take('shared', limit) == 0
+    assert SQLiteBuckets(ratelimit_path).take('shared', limit) > 0
+
+def test_memory_buckets_take_a_token_in_under_a_millisecond():
+    buckets = MemoryBuckets()
+    started = time.perf_counter()
+    for i in range(1000):
+        buckets.take(f'user:{i % 10}', Limit('user', 10 ** 6, 100))
+    assert (time.perf_counter() - started) / 1000 < 0.001
+
+def logins_through_a_proxy(proxy_count):
+    app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:', 'JWT_SECRET_KEY': 'test_secret',
+                      'PASSWORD_HASH_WORKERS': 0, 'RATELIMIT_PROXY_COUNT': proxy_count,
+                      'RATELIMIT_RULES': {'auth.login': 'ip:1/minute'}})
+    client = app.test_client()
+    def login(client_ip):
+        # Every request comes through the same proxy.
+        return client.post('/auth/login', json={'email': 'nobody@test.com', 'password': 'x'},
+                           environ_base={'REMOTE_ADDR': '10.0.0.1'}, headers={'X-Forwarded-For': client_ip}).status_code
+    with app.app_context():
+        db.create_all()
+        return [login('203.0.113.1'), login('203.0.113.1'), login('203.0.113.2')]
+
+def test_ip_rate_limits_are_off_without_a_proxy_count():
+    assert 429 not in logins_through_a_proxy(None)
+
+def test_zero_proxy_count_behind_a_proxy_is_logged(caplog):
+    # The proxy's address is the only one seen.
+    assert logins_through_a_proxy(0)[1:] == [429, 429]
+    assert 'RATELIMIT_PROXY_COUNT is 0' in caplog.text
+
+def test_ip_rate_limits_key_on_the_forwarded_client_ip():
+    statuses = logins_through_a_proxy(1)
+    assert statuses[1:] == [429, statuses[0]]
+
+@pytest.fixture
+def late_events(stream_client):
+    """Returns the applicant's token and ``commit(offset, status)`` for events committed out of id order."""
+    signup_and_login(stream_client, 'company', 'company@test.com')
+    token = signup_and_login(stream_client, 'applicant', 'applicant@test.com')
+    job = seed_applications('company@test.com', ['applicant@test.com'], 1)[0]
+    application = Application.query.filter_by(job_id=job.id).one()
+    base = db.session.query(db.func.max(OutboxEvent.id)).scalar() or 0
+
+    def commit(offset, status):
+        # Explicit ids stand in for two transactions that commit in the opposite order to their inserts.
+        db.session.add(OutboxEvent(id=base + offset, event_type='application.status_changed', aggregate_type='application',
+                                   aggregate_id=application.id, created_at=datetime.utcnow(),
+                                   payload={'application_id': str(application.id), 'job_id': str(application.job_id),
+                                            'applicant_id': str(application.applicant_id), 'status': status}))
+        db.session.commit()
+        return base + offset
+    return token, commit
+
+def test_events_committed_out_of_id_order_still_reach_live_streams(stream_client, late_events):
+    token, commit = late_events
+    stream = stream_client.get('/applications/stream', headers={'Authorization': f'Bearer {token}'}, buffered=False)
+    chunks = iter(stream.response)
+    next(chunks)
+    later = commit(2, 'Interview')
+    cursor, _, message = next_event(chunks)
+    assert (cursor, message['id']) == (later, later)
+    earlier = commit(1, 'Reviewed')
+    cursor, _, message = next_event(chunks)
+    # Delivered late, under the unchanged cursor.
+    assert (cursor, message['id'], message['payload']['status']) == (later, earlier, 'Reviewed')
+    stream.close()
+
+def test_events_committed_below_last_event_id_are_replayed(stream_client, late_events):
+    token, commit = late_events
+    first = commit(1, 'Reviewed')
+    # Committed below the cursor while disconnected: replayed on reconnect.
+    cursor = commit(3, 'Hired')
+    below = commit(2, 'Interview')
+    resumed = stream_client.get('/applications/stream', headers={'Authorization': f'Bearer {token}', 'Last-Event-ID': str(cursor)},
+                                buffered=False)
+    chunks = iter(resumed.response)
+    replayed = [next_event(chunks)[2]['id'] for _ in range(2)]
+    assert replayed == [first, below]
+    assert next(chunks) == b': heartbeat\n\n'
+    resumed.close()